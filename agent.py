@@ -0,0 +1,233 @@
+from config import *
+
+#Import the tool declarations the AI can use
+from call_function import get_available_functions, tool_cache, prefetcher
+
+#Import the executor that runs the function calls of one turn
+from executor import execute_function_calls
+
+#Import the history compaction stage
+from compaction import compact_messages
+
+#Import span tracing
+import tracing
+
+
+def run_agent(
+    client,
+    user_prompt,
+    verbose=False,
+    working_directory=WORKING_DIRECTORY,
+    rate_limiter=None,
+    quiet=False,
+    max_iterations=MAX_ITERATIONS,
+    checkpoint=None,
+):
+    """
+    Runs the agent loop for one prompt until the model gives a final response.
+
+    Parameters:
+        client (genai.Client): The Gemini client.
+        user_prompt (str): The prompt from the user.
+        verbose (bool): Whether to print detailed information.
+        working_directory (str): Directory the tools are constrained to.
+        rate_limiter (RateLimiter): Shared limiter acquired before each model call.
+        quiet (bool): Don't print progress and the final response (batch sessions).
+        max_iterations (int): Total model turns allowed, including resumed ones.
+        checkpoint (SessionCheckpoint): Saves every finished iteration. If it already
+            holds iterations, the session continues from them instead of starting over.
+
+    Returns:
+        dict: The final response, token usage, number of iterations (of the whole session), the error (if any),
+        the wall-clock time spent in tools and a (name, seconds) timing per tool call.
+    """
+    # Loaded on first use, not at import time, to keep startup fast
+    from google.genai import types
+
+    #intialize token counters
+    prompt_tokens = 0
+    response_tokens = 0
+    tokens_saved = 0
+
+    result = {"final_response": None, "error": None}
+    tool_timings = []
+    tool_wall_time = 0.0
+
+    # Define the available functions for the AI to use
+    available_functions = get_available_functions()
+
+    # Intialize the conversation messages list
+    messages = [
+    types.Content(role="user", parts=[types.Part(text=user_prompt)]),
+    ]
+
+    # Continue a checkpointed session where it stopped, completed iterations are not replayed
+    start_iteration = 0
+    if checkpoint and checkpoint.iterations:
+        messages = list(checkpoint.messages)
+        prompt_tokens = checkpoint.prompt_tokens
+        response_tokens = checkpoint.response_tokens
+        start_iteration = checkpoint.iterations
+    saved = len(messages)
+
+    response = None
+    iteration = start_iteration - 1
+    for iteration in range(start_iteration, max_iterations):
+        try:
+            # Compact old history so the prompt doesn't grow with every iteration
+            with tracing.span("compaction", iteration=iteration + 1) as compaction_span:
+                contents, compaction_stats = compact_messages(messages)
+                compaction_span.set(**compaction_stats)
+            tokens_saved += compaction_stats["tokens_before"] - compaction_stats["tokens_after"]
+
+            # Wait for a slot if model calls are rate limited
+            if rate_limiter:
+                with tracing.span("rate_limiter.acquire"):
+                    rate_limiter.acquire()
+
+            #Call the model to generate content
+            with tracing.span("model.generate_content", iteration=iteration + 1, messages=len(contents)) as model_span:
+                response = client.models.generate_content(
+                model = model_name,
+                contents = contents,
+                config=types.GenerateContentConfig(
+                    tools=[available_functions],
+                    system_instruction=system_prompt
+                    )
+                )
+
+                # Get token usage (if available)
+                usage = getattr(response, "usage_metadata", None)
+                if usage:
+                    pt = getattr(usage, "prompt_token_count", 0) or 0
+                    ct = getattr(usage, "candidates_token_count", 0) or 0
+                    prompt_tokens += pt
+                    response_tokens += ct
+                    model_span.set(prompt_tokens=pt, response_tokens=ct)
+
+            # If verbose, print debug information
+            if verbose:
+                print(f"User prompt: {user_prompt}")
+                print(f"Prompt tokens: {prompt_tokens}")
+                print(f"Response tokens: {response_tokens}")
+                print(f"Tokens saved by compaction (estimated): {tokens_saved}")
+                cache_stats = tool_cache.stats()
+                print(f"Tool cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+                if prefetcher.enabled:
+                    prefetch_stats = prefetcher.stats()
+                    print(
+                        f"Prefetch: {prefetch_stats['hits']} hits, {prefetch_stats['misses']} misses, "
+                        f"{prefetch_stats['unused']} prefetched files never read"
+                    )
+
+            # Add each candidate’s content to the conversation
+            if getattr(response, "candidates", None):
+                for candidate in response.candidates:
+                    if hasattr(candidate, "content") and candidate.content:
+                        messages.append(candidate.content)  # Add model’s reply
+
+                        # Collect the function calls inside this candidate
+                        function_call_parts = [
+                            part.function_call
+                            for part in candidate.content.parts or []
+                            if hasattr(part, "function_call") and part.function_call
+                        ]
+                        if not function_call_parts:
+                            continue
+
+                        # Run the calls concurrently, results come back in the original order
+                        function_call_results, turn_stats = execute_function_calls(
+                            function_call_parts,
+                            verbose=verbose,
+                            working_directory=working_directory,
+                            quiet=quiet,
+                        )
+
+                        tool_wall_time += turn_stats["wall_time"]
+                        tool_timings.extend(
+                            (function_call.name, duration)
+                            for function_call, duration in zip(function_call_parts, turn_stats["durations"])
+                        )
+
+                        for function_call_result in function_call_results:
+                            # Validate result structure
+                            try:
+                                response_data = function_call_result.parts[0].function_response.response
+                            except (AttributeError, IndexError) as e:
+                                raise RuntimeError(
+                                    f"❌ Fatal: call_function() did not return a valid response structure: {e}"
+                                )
+
+                            # Print function call result if verbose
+                            if verbose:
+                                print(f"-> {response_data}")
+
+                            # Convert the function response into a user message
+                            function_response_message = types.Content(
+                                role="user",
+                                parts=function_call_result.parts,
+                            )
+
+                            # Add it to the ongoing conversation
+                            messages.append(function_response_message)
+
+                        # Print tool timing for this turn if verbose
+                        if verbose:
+                            print(
+                                f"Tool calls: {turn_stats['calls']}, "
+                                f"wall-clock: {turn_stats['wall_time']:.3f}s, "
+                                f"summed tool time: {turn_stats['tool_time']:.3f}s"
+                            )
+
+            done_texts = []
+            for cand in getattr(response, "candidates", None) or []:
+                content = getattr(cand, "content", None)
+                if not content or not content.parts: continue
+                has_call = any(getattr(p, "function_call", None) for p in content.parts)
+                if not has_call:
+                    for p in content.parts:
+                        if getattr(p, "text", None):
+                            done_texts.append(p.text)
+
+            # Save the messages this iteration added, with the running totals
+            if checkpoint:
+                with tracing.span("checkpoint.save", messages=len(messages) - saved):
+                    checkpoint.save_iteration(
+                        iteration + 1,
+                        messages[saved:],
+                        prompt_tokens,
+                        response_tokens,
+                        "\n".join(done_texts) or None,
+                    )
+                saved = len(messages)
+
+            if done_texts:
+                result["final_response"] = "\n".join(done_texts)
+                if not quiet:
+                    print("Final response:")
+                    print(result["final_response"])
+                break
+
+        except Exception as e:
+            result["error"] = f"Error during iteration {iteration + 1}: {e}"
+            if not quiet:
+                print(f"❌ {result['error']}")
+            break
+    else:
+        result["error"] = "Max iterations reached without final response."
+        if not quiet:
+            print(f"⚠️ {result['error']}")
+
+
+    # If the model didn’t call a function, print fallback text
+    if response is not None and not getattr(response, "candidates", None) and not quiet:
+        print(getattr(response, "text", None) or "⚠️ No text content found in response.")
+
+    result.update({
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "iterations": iteration + 1,
+        "tool_wall_time": tool_wall_time,
+        "tool_timings": tool_timings,
+    })
+    return result
@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+from config import *
+from call_function import call_function, get_available_functions, tool_cache
+from executor import CallOrdering
+from compaction import compact_messages
+import tracing
+
+
+async def run_agent_async(
+    client,
+    user_prompt,
+    verbose=False,
+    max_iterations=MAX_ITERATIONS,
+    working_directory=WORKING_DIRECTORY,
+):
+    """
+    Runs the agent loop on the async client with streamed model responses.
+
+    Function calls are dispatched as soon as their parts arrive in the stream,
+    so tools run while the model is still generating. Text is printed as it arrives.
+
+    Parameters:
+        client: A genai.Client (or any object exposing client.aio.models.generate_content_stream).
+        user_prompt (str): The prompt from the user.
+        verbose (bool): Whether to print detailed information.
+        max_iterations (int): Upper bound on model turns.
+        working_directory (str): Directory the tools are constrained to.
+
+    Returns:
+        str | None: The final text response, or None if the loop ended without one.
+    """
+    from google.genai import types
+
+    available_functions = get_available_functions()
+    messages = [
+        types.Content(role="user", parts=[types.Part(text=user_prompt)]),
+    ]
+
+    prompt_tokens = 0
+    response_tokens = 0
+    tokens_saved = 0
+
+    # Bound the number of tools running at the same time
+    semaphore = asyncio.Semaphore(MAX_TOOL_WORKERS)
+
+    async def run_call(function_call, earlier):
+        # Reads wait for earlier writes to their path, scripts for every earlier write
+        if earlier:
+            await asyncio.wait(earlier)
+        async with semaphore:
+            return await asyncio.to_thread(
+                call_function, function_call, verbose=verbose, working_directory=working_directory
+            )
+
+    for iteration in range(max_iterations):
+        try:
+            model_parts = []
+            tasks = []
+            ordering = CallOrdering()
+            turn_usage = None
+            printed_text = False
+            first_chunk_time = None
+
+            # Compact old history so the prompt doesn't grow with every iteration
+            with tracing.span("compaction", iteration=iteration + 1) as compaction_span:
+                contents, compaction_stats = compact_messages(messages)
+                compaction_span.set(**compaction_stats)
+            tokens_saved += compaction_stats["tokens_before"] - compaction_stats["tokens_after"]
+
+            with tracing.span("model.generate_content_stream", iteration=iteration + 1, messages=len(contents)) as model_span:
+                stream_start = time.perf_counter()
+                stream = await client.aio.models.generate_content_stream(
+                    model=model_name,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                        tools=[available_functions],
+                        system_instruction=system_prompt,
+                    ),
+                )
+
+                async for chunk in stream:
+                    # Time to first chunk, the latency the user actually waits for
+                    if first_chunk_time is None:
+                        first_chunk_time = time.perf_counter() - stream_start
+                        model_span.set(first_chunk_ms=round(first_chunk_time * 1000, 3))
+
+                    # Usage is cumulative, the last chunk that carries it wins
+                    if getattr(chunk, "usage_metadata", None):
+                        turn_usage = chunk.usage_metadata
+
+                    for candidate in getattr(chunk, "candidates", None) or []:
+                        content = getattr(candidate, "content", None)
+                        if not content or not content.parts:
+                            continue
+
+                        for part in content.parts:
+                            model_parts.append(part)
+
+                            # Dispatch the tool right away, don't wait for the stream to end
+                            if getattr(part, "function_call", None):
+                                earlier = [tasks[index] for index in ordering.add(part.function_call)]
+                                tasks.append(asyncio.create_task(run_call(part.function_call, earlier)))
+
+                            # Print text incrementally
+                            elif getattr(part, "text", None):
+                                print(part.text, end="", flush=True)
+                                printed_text = True
+
+                if turn_usage:
+                    model_span.set(
+                        prompt_tokens=getattr(turn_usage, "prompt_token_count", 0) or 0,
+                        response_tokens=getattr(turn_usage, "candidates_token_count", 0) or 0,
+                        function_calls=len(tasks),
+                    )
+
+            if printed_text:
+                print()
+
+            if turn_usage:
+                prompt_tokens += getattr(turn_usage, "prompt_token_count", 0) or 0
+                response_tokens += getattr(turn_usage, "candidates_token_count", 0) or 0
+
+            if verbose:
+                print(f"User prompt: {user_prompt}")
+                print(f"Prompt tokens: {prompt_tokens}")
+                print(f"Response tokens: {response_tokens}")
+                print(f"Tokens saved by compaction (estimated): {tokens_saved}")
+                cache_stats = tool_cache.stats()
+                print(f"Tool cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
+            if not model_parts:
+                print("⚠️ No text content found in response.")
+                return None
+
+            # Add the model's reply to the conversation
+            messages.append(types.Content(role="model", parts=model_parts))
+
+            # No function calls means the model is done
+            if not tasks:
+                return "".join(part.text for part in model_parts if getattr(part, "text", None))
+
+            # Add the tool responses in the original part order
+            for function_call_result in await asyncio.gather(*tasks):
+                if verbose:
+                    print(f"-> {function_call_result.parts[0].function_response.response}")
+                messages.append(types.Content(role="user", parts=function_call_result.parts))
+
+        except Exception as e:
+            print(f"❌ Error during iteration {iteration + 1}: {e}")
+            return None
+
+    print("⚠️ Max iterations reached without final response.")
+    return None
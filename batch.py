@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import *
+from agent import run_agent
+import search_index
+import workspace_tracker
+import tracing
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that no more than requests_per_minute start in any minute.
+
+    Shared by all sessions of a batch, acquire() blocks until the caller's slot.
+    """
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def read_prompts(prompts_path):
+    """
+    Yields (line_number, record, error) for every non-empty line of a JSONL prompts file.
+
+    A record is an object with a "prompt" and optionally an "id" and a
+    "working_directory" to copy instead of WORKING_DIRECTORY. For a line that is
+    not valid JSON or not an object, record is None and error says why, so one
+    bad line doesn't stop the batch.
+    """
+    with open(prompts_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"Error: line {line_number} is not valid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, f"Error: line {line_number} is not a JSON object"
+                continue
+            yield line_number, record, None
+
+
+def run_session(client, record, line_number, rate_limiter, verbose=False):
+    """
+    Runs one batch session on its own copy of the working directory.
+
+    Returns:
+        dict: The session id, final response, token usage and timing.
+    """
+    session_id = record.get("id", line_number)
+    source_directory = record.get("working_directory", WORKING_DIRECTORY)
+    start = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(prefix="agent-session-") as session_directory:
+        workspace = os.path.join(session_directory, "workspace")
+        shutil.copytree(source_directory, workspace, ignore=shutil.ignore_patterns("__pycache__"))
+        try:
+            with tracing.span("batch.session", id=session_id):
+                result = run_agent(
+                    client,
+                    record["prompt"],
+                    verbose=verbose,
+                    working_directory=workspace,
+                    rate_limiter=rate_limiter,
+                    quiet=True,
+                )
+        finally:
+            search_index.discard_index(workspace)
+            workspace_tracker.discard_tracker(workspace)
+
+    # Summarize tool timings, the per-call list is too big for the output
+    tool_timings = result.pop("tool_timings")
+    result["tool_calls"] = len(tool_timings)
+    result["tool_wall_time"] = round(result["tool_wall_time"], 3)
+    result["id"] = session_id
+    result["duration"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(
+    client,
+    prompts_path,
+    output_path="-",
+    concurrency=BATCH_CONCURRENCY,
+    requests_per_minute=BATCH_REQUESTS_PER_MINUTE,
+    verbose=False,
+):
+    """
+    Runs every prompt of a JSONL file as its own agent session, concurrently in this process.
+
+    All sessions share the client and a rate limiter. Each result is written as one
+    NDJSON line as soon as its session finishes, so the output is in completion order.
+
+    Parameters:
+        client (genai.Client): The shared Gemini client.
+        prompts_path (str): Path of the JSONL file with one prompt record per line.
+        output_path (str): Path of the NDJSON output, "-" for STDOUT.
+        concurrency (int): Maximum number of sessions running at the same time.
+        requests_per_minute (float): Maximum model calls per minute across all sessions, 0 for no limit.
+        verbose (bool): Whether to print detailed information.
+
+    Returns:
+        dict: Totals over all sessions.
+    """
+    rate_limiter = RateLimiter(requests_per_minute)
+    totals = {"sessions": 0, "errors": 0, "prompt_tokens": 0, "response_tokens": 0}
+
+    output = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+
+    def write_result(result):
+        totals["sessions"] += 1
+        totals["errors"] += 1 if result.get("error") else 0
+        totals["prompt_tokens"] += result.get("prompt_tokens", 0)
+        totals["response_tokens"] += result.get("response_tokens", 0)
+
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {}
+            for line_number, record, error in read_prompts(prompts_path):
+                if error:
+                    # Malformed lines are reported right away, the other sessions still run
+                    write_result({"id": line_number, "error": error})
+                    continue
+                futures[pool.submit(run_session, client, record, line_number, rate_limiter, verbose)] = (line_number, record)
+
+            for future in as_completed(futures):
+                line_number, record = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # A session that failed to even start (e.g. missing prompt) is reported in place
+                    result = {"id": record.get("id", line_number), "error": f"Error: {e}"}
+                write_result(result)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if verbose:
+        print(
+            f"Batch finished: {totals['sessions']} sessions, {totals['errors']} errors, "
+            f"{totals['prompt_tokens']} prompt tokens, {totals['response_tokens']} response tokens",
+            file=sys.stderr,
+        )
+    return totals
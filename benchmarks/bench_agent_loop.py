@@ -0,0 +1,145 @@
+# bench_agent_loop.py
+#
+# Runs the agent loop offline against scripted model responses and reports
+# per-iteration loop overhead, tool latency distributions and peak memory.
+#
+# Usage: python benchmarks/bench_agent_loop.py [--runs N] [--scenario NAME]
+#        python benchmarks/bench_agent_loop.py --replay session.jsonl "<prompt>"
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import WORKING_DIRECTORY
+from agent import run_agent
+from model_backend import ReplayClient, ScriptedClient, function_call_response, text_response
+
+CALCULATOR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "calculator")
+
+
+def read_files_scenario(workspace):
+    """
+    List a directory, then read 50 files in batches of 10 parallel calls.
+    """
+    os.makedirs(os.path.join(workspace, "src"))
+    for i in range(50):
+        with open(os.path.join(workspace, "src", f"module{i}.py"), "w", encoding="utf-8") as f:
+            for j in range(200):
+                f.write(f"def function_{i}_{j}(value):\n    return value * {j}\n")
+
+    script = [function_call_response(("get_files_info", {"directory": "src"}))]
+    for batch in range(5):
+        script.append(function_call_response(*[
+            ("get_file_content", {"file_path": f"src/module{i}.py"}) for i in range(batch * 10, batch * 10 + 10)
+        ]))
+    script.append(text_response("Read 50 modules."))
+    return ScriptedClient(script), "Summarize the modules in src"
+
+
+def fix_calculator_scenario(workspace):
+    """
+    Run the tests of a calculator with a broken operator, read the source, fix it and rerun.
+    """
+    shutil.copytree(CALCULATOR_DIR, workspace, dirs_exist_ok=True, ignore=shutil.ignore_patterns("__pycache__"))
+    source_path = os.path.join(workspace, "pkg", "calculator.py")
+    with open(source_path, encoding="utf-8") as f:
+        fixed_source = f.read()
+    with open(source_path, "w", encoding="utf-8") as f:
+        f.write(fixed_source.replace('"+": add,', '"+": sub,'))
+
+    script = [
+        function_call_response(("run_python_file", {"file_path": "tests.py"})),
+        function_call_response(("get_file_content", {"file_path": "pkg/calculator.py"})),
+        function_call_response(("write_file", {"file_path": "pkg/calculator.py", "content": fixed_source})),
+        function_call_response(("run_python_file", {"file_path": "tests.py"})),
+        text_response("Fixed the + operator."),
+    ]
+    return ScriptedClient(script), "The calculator tests fail, fix the bug"
+
+
+def small_turns_scenario(workspace):
+    """
+    Many cheap iterations, dominated by the loop itself rather than the tools.
+    """
+    with open(os.path.join(workspace, "notes.txt"), "w", encoding="utf-8") as f:
+        f.write("note\n" * 20)
+    script = [function_call_response(("get_file_content", {"file_path": "notes.txt"})) for _ in range(18)]
+    script.append(text_response("Done."))
+    return ScriptedClient(script), "Read the notes repeatedly"
+
+
+SCENARIOS = {
+    "read_50_files": read_files_scenario,
+    "fix_calculator_bug": fix_calculator_scenario,
+    "small_turns": small_turns_scenario,
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_once(client, prompt, workspace):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = run_agent(client, prompt, working_directory=workspace, quiet=True)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if result["error"]:
+        raise RuntimeError(result["error"])
+    return result, elapsed, peak
+
+
+def report(name, runs):
+    overheads = [(elapsed - result["tool_wall_time"]) / result["iterations"] for result, elapsed, _ in runs]
+    tool_timings = {}
+    for result, _, _ in runs:
+        for tool_name, duration in result["tool_timings"]:
+            tool_timings.setdefault(tool_name, []).append(duration)
+
+    print(f"{name}: {runs[0][0]['iterations']} iterations, {len(runs)} runs")
+    print(f"    total: p50 {percentile([elapsed for _, elapsed, _ in runs], 0.5) * 1000:8.1f} ms")
+    print(f"    loop overhead per iteration: p50 {percentile(overheads, 0.5) * 1000:7.2f} ms, max {max(overheads) * 1000:7.2f} ms")
+    for tool_name, durations in sorted(tool_timings.items()):
+        print(
+            f"    {tool_name:<18} x{len(durations):<4} p50 {percentile(durations, 0.5) * 1000:7.2f} ms, "
+            f"p95 {percentile(durations, 0.95) * 1000:7.2f} ms, max {max(durations) * 1000:7.2f} ms"
+        )
+    print(f"    peak traced memory: {max(peak for _, _, peak in runs) / 1024:.0f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    parser.add_argument("--replay", help="Replay a session recorded with main.py --record instead")
+    parser.add_argument("prompt", nargs="?", help="The prompt of the recorded session")
+    options = parser.parse_args()
+
+    if options.replay:
+        if not options.prompt:
+            parser.error("--replay needs the prompt of the recorded session")
+        runs = [run_once(ReplayClient(options.replay), options.prompt, WORKING_DIRECTORY) for _ in range(options.runs)]
+        report(os.path.basename(options.replay), runs)
+        return
+
+    for name in options.scenario or list(SCENARIOS):
+        runs = []
+        for _ in range(options.runs):
+            # Every run gets a fresh workspace, so tool cache entries never carry over
+            with tempfile.TemporaryDirectory() as workspace:
+                client, prompt = SCENARIOS[name](workspace)
+                runs.append(run_once(client, prompt, workspace))
+        report(name, runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# bench_calculator.py
+#
+# Compares Calculator.evaluate (compiled, cached programs) with the
+# shunting-yard interpreter it replaced, on a set of repeated expression
+# templates and on expressions that are never seen twice, and fails if a cache
+# miss is more than --tolerance times slower than the interpreter. With NumPy
+# installed it also compares evaluate_batch with a Python loop over the same rows.
+#
+# Usage: python benchmarks/bench_calculator.py [--evaluations N] [--templates N] [--rows N] [--rounds N] [--tolerance X]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "calculator"))
+
+from pkg.calculator import Calculator
+
+OPERATORS = ["+", "-", "*", "/"]
+
+
+def make_expressions(count, terms, rng):
+    expressions = []
+    for _ in range(count):
+        parts = [str(rng.randint(1, 99))]
+        for _ in range(terms - 1):
+            parts += [rng.choice(OPERATORS), str(rng.randint(1, 99))]
+        expressions.append(" ".join(parts))
+    return expressions
+
+
+def measure(function, expressions):
+    start = time.perf_counter()
+    for expression in expressions:
+        function(expression)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--evaluations", type=int, default=500000)
+    parser.add_argument("--templates", type=int, default=200)
+    parser.add_argument("--terms", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1.2)
+    options = parser.parse_args()
+
+    rng = random.Random(0)
+    templates = make_expressions(options.templates, options.terms, rng)
+    repeated = [rng.choice(templates) for _ in range(options.evaluations)]
+    unique = make_expressions(options.evaluations // 10, options.terms, rng)
+
+    calculator = Calculator()
+    interpret = lambda expression: calculator._evaluate_infix(expression.strip().split())
+
+    failures = []
+    for name, expressions in (("repeated templates", repeated), ("unique expressions", unique)):
+        # Best of alternating rounds, each compiled round starting with an empty cache
+        interpreted = compiled = float("inf")
+        for _ in range(options.rounds):
+            interpreted = min(interpreted, measure(interpret, expressions))
+            calculator.compile.cache_clear()
+            compiled = min(compiled, measure(calculator.evaluate, expressions))
+        per_call = lambda seconds: seconds / len(expressions) * 1e9
+        print(f"{name} ({len(expressions)} evaluations, {options.terms} terms):")
+        print(f"    interpreter: {per_call(interpreted):8.0f} ns/eval")
+        print(f"    compiled:    {per_call(compiled):8.0f} ns/eval ({interpreted / compiled:.1f}x)")
+        print(f"    cache: {calculator.compile.cache_info()}")
+        if compiled > interpreted * options.tolerance:
+            failures.append(f"{name}: {per_call(compiled):.0f} ns/eval, the interpreter takes {per_call(interpreted):.0f}")
+
+    measure_batch(calculator, options.rows)
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+def measure_batch(calculator, rows):
+    try:
+        import numpy as np
+    except ImportError:
+        print("NumPy is not installed, skipping evaluate_batch")
+        return
+
+    expression = "price * qty - price * discount / 100 + shipping"
+    rng = np.random.default_rng(0)
+    columns = {
+        "price": rng.uniform(1, 100, rows),
+        "qty": rng.integers(1, 10, rows).astype(np.float64),
+        "discount": rng.uniform(0, 30, rows),
+        "shipping": rng.uniform(0, 5, rows),
+    }
+
+    start = time.perf_counter()
+    batch = calculator.evaluate_batch(expression, columns)
+    vectorized = time.perf_counter() - start
+
+    # The scalar path over a sample of the rows, extrapolated
+    sample = min(rows, 20000)
+    start = time.perf_counter()
+    for i in range(sample):
+        row = expression
+        for name, column in columns.items():
+            row = row.replace(name, repr(float(column[i])))
+        assert calculator.evaluate(row) == batch[i]
+    looped = (time.perf_counter() - start) * rows / sample
+
+    print(f"evaluate_batch ({rows} rows, \"{expression}\"):")
+    print(f"    vectorized: {vectorized * 1000:8.1f} ms")
+    print(f"    scalar loop: {looped * 1000:8.1f} ms (estimated from {sample} rows, {looped / vectorized:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# bench_run_python_file.py
+#
+# Compares per-call latency of run_python_file with a fresh interpreter (cold)
+# and with the warm interpreter pool.
+#
+# Usage: python benchmarks/bench_run_python_file.py [--runs N]
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interpreter_pool
+from functions.run_python_file import run_python_file
+
+CASES = [
+    ("calculator main.py", "main.py", ["3 + 5"]),
+    ("calculator tests.py", "tests.py", []),
+]
+
+
+def measure(file_path, args, warm, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run_python_file("calculator", file_path, args, warm=warm)
+        timings.append(time.perf_counter() - start)
+        if result.startswith("Error:"):
+            raise RuntimeError(result)
+    return timings
+
+
+def describe(timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f"mean {statistics.mean(timings) * 1000:7.1f} ms, p50 {statistics.median(timings) * 1000:7.1f} ms, p95 {p95 * 1000:7.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    options = parser.parse_args()
+
+    if not interpreter_pool.available():
+        print("Warm interpreter pool is not available on this platform.")
+        return
+
+    # Start the workers up front, the benchmark measures steady-state calls
+    start = time.perf_counter()
+    interpreter_pool.get_pool()
+    print(f"Pool startup: {(time.perf_counter() - start) * 1000:.1f} ms (once per agent process)")
+
+    for name, file_path, args in CASES:
+        cold = measure(file_path, args, warm=False, runs=options.runs)
+        warm = measure(file_path, args, warm=True, runs=options.runs)
+        print(f"{name}:")
+        print(f"    cold: {describe(cold)}")
+        print(f"    warm: {describe(warm)}")
+        print(f"    speedup: {statistics.median(cold) / statistics.median(warm):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# bench_search.py
+#
+# Compares search_files (trigram index) against a naive walk-and-grep
+# on a synthetic source tree.
+#
+# Usage: python benchmarks/bench_search.py [--files N] [--lines N]
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_index
+from functions.search_files import search_files
+
+WORDS = ["value", "result", "parser", "token", "buffer", "index", "record", "stream", "config", "handler"]
+
+
+def make_tree(root, files, lines):
+    rng = random.Random(0)
+    for i in range(files):
+        directory = os.path.join(root, f"pkg{i % 50}", f"mod{i % 7}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{i}.py"), "w", encoding="utf-8") as f:
+            for j in range(lines):
+                a, b = rng.choice(WORDS), rng.choice(WORDS)
+                f.write(f"    {a}_{j} = compute_{b}({a}, {j})\n")
+            # A rare symbol that only a few files contain
+            if i % 97 == 0:
+                f.write("def rare_symbol_lookup(table):\n    return table\n")
+
+
+def naive_search(root, query):
+    pattern = re.compile(re.escape(query))
+    hits = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8") as f:
+                for number, line in enumerate(f, start=1):
+                    if pattern.search(line):
+                        hits.append((path, number))
+    return hits
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=200)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as index_dir:
+        make_tree(root, options.files, options.lines)
+        search_index.SEARCH_INDEX_DIR = index_dir
+        query = "rare_symbol_lookup"
+
+        naive_hits, naive_time = timed(naive_search, root, query)
+        _, cold_time = timed(search_files, root, query, max_results=1000)
+        # Drop the in-memory index so the next search loads it from disk
+        search_index._indexes.clear()
+        _, load_time = timed(search_files, root, query, max_results=1000)
+        result, warm_time = timed(search_files, root, query, max_results=1000)
+
+        index_hits = len([line for line in result.splitlines() if ":" in line and not line.startswith("[")])
+        print(f"Tree: {options.files} files x {options.lines} lines, query {query!r}")
+        print(f"Hits: naive={len(naive_hits)} index={index_hits}")
+        print(f"Naive walk-and-grep:      {naive_time * 1000:9.1f} ms")
+        print(f"Index build (cold):       {cold_time * 1000:9.1f} ms")
+        print(f"Index load from disk:     {load_time * 1000:9.1f} ms")
+        print(f"Indexed search (warm):    {warm_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# bench_server.py
+#
+# Load test of the agent server against a stubbed model backend. Client threads
+# post sessions over HTTP (or a Unix socket) to a set of workspaces, one of
+# them "hot" with many more sessions than the others, and the report shows
+# throughput, end-to-end latency and the time sessions waited for a slot per
+# workspace, which shows whether the hot workspace starves the others.
+#
+# Usage: python benchmarks/bench_server.py [--sessions N] [--clients N] [--workspaces N]
+#            [--concurrency N] [--model-latency MS] [--rpm N] [--unix]
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_backend import ScriptedClient, function_call_response, text_response
+from server import AgentServer
+
+
+class LatencyClient:
+    """
+    Sleeps before every model call, like the network and the model would.
+    """
+
+    def __init__(self, client, latency):
+        self.client = client
+        self.latency = latency
+        self.models = self
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latency)
+        return self.client.models.generate_content(model=model, contents=contents, config=config)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def read_then_answer(contents):
+    # List the workspace, read one file, answer
+    if len(contents) == 1:
+        return function_call_response(("get_files_info", {"directory": "."}))
+    if len(contents) == 3:
+        return function_call_response(("get_file_content", {"file_path": "module.py"}))
+    return text_response("Done.")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--workspaces", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model-latency", type=float, default=20, help="Milliseconds per model call")
+    parser.add_argument("--rpm", type=float, default=0, help="Model calls per minute, 0 for no limit")
+    parser.add_argument("--unix", action="store_true", help="Listen on a Unix socket instead of TCP")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        workspaces = []
+        for index in range(options.workspaces):
+            workspace = os.path.join(root, f"workspace{index}")
+            os.makedirs(workspace)
+            with open(os.path.join(workspace, "module.py"), "w", encoding="utf-8") as f:
+                f.write("def handler(value):\n    return value\n" * 50)
+            workspaces.append(workspace)
+
+        # Half of the sessions go to the first workspace
+        targets = [
+            workspaces[0] if index % 2 == 0 else workspaces[1 + index // 2 % (len(workspaces) - 1)]
+            for index in range(options.sessions)
+        ] if len(workspaces) > 1 else workspaces * options.sessions
+
+        address = f"unix:{os.path.join(root, 'agent.sock')}" if options.unix else "127.0.0.1:0"
+        client = LatencyClient(ScriptedClient(read_then_answer), options.model_latency / 1000)
+        results = []
+        lock = threading.Lock()
+
+        with AgentServer(
+            client, address, allowed_roots=[root], max_sessions=options.concurrency, requests_per_minute=options.rpm
+        ) as server:
+            def connect():
+                if options.unix:
+                    return UnixHTTPConnection(address[len("unix:"):])
+                return http.client.HTTPConnection(server.url.removeprefix("http://"))
+
+            def worker(indexes):
+                # One keep-alive connection per client thread
+                connection = connect()
+                for index in indexes:
+                    start = time.perf_counter()
+                    connection.request("POST", "/sessions", body=json.dumps({"prompt": "Summarize", "working_directory": targets[index]}))
+                    response = connection.getresponse()
+                    body = json.loads(response.read())
+                    elapsed = time.perf_counter() - start
+                    if response.status != 200 or body["error"]:
+                        raise RuntimeError(body)
+                    with lock:
+                        results.append((targets[index], elapsed, body["queued"]))
+                connection.close()
+
+            start = time.perf_counter()
+            threads = [
+                threading.Thread(target=worker, args=(range(number, options.sessions, options.clients),))
+                for number in range(options.clients)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall_time = time.perf_counter() - start
+            stats = server.stats()
+
+    latencies = [elapsed for _, elapsed, _ in results]
+    transport = "Unix socket" if options.unix else "TCP"
+    print(f"{len(results)} sessions over {transport}, {options.clients} clients, {options.concurrency} slots, "
+          f"{options.model_latency:.0f} ms per model call")
+    print(f"    throughput: {len(results) / wall_time:8.1f} sessions/s")
+    print(f"    latency: p50 {percentile(latencies, 0.5) * 1000:8.1f} ms, p95 {percentile(latencies, 0.95) * 1000:8.1f} ms")
+    for index, workspace in enumerate(workspaces):
+        queued = [waited for target, _, waited in results if target == workspace]
+        if queued:
+            print(f"    workspace{index}: {len(queued):4} sessions, queued p50 {percentile(queued, 0.5) * 1000:8.1f} ms, "
+                  f"p95 {percentile(queued, 0.95) * 1000:8.1f} ms")
+    print(f"    tool cache: {stats['tool_cache']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench_startup.py
+#
+# Measures cold-start import time of the agent with -X importtime and fails
+# (exit code 1) if it exceeds the budget or if google.genai is imported
+# before the first model call.
+#
+# Usage: python benchmarks/bench_startup.py [--runs N] [--budget-ms MS]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must stay cheap to import, with their budget in milliseconds
+TARGETS = {
+    "main": 150,
+    "call_function": 100,
+}
+
+# Modules that must not be imported at startup
+DEFERRED_MODULES = ["google.genai", "asyncio"]
+
+
+def import_time(module):
+    """
+    Imports module in a fresh interpreter.
+
+    Returns:
+        tuple[float, set[str]]: The cumulative import time in milliseconds, and
+        the names of all modules imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            cumulative = int(cumulative_us) / 1000
+    return cumulative, imported
+
+
+def help_time():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--help"], cwd=ROOT, capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, help="Override the budget of every target")
+    options = parser.parse_args()
+
+    failures = []
+    for module, budget in TARGETS.items():
+        budget = options.budget_ms or budget
+        timings = []
+        for _ in range(options.runs):
+            cumulative, imported = import_time(module)
+            timings.append(cumulative)
+
+        median = statistics.median(timings)
+        print(f"import {module}: median {median:6.1f} ms, min {min(timings):6.1f} ms (budget {budget:.0f} ms)")
+        if median > budget:
+            failures.append(f"import {module} took {median:.1f} ms, budget is {budget:.0f} ms")
+
+        for deferred in DEFERRED_MODULES:
+            if deferred in imported:
+                failures.append(f"import {module} imports {deferred}, it should only be loaded when used")
+
+    timings = [help_time() for _ in range(options.runs)]
+    print(f"python main.py --help: median {statistics.median(timings):6.1f} ms wall-clock (incl. interpreter startup)")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
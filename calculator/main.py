@@ -10,9 +10,14 @@ def main():
     if len(sys.argv) <= 1:
         print("Calculator App")
         print('Usage: python main.py "<expression>"')
+        print("       python main.py --stream [file] [--workers N]")
         print('Example: python main.py "3 + 5"')
         return
 
+    if sys.argv[1] == "--stream":
+        stream(sys.argv[2:])
+        return
+
     expression = " ".join(sys.argv[1:])
     try:
         result = calculator.evaluate(expression)
@@ -25,5 +30,30 @@ def main():
         print(f"Error: {e}")
 
 
+def stream(args):
+    # One expression per line from a file (or stdin), one NDJSON result per line on stdout
+    from pkg.stream import stream_expressions
+
+    workers = 1
+    if "--workers" in args:
+        index = args.index("--workers")
+        try:
+            workers = int(args[index + 1])
+        except (IndexError, ValueError):
+            print("Error: --workers needs a number.")
+            sys.exit(1)
+        args = args[:index] + args[index + 2:]
+
+    if not args or args[0] == "-":
+        stream_expressions(sys.stdin, sys.stdout, workers)
+        return
+    try:
+        with open(args[0], encoding="utf-8") as f:
+            stream_expressions(f, sys.stdout, workers)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
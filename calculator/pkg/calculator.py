@@ -1,12 +1,131 @@
 # calculator.py
 
+from functools import lru_cache
+from operator import add, mul, sub, truediv
+
+# Number of compiled expressions each Calculator keeps
+COMPILE_CACHE_SIZE = 4096
+
+
+class CompiledExpression:
+    """
+    An expression compiled to a postfix (RPN) program.
+
+    The code holds numbers, variable names and operator functions in the order the
+    shunting-yard algorithm applies them. An error found while compiling (invalid token, missing
+    operand) is raised after the code ran, exactly where the interpreter would
+    have raised it, so a division by zero earlier in the expression still wins.
+    """
+
+    __slots__ = ("code", "error", "result", "exception", "variables")
+
+    def __init__(self, code, error=None):
+        self.code = code
+        self.error = error
+        self.result = None
+        self.exception = None
+        self.variables = {instruction for instruction in code if instruction.__class__ is str}
+
+        # Programs of plain numbers always give the same result, run them once
+        if not self.variables:
+            try:
+                self.result = self._run()
+            except (ValueError, ZeroDivisionError) as e:
+                self.exception = e
+
+    def _run(self):
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        for instruction in self.code:
+            if instruction.__class__ is float:
+                push(instruction)
+            else:
+                b = pop()
+                stack[-1] = instruction(stack[-1], b)
+
+        if self.error is not None:
+            raise self.error
+        return stack[0]
+
+    @classmethod
+    def constant(cls, result=None, exception=None):
+        """
+        Returns a program that was already evaluated, holding its result or exception.
+        """
+        program = cls.__new__(cls)
+        program.code = ()
+        program.error = None
+        program.variables = frozenset()
+        program.result = result
+        program.exception = exception
+        return program
+
+    def run(self):
+        if self.exception is not None:
+            # A fresh exception each time, re-raising one instance would keep growing its traceback
+            raise self.exception.__class__(*self.exception.args)
+        return self.result
+
+    def run_batch(self, columns):
+        """
+        Runs the program over NumPy arrays, one vectorized operation per instruction.
+
+        Division by zero in any row raises ZeroDivisionError like the scalar path,
+        at the same point of the program. Intermediate arrays are reused as outputs,
+        so a long expression allocates about as many arrays as it has variables.
+
+        Parameters:
+            columns (dict[str, numpy.ndarray]): Float arrays by variable name.
+
+        Returns:
+            numpy.ndarray | float: The result column, or a float if no variable was used.
+        """
+        import numpy as np
+
+        ufuncs = {add: np.add, sub: np.subtract, mul: np.multiply, truediv: np.true_divide}
+        stack = []
+        # Whether the stack entry is an intermediate result that may be overwritten
+        owned = []
+        with np.errstate(all="ignore"):
+            for instruction in self.code:
+                if instruction.__class__ is float:
+                    stack.append(instruction)
+                    owned.append(False)
+                elif instruction.__class__ is str:
+                    if instruction not in columns:
+                        raise ValueError(f"invalid token: {instruction}")
+                    stack.append(columns[instruction])
+                    owned.append(False)
+                else:
+                    b = stack.pop()
+                    b_owned = owned.pop()
+                    a = stack[-1]
+                    if instruction is truediv and np.any(np.equal(b, 0)):
+                        raise ZeroDivisionError("float division by zero")
+                    # Write into an intermediate result of the right shape instead of allocating
+                    shape = np.broadcast_shapes(np.shape(a), np.shape(b))
+                    if owned[-1] and np.shape(a) == shape:
+                        out = a
+                    elif b_owned and np.shape(b) == shape:
+                        out = b
+                    else:
+                        out = None
+                    stack[-1] = ufuncs[instruction](a, b, out=out)
+                    owned[-1] = isinstance(stack[-1], np.ndarray)
+
+        if self.error is not None:
+            raise self.error.__class__(*self.error.args)
+        return stack[0]
+
+
 class Calculator:
     def __init__(self):
         self.operators = {
-            "+": lambda a, b: a + b,
-            "-": lambda a, b: a - b,
-            "*": lambda a, b: a * b,
-            "/": lambda a, b: a / b,
+            "+": add,
+            "-": sub,
+            "*": mul,
+            "/": truediv,
         }
         self.precedence = {
             "+": 1,
@@ -14,12 +133,131 @@ class Calculator:
             "*": 2,
             "/": 2,
         }
+        # Compiled programs by expression string (and whether variables are allowed)
+        self.compile = lru_cache(maxsize=COMPILE_CACHE_SIZE)(self._compile)
 
     def evaluate(self, expression):
         if not expression or expression.isspace():
             return None
-        tokens = expression.strip().split()
-        return self._evaluate_infix(tokens)
+        return self.compile(expression).run()
+
+    def evaluate_batch(self, expression, variables):
+        """
+        Evaluates an expression with named variables over whole columns of values.
+
+        Needs NumPy, which is only imported when this is called.
+
+        Parameters:
+            expression (str): Space-separated expression, e.g. "price * qty - discount".
+            variables (dict[str, array-like]): Values by variable name, broadcast to a common shape.
+
+        Returns:
+            numpy.ndarray | None: The float64 results, None for an empty expression.
+        """
+        import numpy as np
+
+        if not expression or expression.isspace():
+            return None
+
+        columns = {name: np.asarray(values, dtype=np.float64) for name, values in variables.items()}
+        shape = np.broadcast_shapes(*(column.shape for column in columns.values()))
+        program = self.compile(expression, allow_variables=True)
+        result = program.run_batch(columns)
+
+        # Return a new array of the full shape, never one of the input columns
+        if not isinstance(result, np.ndarray) or result.shape != shape or any(
+            result is column for column in columns.values()
+        ):
+            result = np.array(np.broadcast_to(result, shape), dtype=np.float64)
+        return result
+
+    def _compile(self, expression, allow_variables=False):
+        tokens = expression.split()
+        if not allow_variables:
+            # Without variables the result never changes, so a cache miss interprets the
+            # expression once instead of building a program that would only run once
+            try:
+                return CompiledExpression.constant(self._interpret(tokens))
+            except (ValueError, ZeroDivisionError) as e:
+                return CompiledExpression.constant(exception=e)
+
+        code = []
+        operators = []
+        # Number of values the interpreter's stack would hold at this point
+        depth = 0
+
+        try:
+            for token in tokens:
+                if token in self.operators:
+                    while operators and self.precedence[operators[-1]] >= self.precedence[token]:
+                        depth = self._emit_operator(operators, code, depth)
+                    operators.append(token)
+                else:
+                    try:
+                        code.append(float(token))
+                    except ValueError:
+                        if not (allow_variables and token.isidentifier()):
+                            raise ValueError(f"invalid token: {token}")
+                        # A variable, looked up when the program runs
+                        code.append(token)
+                    depth += 1
+
+            while operators:
+                depth = self._emit_operator(operators, code, depth)
+
+            if depth != 1:
+                raise ValueError("invalid expression")
+
+        except ValueError as e:
+            # Compile what came before, the error is raised after running it
+            return CompiledExpression(code, e)
+
+        return CompiledExpression(code)
+
+    def _emit_operator(self, operators, code, depth):
+        operator = operators.pop()
+        if depth < 2:
+            raise ValueError(f"not enough operands for operator {operator}")
+        code.append(self.operators[operator])
+        return depth - 1
+
+    def _interpret(self, tokens):
+        """
+        The shunting-yard interpreter of _evaluate_infix with the operator
+        application inlined, it runs on every cache miss of evaluate().
+        """
+        operators = self.operators
+        precedence = self.precedence
+        values = []
+        pending = []
+
+        for token in tokens:
+            rank = precedence.get(token)
+            if rank is None:
+                try:
+                    values.append(float(token))
+                except ValueError:
+                    raise ValueError(f"invalid token: {token}")
+                continue
+            while pending and precedence[pending[-1]] >= rank:
+                operator = pending.pop()
+                if len(values) < 2:
+                    raise ValueError(f"not enough operands for operator {operator}")
+                b = values.pop()
+                values[-1] = operators[operator](values[-1], b)
+            pending.append(token)
+
+        while pending:
+            operator = pending.pop()
+            if len(values) < 2:
+                raise ValueError(f"not enough operands for operator {operator}")
+            b = values.pop()
+            values[-1] = operators[operator](values[-1], b)
+
+        if len(values) != 1:
+            raise ValueError("invalid expression")
+
+        return values[0]
 
     def _evaluate_infix(self, tokens):
         values = []
@@ -58,4 +296,4 @@ class Calculator:
 
         b = values.pop()
         a = values.pop()
-        values.append(self.operators[operator](a, b))
\ No newline at end of file
+        values.append(self.operators[operator](a, b))
@@ -1,6 +1,7 @@
 # render.py
 
 import json
+import math
 
 
 def format_json_output(expression: str, result: float, indent: int = 2) -> str:
@@ -13,4 +14,54 @@ def format_json_output(expression: str, result: float, indent: int = 2) -> str:
         "expression": expression,
         "result": result_to_dump,
     }
-    return json.dumps(output_data, indent=indent)
\ No newline at end of file
+    return json.dumps(output_data, indent=indent)
+
+
+def format_result(result: float) -> str:
+    # Same numbers as format_json_output, without going through json.dumps for plain floats
+    if isinstance(result, float):
+        if result.is_integer():
+            return str(int(result))
+        if math.isfinite(result):
+            return repr(result)
+    return json.dumps(result)
+
+
+def format_ndjson_line(expression: str, result: float = None, error: str = None) -> str:
+    if error is not None:
+        return f'{{"expression":{json.dumps(expression)},"error":{json.dumps(error)}}}'
+    return f'{{"expression":{json.dumps(expression)},"result":{format_result(result)}}}'
+
+
+class NDJSONWriter:
+    """
+    Collects NDJSON lines and writes them to the stream in large blocks.
+    """
+
+    def __init__(self, stream, buffer_lines: int = 4096):
+        self.stream = stream
+        self.buffer_lines = buffer_lines
+        self.lines = []
+
+    def write_line(self, line: str):
+        self.lines.append(line)
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def write_block(self, block: str):
+        # Already joined lines (e.g. from a worker process), ending with a newline
+        self.flush()
+        self.stream.write(block)
+
+    def flush(self):
+        if self.lines:
+            self.lines.append("")
+            self.stream.write("\n".join(self.lines))
+            self.lines = []
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
@@ -0,0 +1,81 @@
+# stream.py
+
+import collections
+import itertools
+import multiprocessing
+
+from pkg.calculator import Calculator
+from pkg.render import NDJSONWriter, format_ndjson_line
+
+# Lines sent to a worker process at a time
+CHUNK_LINES = 10000
+
+_calculator = None
+
+
+def evaluate_line(calculator: Calculator, line: str) -> str:
+    """
+    Evaluates one input line and returns its NDJSON result, errors included inline.
+    """
+    expression = line.rstrip("\r\n")
+    try:
+        result = calculator.evaluate(expression)
+    except Exception as e:
+        return format_ndjson_line(expression, error=str(e))
+    if result is None:
+        return format_ndjson_line(expression, error="Expression is empty or contains only whitespace.")
+    return format_ndjson_line(expression, result)
+
+
+def _init_worker():
+    global _calculator
+    _calculator = Calculator()
+
+
+def _evaluate_chunk(lines):
+    # One block of output per chunk, so the parent only has to write it
+    return "".join(evaluate_line(_calculator, line) + "\n" for line in lines)
+
+
+def _chunks(lines, size):
+    iterator = iter(lines)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def stream_expressions(lines, output, workers: int = 1, chunk_lines: int = CHUNK_LINES) -> int:
+    """
+    Evaluates expressions line by line and writes one compact NDJSON object per line.
+
+    With workers > 1 the lines are evaluated in chunks by a pool of processes,
+    and the output keeps the input order.
+
+    Parameters:
+        lines: Iterable of expressions, e.g. an open file or sys.stdin.
+        output: Text stream the NDJSON lines are written to.
+        workers (int): Number of worker processes, 1 evaluates in this process.
+        chunk_lines (int): Lines handed to a worker at a time.
+
+    Returns:
+        int: The number of lines evaluated.
+    """
+    count = 0
+    with NDJSONWriter(output) as writer:
+        if workers <= 1:
+            calculator = Calculator()
+            for line in lines:
+                writer.write_line(evaluate_line(calculator, line))
+                count += 1
+            return count
+
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            # Keep a bounded window of chunks in flight and write them back in input order
+            pending = collections.deque()
+            for chunk in _chunks(lines, chunk_lines):
+                pending.append(pool.apply_async(_evaluate_chunk, (chunk,)))
+                count += len(chunk)
+                if len(pending) >= workers * 2:
+                    writer.write_block(pending.popleft().get())
+            while pending:
+                writer.write_block(pending.popleft().get())
+    return count
@@ -1,7 +1,15 @@
 # tests.py
 
+import io
+import json
 import unittest
 from pkg.calculator import Calculator
+from pkg.stream import stream_expressions
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestCalculator(unittest.TestCase):
@@ -44,6 +52,96 @@ class TestCalculator(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.calculator.evaluate("+ 3")
 
+    def test_compiled_matches_interpreter(self):
+        expressions = [
+            "3 + 5", "2 * 3 - 8 / 2 + 5", "3 5 +", "3 5", "+ 3", "$ 3 5",
+            "1 / 0", "1 / 0 + x", "1 / 0 x", "2 - 1 - 1", "8 / 4 / 2", "1e3 * 2",
+        ]
+        for expression in expressions:
+            with self.subTest(expression=expression):
+                try:
+                    expected = ("ok", self.calculator._evaluate_infix(expression.split()))
+                except (ValueError, ZeroDivisionError) as e:
+                    expected = (type(e), str(e))
+                try:
+                    actual = ("ok", self.calculator.evaluate(expression))
+                except (ValueError, ZeroDivisionError) as e:
+                    actual = (type(e), str(e))
+                self.assertEqual(actual, expected)
+
+    def test_division_by_zero_before_later_error(self):
+        # The division runs when "+" arrives, before the invalid token is reached
+        with self.assertRaises(ZeroDivisionError):
+            self.calculator.evaluate("1 / 0 + x")
+        with self.assertRaisesRegex(ValueError, "invalid token: x"):
+            self.calculator.evaluate("1 / 0 x")
+
+    def test_compiled_expressions_are_cached(self):
+        for _ in range(3):
+            self.assertEqual(self.calculator.evaluate("3 * 4 + 5"), 17)
+        with self.assertRaises(ZeroDivisionError):
+            self.calculator.evaluate("1 / 0")
+        with self.assertRaises(ZeroDivisionError):
+            self.calculator.evaluate("1 / 0")
+        info = self.calculator.compile.cache_info()
+        self.assertEqual((info.hits, info.misses), (3, 2))
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_batch_matches_scalar(self):
+        x = [1.0, 2.5, -3.0, 4.0]
+        y = [2.0, 0.5, 8.0, -1.0]
+        results = self.calculator.evaluate_batch("x * 2 + y / 4 - 1", {"x": x, "y": y})
+        expected = [self.calculator.evaluate(f"{a} * 2 + {b} / 4 - 1") for a, b in zip(x, y)]
+        self.assertEqual(results.tolist(), expected)
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_batch_constants_and_inputs(self):
+        x = numpy.array([1.0, 2.0, 3.0])
+        self.assertEqual(self.calculator.evaluate_batch("3 + 4", {"x": x}).tolist(), [7.0, 7.0, 7.0])
+        # The input column is never returned or modified
+        result = self.calculator.evaluate_batch("x", {"x": x})
+        result += 1
+        self.assertEqual(x.tolist(), [1.0, 2.0, 3.0])
+        self.assertIsNone(self.calculator.evaluate_batch(" ", {"x": x}))
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_batch_errors(self):
+        with self.assertRaisesRegex(ZeroDivisionError, "float division by zero"):
+            self.calculator.evaluate_batch("x / y", {"x": [1, 2], "y": [1, 0]})
+        with self.assertRaisesRegex(ValueError, "invalid token: z"):
+            self.calculator.evaluate_batch("x + z", {"x": [1, 2]})
+        with self.assertRaisesRegex(ValueError, "not enough operands for operator \\+"):
+            self.calculator.evaluate_batch("x +", {"x": [1, 2]})
+        # Variables only exist in batch mode
+        with self.assertRaisesRegex(ValueError, "invalid token: x"):
+            self.calculator.evaluate("x + 1")
+
+
+class TestStream(unittest.TestCase):
+    LINES = ["3 + 5\n", "1 / 0\n", "\n", "x + 1\n", "7 / 2\n", "2 * 3 - 8 / 2 + 5"]
+
+    def expected(self):
+        return [
+            {"expression": "3 + 5", "result": 8},
+            {"expression": "1 / 0", "error": "float division by zero"},
+            {"expression": "", "error": "Expression is empty or contains only whitespace."},
+            {"expression": "x + 1", "error": "invalid token: x"},
+            {"expression": "7 / 2", "result": 3.5},
+            {"expression": "2 * 3 - 8 / 2 + 5", "result": 7},
+        ]
+
+    def test_stream_reports_errors_inline(self):
+        output = io.StringIO()
+        count = stream_expressions(self.LINES, output)
+        self.assertEqual(count, len(self.LINES))
+        self.assertEqual([json.loads(line) for line in output.getvalue().splitlines()], self.expected())
+
+    def test_stream_workers_keep_order(self):
+        output = io.StringIO()
+        count = stream_expressions(self.LINES * 50, output, workers=3, chunk_lines=7)
+        self.assertEqual(count, len(self.LINES) * 50)
+        self.assertEqual([json.loads(line) for line in output.getvalue().splitlines()], self.expected() * 50)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
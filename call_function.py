@@ -1,34 +1,110 @@
+import json
+import os
 import sys
-from google.genai import types
+import threading
 
 # Import the actual function implementations
 from functions.get_files_info import get_files_info
 from functions.get_file_content import get_file_content
 from functions.run_python_file import run_python_file
+from functions.profile_python_file import profile_python_file
+from functions.run_tests import run_tests
 from functions.write_file import write_file
+from functions.search_files import search_files
+from functions.edit_file import edit_file
+from functions.get_changes import get_changes
+from functions.read_spilled import read_spilled
+
+# Import the function schemas
+from functions.get_files_info import schema_get_files_info
+from functions.get_file_content import schema_get_file_content
+from functions.run_python_file import schema_run_python_file
+from functions.profile_python_file import schema_profile_python_file
+from functions.run_tests import schema_run_tests
+from functions.write_file import schema_write_file
+from functions.search_files import schema_search_files
+from functions.edit_file import schema_edit_file
+from functions.get_changes import schema_get_changes
+from functions.read_spilled import schema_read_spilled
+
+# Import the result cache for read-only tools, the file prefetcher and the search index
+from tool_cache import ToolResultCache
+from prefetch import Prefetcher
+import search_index
+import workspace_tracker
+import spill_store
+import tracing
+from config import *
+
+
+# Functions that modify a file, their path must be invalidated in caches
+MUTATING_FUNCTIONS = {"write_file", "edit_file"}
+
+# Shared cache for read-only tool results
+tool_cache = ToolResultCache()
+
+# Background reads of the files in the latest listing, off unless PREFETCH_FILES or --prefetch
+prefetcher = Prefetcher(get_file_content)
+
+# The tool declaration, built on first use
+_available_functions = None
+_available_functions_lock = threading.Lock()
+
+
+def get_available_functions():
+    """
+    Returns the tool declaration with all functions the AI is allowed to call.
+
+    The schemas are built on the first call, so importing the tools doesn't
+    load google.genai (which dominates startup time).
+    """
+    global _available_functions
+    with _available_functions_lock:
+        if _available_functions is None:
+            from google.genai import types
+
+            _available_functions = types.Tool(
+                function_declarations=[
+                    schema_get_files_info(),
+                    schema_get_file_content(),
+                    schema_run_python_file(),
+                    schema_profile_python_file(),
+                    schema_run_tests(),
+                    schema_write_file(),
+                    schema_search_files(),
+                    schema_edit_file(),
+                    schema_get_changes(),
+                    schema_read_spilled(),
+                ]
+            )
+    return _available_functions
 
 
 #helper function to handle functions calls
-def call_function(function_call_part, verbose=False):
+def call_function(function_call_part, verbose=False, working_directory=WORKING_DIRECTORY, quiet=False):
     """
     Executes a function call returned by Gemini and returns a structured Content response.
 
     Args:
         function_call_part (types.FunctionCall): The function call object from Gemini.
         verbose (bool): Whether to print detailed information.
+        working_directory (str): Directory the function is constrained to.
+        quiet (bool): Don't print the function call.
 
     Returns:
         types.Content: A tool response indicating success or error.
     """
+    from google.genai import types
+
     function_name = function_call_part.name
     function_args = dict(function_call_part.args or {})
 
     # Always enforce working directory (not controlled by the LLM)
-    function_args["working_directory"] = "./calculator"
+    function_args["working_directory"] = working_directory
 
     if verbose:
         print(f"Calling function: {function_call_part.name}({function_call_part.args})")
-    else:
+    elif not quiet:
         print(f" - Calling function: {function_call_part.name}")
 
     # Map function names to actual functions
@@ -36,7 +112,13 @@ def call_function(function_call_part, verbose=False):
     "get_files_info": get_files_info,
     "get_file_content": get_file_content,
     "run_python_file": run_python_file,
+    "profile_python_file": profile_python_file,
+    "run_tests": run_tests,
     "write_file": write_file,
+    "search_files": search_files,
+    "edit_file": edit_file,
+    "get_changes": get_changes,
+    "read_spilled": read_spilled,
     }
 
     # If invalid function name
@@ -53,7 +135,38 @@ def call_function(function_call_part, verbose=False):
 
     # Try to call the actual function
     try:
-        function_result = function_map[function_name](**function_args)
+        with tracing.span(f"tool.{function_name}") as tool_span:
+            if function_name in MUTATING_FUNCTIONS:
+                function_result = function_map[function_name](**function_args)
+                tool_cache.invalidate(
+                    os.path.join(function_args["working_directory"], function_args.get("file_path", ""))
+                )
+                search_index.notify_write(function_args["working_directory"], function_args.get("file_path", ""))
+                workspace_tracker.notify_write(function_args["working_directory"], function_args.get("file_path", ""))
+                prefetcher.invalidate(
+                    os.path.join(function_args["working_directory"], function_args.get("file_path", ""))
+                )
+            else:
+                function_result = None
+                if function_name == "get_file_content":
+                    function_result = prefetcher.lookup(function_args)
+                if function_result is None:
+                    function_result = tool_cache.call(function_name, function_map[function_name], function_args)
+                if function_name == "get_files_info":
+                    # Read the listed files while the model works out what to open
+                    prefetcher.schedule(function_args, function_result)
+
+            # Keep long results out of the conversation, read_spilled serves the rest on demand
+            if function_name != "read_spilled":
+                function_result = spill_store.default_store.spill(function_result, owner=function_args["working_directory"])
+
+            # Record payload sizes, skipped entirely when tracing is off
+            if tracing.enabled():
+                tool_span.set(
+                    bytes_in=len(json.dumps(function_call_part.args or {}, default=str).encode("utf-8")),
+                    bytes_out=len(str(function_result).encode("utf-8")),
+                    tool_error=str(function_result).startswith("Error"),
+                )
 
         return types.Content(
             role="tool",
@@ -0,0 +1,133 @@
+import gzip
+import json
+import os
+import re
+import zlib
+
+from config import *
+
+
+CHECKPOINT_VERSION = 1
+
+
+def session_path(session_id, directory=None):
+    """
+    Returns the checkpoint file of a session.
+    """
+    if not re.fullmatch(r"[\w.-]+", session_id):
+        raise ValueError(f"invalid session id: {session_id!r}")
+    directory = directory or SESSION_DIR
+    if not os.path.isabs(directory):
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), directory)
+    return os.path.join(directory, f"{session_id}.jsonl.gz")
+
+
+class SessionCheckpoint:
+    """
+    On-disk checkpoint of an agent session.
+
+    The file is a sequence of gzip members, each holding one JSON record: a start
+    record with the prompt, then one record per finished iteration with the
+    messages it added (model turn and tool results) and the token counters.
+    Saving an iteration only appends its own messages, so checkpoints stay cheap
+    as the conversation grows, and a record cut off by a crash is ignored on load.
+    """
+
+    def __init__(self, session_id, directory=None):
+        self.session_id = session_id
+        self.path = session_path(session_id, directory)
+        self.user_prompt = None
+        self.working_directory = WORKING_DIRECTORY
+        self.messages = []
+        self.iterations = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.final_response = None
+
+    @classmethod
+    def create(cls, session_id, user_prompt, working_directory=WORKING_DIRECTORY, directory=None):
+        """
+        Starts a new checkpoint file, replacing an older session with the same id.
+        """
+        checkpoint = cls(session_id, directory)
+        checkpoint.user_prompt = user_prompt
+        checkpoint.working_directory = working_directory
+        os.makedirs(os.path.dirname(checkpoint.path), exist_ok=True)
+        with open(checkpoint.path, "wb"):
+            pass
+        checkpoint._append({
+            "type": "start",
+            "version": CHECKPOINT_VERSION,
+            "user_prompt": user_prompt,
+            "working_directory": working_directory,
+            "model": model_name,
+        })
+        return checkpoint
+
+    @classmethod
+    def load(cls, session_id, directory=None):
+        """
+        Reads a session back from its checkpoint file.
+
+        Raises:
+            FileNotFoundError: If there is no checkpoint for the session.
+            ValueError: If the file is not a checkpoint of this version.
+        """
+        from google.genai import types
+
+        checkpoint = cls(session_id, directory)
+        for record in _read_records(checkpoint.path):
+            if record.get("type") == "start":
+                if record.get("version") != CHECKPOINT_VERSION:
+                    raise ValueError(f"unsupported checkpoint version {record.get('version')}")
+                checkpoint.user_prompt = record["user_prompt"]
+                checkpoint.working_directory = record["working_directory"]
+                checkpoint.messages = [types.Content(role="user", parts=[types.Part(text=record["user_prompt"])])]
+            elif record.get("type") == "iteration":
+                checkpoint.messages.extend(types.Content.model_validate(message) for message in record["messages"])
+                checkpoint.iterations = record["iteration"]
+                checkpoint.prompt_tokens = record["prompt_tokens"]
+                checkpoint.response_tokens = record["response_tokens"]
+                checkpoint.final_response = record.get("final_response")
+
+        if checkpoint.user_prompt is None:
+            raise ValueError(f"no checkpoint found in {checkpoint.path}")
+        return checkpoint
+
+    def save_iteration(self, iteration, new_messages, prompt_tokens, response_tokens, final_response=None):
+        """
+        Appends a finished iteration: the messages it added and the totals after it.
+        """
+        self._append({
+            "type": "iteration",
+            "iteration": iteration,
+            "messages": [message.model_dump(mode="json", exclude_none=True) for message in new_messages],
+            "prompt_tokens": prompt_tokens,
+            "response_tokens": response_tokens,
+            "final_response": final_response,
+        })
+        self.messages.extend(new_messages)
+        self.iterations = iteration
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+        self.final_response = final_response
+
+    def _append(self, record):
+        # One gzip member per record, concatenated members are still one valid gzip file
+        data = gzip.compress((json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8"))
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _read_records(path):
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                records.append(json.loads(line))
+        except (EOFError, gzip.BadGzipFile, zlib.error, json.JSONDecodeError):
+            # The last record was cut off, everything before it is complete
+            pass
+    return records
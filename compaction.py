@@ -0,0 +1,138 @@
+import json
+import os
+
+from config import *
+from call_function import MUTATING_FUNCTIONS
+
+
+def estimate_tokens(messages):
+    """
+    Estimates the prompt tokens of a list of messages without calling the API.
+
+    Uses the rule of thumb of CHARS_PER_TOKEN characters per token,
+    which is close enough to enforce a budget offline.
+
+    Parameters:
+        messages (list[types.Content]): The conversation messages.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return sum(_estimate_part_tokens(part) for message in messages for part in (message.parts or []))
+
+
+def _estimate_part_tokens(part):
+    chars = 0
+    if getattr(part, "text", None):
+        chars += len(part.text)
+    if getattr(part, "function_call", None):
+        chars += len(part.function_call.name or "")
+        chars += len(json.dumps(part.function_call.args or {}, default=str))
+    if getattr(part, "function_response", None):
+        chars += len(part.function_response.name or "")
+        chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _normalize_path(args):
+    return os.path.normpath(str(args.get("file_path", "")))
+
+
+def compact_messages(
+    messages,
+    token_budget=COMPACTION_TOKEN_BUDGET,
+    keep_recent_turns=COMPACTION_KEEP_RECENT_TURNS,
+    digest_chars=COMPACTION_DIGEST_CHARS,
+):
+    """
+    Builds a compacted view of the conversation to send to the model.
+
+    The last keep_recent_turns model turns (and their tool responses) are kept verbatim.
+    Before that, file reads superseded by a later write are dropped, and if the
+    estimate is still over token_budget, tool responses are collapsed into short
+    digests, oldest first. The original messages list is not modified.
+
+    Parameters:
+        messages (list[types.Content]): The full conversation.
+        token_budget (int): Estimated prompt tokens to stay under.
+        keep_recent_turns (int): Number of recent model turns never touched.
+        digest_chars (int): Characters of a tool result kept in its digest.
+
+    Returns:
+        tuple[list[types.Content], dict]: The compacted messages, and stats with
+        the estimated tokens before and after compaction.
+    """
+    from google.genai import types
+
+    tokens_before = estimate_tokens(messages)
+    stats = {"tokens_before": tokens_before, "tokens_after": tokens_before}
+
+    # Find where the verbatim window starts (each model message begins a turn)
+    model_indices = [i for i, message in enumerate(messages) if message.role == "model"]
+    if len(model_indices) <= keep_recent_turns:
+        return messages, stats
+    window_start = model_indices[-keep_recent_turns] if keep_recent_turns > 0 else len(messages)
+
+    # Pair every tool response with the arguments of the call that produced it,
+    # and remember the last message index that modified each path
+    responses = []
+    last_write = {}
+    pending_calls = []
+    for i, message in enumerate(messages):
+        for j, part in enumerate(message.parts or []):
+            if getattr(part, "function_call", None):
+                args = dict(part.function_call.args or {})
+                pending_calls.append((part.function_call.name, args))
+                if part.function_call.name in MUTATING_FUNCTIONS:
+                    last_write[_normalize_path(args)] = i
+            elif getattr(part, "function_response", None):
+                name = part.function_response.name
+                args = {}
+                for k, (call_name, call_args) in enumerate(pending_calls):
+                    if call_name == name:
+                        args = pending_calls.pop(k)[1]
+                        break
+                if i < window_start:
+                    responses.append((i, j, name, args))
+
+    new_parts = {}
+    tokens_after = tokens_before
+
+    def replace(i, j, name, result):
+        nonlocal tokens_after
+        part = new_parts.get((i, j), messages[i].parts[j])
+        new_part = types.Part.from_function_response(name=name, response={"result": result})
+        tokens_after += _estimate_part_tokens(new_part) - _estimate_part_tokens(part)
+        new_parts[(i, j)] = new_part
+
+    # Drop file contents that a later write replaced
+    for i, j, name, args in responses:
+        if name == "get_file_content" and last_write.get(_normalize_path(args), -1) > i:
+            replace(i, j, name, f'[Content of "{args.get("file_path")}" omitted: the file was written later]')
+
+    # Collapse old tool responses into digests until the budget is met
+    for i, j, name, args in responses:
+        if tokens_after <= token_budget:
+            break
+        if (i, j) in new_parts:
+            continue
+        response = messages[i].parts[j].function_response.response or {}
+        text = str(response.get("result", response.get("error", "")))
+        if len(text) <= digest_chars:
+            continue
+        replace(i, j, name, f"[Compacted {name} result, {len(text)} characters. Preview: {text[:digest_chars]}...]")
+
+    if not new_parts:
+        return messages, stats
+
+    changed_messages = {i for i, _ in new_parts}
+    compacted = []
+    for i, message in enumerate(messages):
+        if i not in changed_messages:
+            compacted.append(message)
+            continue
+        parts = [new_parts.get((i, j), part) for j, part in enumerate(message.parts)]
+        compacted.append(types.Content(role=message.role, parts=parts))
+
+    stats["tokens_after"] = tokens_after
+    return compacted, stats
@@ -1,7 +1,125 @@
 # config.py
+#directory the tools are constrained to
+WORKING_DIRECTORY = "./calculator"
+
 #limit for file character count
 FILE_CHARACTER_LIMIT = 10000
 
+#maximum number of entries per get_files_info page
+FILES_INFO_PAGE_SIZE = 1000
+#names that recursive get_files_info listings skip unless respect_ignore is false (.gitignore patterns are added)
+FILES_INFO_IGNORE = ["__pycache__", ".git", ".venv", "node_modules"]
+
+#search_files: where the on-disk trigram indexes live (relative to the project root)
+SEARCH_INDEX_DIR = ".agent_cache"
+#files larger than this are not indexed or searched
+SEARCH_MAX_FILE_BYTES = 1024 * 1024
+#seconds between re-walks of the working directory to pick up outside changes
+SEARCH_REFRESH_INTERVAL = 2.0
+#caps on search_files output
+SEARCH_MAX_RESULTS = 100
+SEARCH_MAX_CONTEXT = 3
+SEARCH_LINE_CHARS = 200
+
+#get_changes: snapshots kept per working directory, older tokens expire
+CHANGES_MAX_SNAPSHOTS = 16
+#text files up to this size are kept in snapshots so get_changes can diff them
+CHANGES_DIFF_MAX_BYTES = 256 * 1024
+#lines of diff returned by one get_changes call
+CHANGES_MAX_DIFF_LINES = 400
+
+#run_python_file: seconds before a script is killed
+RUN_PYTHON_TIMEOUT = 30
+#bytes of STDOUT and of STDERR kept per run (head and tail, the middle is dropped)
+RUN_PYTHON_OUTPUT_CAP_BYTES = 64 * 1024
+#kill a script once it printed this many bytes in total
+RUN_PYTHON_KILL_AFTER_BYTES = 16 * 1024 * 1024
+#run scripts in children forked from pre-started interpreters (POSIX only)
+RUN_PYTHON_USE_WARM_POOL = False
+#number of pre-started interpreters, runs beyond this wait for a free one
+RUN_PYTHON_POOL_SIZE = 2
+#modules the warm interpreter imports once, so scripts don't pay for them
+RUN_PYTHON_PRELOAD_MODULES = ["json", "re", "math", "collections", "functools", "itertools", "unittest"]
+
+#profile_python_file: functions listed in each ranking, and lines of the script's own output kept
+PROFILE_TOP_FUNCTIONS = 15
+PROFILE_OUTPUT_LINES = 20
+
+#run_tests: test files found by discovery, and at most this many worker processes the tests are sharded over
+TESTS_PATTERN = "test*.py"
+TESTS_MAX_WORKERS = 4
+#fewer tests than this per worker are not worth starting another interpreter
+TESTS_MIN_PER_SHARD = 8
+#lines of traceback kept per failing test
+TESTS_FAILURE_LINES = 15
+
+#maximum number of model turns per session
+MAX_ITERATIONS = 20
+
+#checkpoints of agent sessions, written after every iteration (relative to the project root)
+SESSION_DIR = ".agent_sessions"
+
+#maximum number of tool calls from one model turn that run at the same time
+MAX_TOOL_WORKERS = 4
+
+#byte budget of the result cache for read-only tools
+TOOL_CACHE_MAX_BYTES = 8 * 1024 * 1024
+#also memoize run_python_file while no file in the working directory changed
+#(off by default, scripts may depend on time, randomness or the network)
+TOOL_CACHE_RUN_PYTHON_FILE = False
+
+#prefetch small files of the latest get_files_info listing while the model thinks (off by default, --prefetch)
+PREFETCH_FILES = False
+#files larger than this are left for the model to page through
+PREFETCH_MAX_FILE_BYTES = FILE_CHARACTER_LIMIT
+#at most this many prefetched files are kept, in at most this many bytes
+PREFETCH_MAX_FILES = 32
+PREFETCH_MAX_BYTES = 2 * 1024 * 1024
+#background threads reading the files
+PREFETCH_WORKERS = 2
+
+#spans kept in memory for --trace until they are exported, the oldest are dropped beyond this
+TRACE_MAX_EVENTS = 100000
+
+#spill store: tool results longer than this are saved to disk, the conversation keeps a preview and a handle (None disables)
+SPILL_THRESHOLD_CHARS = 16 * 1024
+#characters of a spilled result kept in the conversation
+SPILL_PREVIEW_CHARS = 2000
+#where spilled results are stored (relative to the project root), and the size the oldest are pruned at
+SPILL_DIR = ".agent_cache/spill"
+SPILL_MAX_BYTES = 256 * 1024 * 1024
+
+#history compaction: estimated prompt tokens to stay under before each model call
+COMPACTION_TOKEN_BUDGET = 32000
+#number of recent model turns that are always sent verbatim
+COMPACTION_KEEP_RECENT_TURNS = 4
+#characters of an old tool result kept in its digest
+COMPACTION_DIGEST_CHARS = 200
+#rule of thumb used by the offline token estimator
+CHARS_PER_TOKEN = 4
+
+#batch mode: sessions running at the same time and model calls per minute across all of them
+BATCH_CONCURRENCY = 8
+BATCH_REQUESTS_PER_MINUTE = 60
+
+#server mode: where --serve listens ("host:port" or "unix:/path/to.sock")
+SERVER_ADDRESS = "127.0.0.1:8765"
+#sessions may only use working directories inside these roots (--root to override)
+SERVER_ALLOWED_ROOTS = [WORKING_DIRECTORY]
+
+#model transport: attempts after a transient error (429, 5xx, timeouts, dropped connections)
+TRANSPORT_MAX_RETRIES = 4
+#backoff before retry n is a random delay up to min(max, base * 2**n) seconds, unless the server sends Retry-After
+#(a Retry-After above the max fails the request instead of waiting)
+TRANSPORT_BACKOFF_BASE = 0.5
+TRANSPORT_BACKOFF_MAX = 30.0
+#send a second copy of a model request that has no answer after this many seconds (None disables hedging)
+TRANSPORT_HEDGE_AFTER = None
+#timeout of one model request in seconds, and the keep-alive connection pool of the HTTP client
+TRANSPORT_TIMEOUT = 120
+TRANSPORT_MAX_CONNECTIONS = 16
+TRANSPORT_KEEPALIVE_EXPIRY = 60
+
 # Model name for Gemini
 model_name = "gemini-2.0-flash-001"
 #System prompt for AI behavior
@@ -12,8 +130,14 @@ When a user asks a question or makes a request, make a function call plan. You c
 
 - List files and directories
 - Read file contents
+- Search file contents for text or regular expressions
 - Execute Python files with optional arguments
+- Run unit tests in parallel and get pass/fail per test, or rerun only failing or affected tests (prefer this over running test files)
+- Profile Python files to find the functions that take the most time (measure before optimizing)
 - Write or overwrite files
+- Edit parts of a file with search/replace edits or unified diff hunks (prefer this over rewriting a whole file)
+- Read more of a long tool output that was shortened to a preview and a handle
+- List the files added, modified or deleted since a snapshot, with diffs (prefer this over listing and re-reading files after a change)
 
 All paths you provide should be relative to the working directory. You do not need to specify the working directory in your function calls as it is automatically injected for security reasons.
 """
@@ -0,0 +1,155 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from config import *
+from call_function import call_function, MUTATING_FUNCTIONS
+import tracing
+
+
+# Tools that run code, which may read or write any file of the working directory
+SCRIPT_FUNCTIONS = {"run_python_file", "profile_python_file", "run_tests"}
+
+# Tools that snapshot the whole working directory, so they must not overlap a script
+SNAPSHOT_FUNCTIONS = {"get_changes"}
+
+# The argument naming the file or directory a tool reads or writes, with its default
+PATH_ARGUMENTS = {
+    "get_file_content": ("file_path", None),
+    "write_file": ("file_path", None),
+    "edit_file": ("file_path", None),
+    "get_files_info": ("directory", "."),
+    "search_files": ("directory", "."),
+    "get_changes": ("directory", "."),
+}
+
+
+def touched_path(function_call_part):
+    """
+    Returns the normalized path a function call reads or writes, or None.
+    """
+    argument = PATH_ARGUMENTS.get(function_call_part.name)
+    if argument is None:
+        return None
+    args = dict(function_call_part.args or {})
+    path = args.get(argument[0], argument[1])
+    return None if path is None else os.path.normpath(str(path))
+
+
+def paths_overlap(first, second):
+    """
+    Returns True if one path is the other or a directory containing it.
+    """
+    if first == second or "." in (first, second):
+        return True
+    return first.startswith(second + os.sep) or second.startswith(first + os.sep)
+
+
+class CallOrdering:
+    """
+    Decides which earlier calls of a turn each function call has to wait for.
+
+    A read (get_file_content, get_files_info, search_files, get_changes) waits for
+    the earlier writes to the path it reads. A write waits for the earlier calls
+    that touch its path and for earlier scripts. A script (run_python_file,
+    profile_python_file, run_tests) waits for every earlier write and snapshot
+    (get_changes), and a snapshot waits for every earlier script, so it sees
+    either all or none of a script's effects. Everything else runs concurrently.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def add(self, function_call_part):
+        """
+        Registers the next call of the turn and returns the indices of the earlier
+        calls it must wait for.
+        """
+        name = function_call_part.name
+        path = touched_path(function_call_part)
+        waits = []
+        for index, (earlier_name, earlier_path) in enumerate(self.calls):
+            overlaps = path is not None and earlier_path is not None and paths_overlap(path, earlier_path)
+            if name in SCRIPT_FUNCTIONS:
+                must_wait = earlier_name in MUTATING_FUNCTIONS or earlier_name in SNAPSHOT_FUNCTIONS
+            elif name in MUTATING_FUNCTIONS:
+                must_wait = earlier_name in SCRIPT_FUNCTIONS or overlaps
+            elif name in SNAPSHOT_FUNCTIONS:
+                must_wait = earlier_name in SCRIPT_FUNCTIONS or (earlier_name in MUTATING_FUNCTIONS and overlaps)
+            else:
+                must_wait = earlier_name in MUTATING_FUNCTIONS and overlaps
+            if must_wait:
+                waits.append(index)
+        self.calls.append((name, path))
+        return waits
+
+
+def execute_function_calls(
+    function_call_parts,
+    verbose=False,
+    max_workers=MAX_TOOL_WORKERS,
+    working_directory=WORKING_DIRECTORY,
+    quiet=False,
+):
+    """
+    Executes all function calls from one model turn on a bounded thread pool.
+
+    Parameters:
+        function_call_parts (list[types.FunctionCall]): Function calls in the order the model sent them.
+        verbose (bool): Whether to print detailed information.
+        max_workers (int): Upper bound on tool calls running at the same time.
+        working_directory (str): Directory the functions are constrained to.
+        quiet (bool): Don't print the function calls.
+
+    Returns:
+        tuple[list[types.Content], dict]: The tool responses in the original call order,
+        and timing stats with the turn's wall-clock and summed tool time in seconds.
+    """
+    results = [None] * len(function_call_parts)
+    durations = [0.0] * len(function_call_parts)
+
+    # Calls that read what an earlier call writes (or the other way around) wait for it
+    ordering = CallOrdering()
+    waits = [ordering.add(function_call_part) for function_call_part in function_call_parts]
+    futures = [None] * len(function_call_parts)
+
+    def run_call(index):
+        # Without a pool (one worker) the earlier calls have already finished
+        pending = [futures[earlier] for earlier in waits[index] if futures[earlier] is not None]
+        if pending:
+            wait(pending)
+        start = time.perf_counter()
+        results[index] = call_function(
+            function_call_parts[index],
+            verbose=verbose,
+            working_directory=working_directory,
+            quiet=quiet,
+        )
+        durations[index] = time.perf_counter() - start
+
+    turn_start = time.perf_counter()
+    with tracing.span("tools.execute", calls=len(function_call_parts), ordered=sum(1 for indices in waits if indices)):
+        if len(function_call_parts) <= 1 or max_workers <= 1:
+            # Nothing to overlap, skip the pool overhead
+            for index in range(len(function_call_parts)):
+                run_call(index)
+        else:
+            # The pool starts calls in submission order and a call only waits for earlier
+            # ones, so the oldest unfinished call is always running and nothing deadlocks
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(function_call_parts))) as pool:
+                # Each call runs in a copy of this context, so its tool spans nest under this one
+                for index in range(len(function_call_parts)):
+                    futures[index] = pool.submit(contextvars.copy_context().run, run_call, index)
+                # Raise exceptions from workers here
+                for future in futures:
+                    future.result()
+    wall_time = time.perf_counter() - turn_start
+
+    stats = {
+        "calls": len(function_call_parts),
+        "wall_time": wall_time,
+        "tool_time": sum(durations),
+        "durations": durations,
+    }
+    return results, stats
@@ -0,0 +1,299 @@
+import os
+import re
+import tempfile
+
+import tracing
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# Git's per-file header lines, which can also sit between the hunks of a patch
+GIT_HEADER = re.compile(r"^(diff --git |index [0-9a-f]+\.\.[0-9a-f]+|(new|deleted) file mode |similarity index )")
+
+
+class EditConflict(Exception):
+    pass
+
+
+def edit_file(working_directory, file_path, edits=None, patch=None):
+    """
+    Changes parts of a file with search/replace edits or unified diff hunks.
+
+    All edits are checked against the current content before anything is written,
+    and the new content replaces the file atomically (temp file + rename). If any
+    edit does not match, or the file changes on disk meanwhile, nothing is written.
+
+    Parameters:
+        working_directory (str): Base directory (root of allowed operations)
+        file_path (str): Relative path of an existing file inside working_directory
+        edits (list[dict]): Edits with "old_text", "new_text" and optional
+            "replace_all", applied in order
+        patch (str): Unified diff hunks ("@@ -l,n +l,n @@" sections) for the file
+
+    Returns:
+        str: A short summary of the changed lines, or an error message string.
+    """
+    try:
+        # Build the full path
+        full_path = os.path.abspath(os.path.join(working_directory, file_path))
+        working_directory = os.path.abspath(working_directory)
+
+        # Security check: Ensure full_path is inside working_directory
+        if not full_path.startswith(working_directory):
+            return f'Error: Cannot edit "{file_path}" as it is outside the permitted working directory'
+
+        if not os.path.isfile(full_path):
+            return f'Error: File not found: "{file_path}". Use write_file to create new files'
+
+        if not edits and not patch:
+            return "Error: Provide edits or a patch"
+
+        # Read the current content, keeping its line endings
+        before = os.stat(full_path)
+        with open(full_path, encoding="utf-8", newline="") as f:
+            content = f.read()
+
+        if patch:
+            new_content, changes = _apply_patch(content, patch)
+        else:
+            new_content, changes = _apply_edits(content, edits)
+
+        if new_content == content:
+            return f'No changes to "{file_path}", the new text equals the old text'
+
+        with tracing.span("edit_file.write", bytes=len(new_content)):
+            _replace_atomically(full_path, new_content, before)
+
+        return _summary(file_path, changes)
+
+    except EditConflict as e:
+        return f'Error: Conflict in "{file_path}": {e}. Nothing was written, read the file again and retry'
+    except UnicodeDecodeError:
+        return f'Error: "{file_path}" is not a UTF-8 text file'
+    except Exception as e:
+        # Catch any other unexpected errors
+        return f"Error: {e}"
+
+
+def _apply_edits(content, edits):
+    """
+    Applies search/replace edits in order.
+
+    Returns:
+        tuple[str, list[tuple[int, int, int]]]: The new content, and for each change
+        its first line in the new content, the number of lines removed and the number added.
+    """
+    changes = []
+    for number, edit in enumerate(edits, start=1):
+        old_text = edit.get("old_text") or ""
+        new_text = edit.get("new_text") or ""
+        if not old_text:
+            raise EditConflict(f"edit {number} has an empty old_text")
+
+        count = content.count(old_text)
+        if count == 0:
+            raise EditConflict(f"edit {number}: old_text was not found")
+        if count > 1 and not edit.get("replace_all"):
+            raise EditConflict(
+                f"edit {number}: old_text matches {count} times, include more surrounding lines or set replace_all"
+            )
+
+        # Lines where the occurrences start in the current content
+        parts = content.split(old_text)
+        starts = []
+        line = 1
+        for part in parts[:-1]:
+            line += part.count("\n")
+            starts.append(line)
+            line += old_text.count("\n")
+        content = new_text.join(parts)
+
+        # Bottom up, so each occurrence only moves the changes below it, earlier edits included
+        shift = new_text.count("\n") - old_text.count("\n")
+        for start in reversed(starts):
+            if shift:
+                changes = [(line + shift if line > start else line, removed, added) for line, removed, added in changes]
+            changes.append((start, _line_count(old_text), _line_count(new_text)))
+
+    return content, sorted(changes)
+
+
+def _line_count(text):
+    # A trailing newline ends the last line, it doesn't start another one
+    return text.count("\n") + (0 if text.endswith("\n") else 1)
+
+
+def _parse_hunks(patch):
+    """
+    Returns the hunks of a unified diff as (old_start, old_lines, new_lines, removed, added),
+    where removed and added count the "-" and "+" lines.
+
+    File headers ("---", "+++", "diff", "index") are skipped wherever they are,
+    also between hunks. Lines are compared without their line endings.
+    """
+    hunks = []
+    current = None
+    patch_lines = [line.rstrip("\r") for line in patch.split("\n")]
+    if patch_lines[-1] == "":
+        patch_lines.pop()
+    skip_next = False
+    for number, line in enumerate(patch_lines):
+        if skip_next:
+            skip_next = False
+            continue
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = [int(header.group(1)), [], [], 0, 0]
+            hunks.append(current)
+        elif current is None or line.startswith("\\") or GIT_HEADER.match(line):
+            # Text before the first hunk, "\ No newline at end of file" or a git header
+            continue
+        elif line.startswith("--- ") and number + 1 < len(patch_lines) and patch_lines[number + 1].startswith("+++ "):
+            # A "---"/"+++" file header pair, not a removed line followed by an added one
+            skip_next = True
+            continue
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+            current[3] += 1
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+            current[4] += 1
+        else:
+            # Context line, some diffs drop the leading space of empty lines
+            text = line[1:] if line.startswith(" ") else line
+            current[1].append(text)
+            current[2].append(text)
+
+    if not hunks:
+        raise EditConflict("the patch has no @@ hunk headers")
+    return hunks
+
+
+def _find_block(lines, block, expected, start):
+    """
+    Returns the index where block matches lines, preferring expected, searching from start.
+    """
+    if block == lines[expected : expected + len(block)] and expected >= start:
+        return expected
+    first = block[0]
+    matches = [
+        i
+        for i in range(start, len(lines) - len(block) + 1)
+        if lines[i] == first and lines[i : i + len(block)] == block
+    ]
+    if not matches:
+        return None
+    # The line numbers may be off when earlier parts of the file changed, take the closest match
+    return min(matches, key=lambda i: abs(i - expected))
+
+
+def _apply_patch(content, patch):
+    newline = "\r\n" if "\r\n" in content else "\n"
+    # Split on "\n" only, str.splitlines() would also split on form feeds and the like
+    raw_lines = [line + "\n" for line in content.split("\n")]
+    raw_lines[-1] = raw_lines[-1][:-1]
+    if not raw_lines[-1]:
+        raw_lines.pop()
+    lines = [line.rstrip("\r\n") for line in raw_lines]
+    ends_with_newline = content.endswith(("\n", "\r\n")) or not content
+
+    changes = []
+    result = []
+    position = 0
+    for number, (old_start, old_lines, new_lines, removed, added) in enumerate(_parse_hunks(patch), start=1):
+        if old_lines:
+            index = _find_block(lines, old_lines, max(old_start - 1, 0), position)
+        else:
+            # A pure insertion ("@@ -5,0 +6,2 @@") goes after line old_start
+            index = min(old_start, len(lines))
+        if index is None or index < position:
+            first_line = old_lines[0] if old_lines else ""
+            raise EditConflict(f"hunk {number} (line {old_start}, starting {first_line!r}) does not match the file")
+
+        result.extend(raw_lines[position:index])
+        result.extend(line + newline for line in new_lines)
+        position = index + len(old_lines)
+
+        # Report the first changed line, after the leading context
+        context = 0
+        while context < min(len(old_lines), len(new_lines)) and old_lines[context] == new_lines[context]:
+            context += 1
+        changes.append((len(result) - len(new_lines) + context + 1, removed, added))
+
+    result.extend(raw_lines[position:])
+    new_content = "".join(result)
+    if not ends_with_newline and position >= len(raw_lines) and new_content.endswith(newline):
+        new_content = new_content[: -len(newline)]
+    return new_content, changes
+
+
+def _replace_atomically(full_path, content, before):
+    directory = os.path.dirname(full_path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(full_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        os.chmod(temp_path, before.st_mode & 0o7777)
+
+        # Someone else wrote the file since it was read, don't overwrite their change
+        now = os.stat(full_path)
+        if (now.st_mtime_ns, now.st_size) != (before.st_mtime_ns, before.st_size):
+            raise EditConflict("the file changed on disk while it was being edited")
+        os.replace(temp_path, full_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _summary(file_path, changes):
+    # Line ranges in the edited file, so the model can read back just those
+    ranges = ", ".join(str(start) if added <= 1 else f"{start}-{start + added - 1}" for start, _, added in changes)
+    removed = sum(change[1] for change in changes)
+    added = sum(change[2] for change in changes)
+    noun = "change" if len(changes) == 1 else "changes"
+    where = "line" if ranges.isdigit() else "lines"
+    return f'Successfully edited "{file_path}": {len(changes)} {noun} at {where} {ranges} (-{removed} +{added} lines)'
+
+
+# Define the function schema for AI integration
+def schema_edit_file():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="edit_file",
+        description="Changes part of an existing file with search/replace edits or unified diff hunks, without sending the whole file. All edits must match the current content or nothing is written.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "file_path": types.Schema(
+                    type=types.Type.STRING,
+                    description="The path of the file to edit, relative to the working directory.",
+                ),
+                "edits": types.Schema(
+                    type=types.Type.ARRAY,
+                    description="Search/replace edits applied in order. old_text must match the file exactly, including indentation, and only once unless replace_all is set.",
+                    items=types.Schema(
+                        type=types.Type.OBJECT,
+                        properties={
+                            "old_text": types.Schema(
+                                type=types.Type.STRING,
+                                description="The exact text to replace, with enough surrounding lines to be unique.",
+                            ),
+                            "new_text": types.Schema(
+                                type=types.Type.STRING,
+                                description="The replacement text.",
+                            ),
+                            "replace_all": types.Schema(
+                                type=types.Type.BOOLEAN,
+                                description="Replace every occurrence of old_text. Defaults to false.",
+                            ),
+                        },
+                        required=["old_text", "new_text"],
+                    ),
+                ),
+                "patch": types.Schema(
+                    type=types.Type.STRING,
+                    description="Unified diff hunks for this file (lines starting with '@@', ' ', '-', '+'), instead of edits.",
+                ),
+            },
+            required=["file_path"],
+        ),
+    )
@@ -0,0 +1,120 @@
+import difflib
+import os
+from config import *
+
+import tracing
+import workspace_tracker
+
+def get_changes(working_directory, since=None, diff=False, directory="."):
+    """
+    Reports the files added, modified or deleted since an earlier snapshot.
+
+    Without since, it only takes a snapshot and returns its token. With since,
+    it takes a new snapshot and lists the changes between the two, optionally
+    with unified diffs of the changed text files.
+
+    Parameters:
+        working_directory (str): Base directory (root of allowed operations)
+        since (str): Snapshot token returned by an earlier get_changes call
+        diff (bool): Whether to include diffs of modified and added text files
+        directory (str): Relative path inside working_directory to restrict the report to
+
+    Returns:
+        str: The new snapshot token and the changes, or an error message string.
+    """
+    try:
+        # Build the full path
+        full_path = os.path.abspath(os.path.join(working_directory, directory))
+        working_directory = os.path.abspath(working_directory)
+
+        # Security check: Ensure full_path is inside working_directory
+        if not full_path.startswith(working_directory):
+            return f'Error: Cannot track "{directory}" as it is outside the permitted working directory'
+
+        tracker = workspace_tracker.get_tracker(working_directory)
+        old_files = tracker.get(since) if since is not None else None
+        if since is not None and old_files is None:
+            return f'Error: Unknown or expired snapshot token "{since}". Call get_changes without since to take a new snapshot'
+
+        with tracing.span("get_changes.snapshot") as snapshot_span:
+            token, new_files = tracker.snapshot()
+            snapshot_span.set(files=len(new_files))
+
+        if since is None:
+            return f"Snapshot {token} taken ({len(new_files)} files). Call get_changes with since=\"{token}\" to see what changed after it."
+
+        prefix = os.path.relpath(full_path, working_directory).replace(os.sep, "/")
+        prefix = "" if prefix == "." else prefix + "/"
+        changes = [(status, path) for status, path in workspace_tracker.compare(old_files, new_files) if path.startswith(prefix)]
+        if not changes:
+            return f'No changes since snapshot {since}. Current snapshot: {token}'
+
+        lines = [f"{len(changes)} change(s) since snapshot {since}, current snapshot: {token}"]
+        for status, path in changes:
+            if status == "A":
+                lines.append(f"A {path} ({new_files[path][1]} bytes)")
+            elif status == "D":
+                lines.append(f"D {path}")
+            else:
+                lines.append(f"M {path} ({old_files[path][1]} -> {new_files[path][1]} bytes)")
+
+        if diff:
+            lines.extend(_diffs(changes, old_files, new_files))
+        return "\n".join(lines)
+
+    except Exception as e:
+        # Catch any other unexpected errors
+        return f"Error: {e}"
+
+
+def _diffs(changes, old_files, new_files):
+    lines = []
+    for status, path in changes:
+        if status == "D":
+            continue
+        old = old_files[path][2] if status == "M" else ""
+        new = new_files[path][2]
+        if old is None or new is None:
+            lines.append(f"[No diff for {path}: binary or larger than {CHANGES_DIFF_MAX_BYTES} bytes]")
+            continue
+        diff = difflib.unified_diff(
+            old.splitlines(),
+            new.splitlines(),
+            fromfile=f"a/{path}" if status == "M" else "/dev/null",
+            tofile=f"b/{path}",
+            n=1,
+            lineterm="",
+        )
+        for line in diff:
+            if len(lines) >= CHANGES_MAX_DIFF_LINES:
+                lines.append(f"[Diffs truncated at {CHANGES_MAX_DIFF_LINES} lines, read the files for the rest]")
+                return lines
+            lines.append(line)
+    return lines
+
+
+# Define the function schema for AI integration
+def schema_get_changes():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="get_changes",
+        description="Lists the files added, modified or deleted since an earlier snapshot, with optional diffs. Call it without since to take a snapshot (e.g. before running a script), then with since to see only what changed instead of listing and reading files again.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "since": types.Schema(
+                    type=types.Type.STRING,
+                    description="The snapshot token from an earlier get_changes call. Omit it to take a new snapshot.",
+                ),
+                "diff": types.Schema(
+                    type=types.Type.BOOLEAN,
+                    description="Include unified diffs of the changed text files. Defaults to false.",
+                ),
+                "directory": types.Schema(
+                    type=types.Type.STRING,
+                    description="Only report changes below this directory, relative to the working directory.",
+                ),
+            },
+        ),
+    )
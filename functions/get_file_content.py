@@ -1,14 +1,38 @@
+import bisect
+import collections
 import os
-from google.genai import types
+import threading
 from config import *
 
-def get_file_content(working_directory, file_path):
+import tracing
+
+# Characters read at a time when skipping to an offset or past a long line
+READ_CHUNK_CHARACTERS = 1024 * 1024
+# Files whose offset checkpoints are kept, the least recently read are forgotten
+CHECKPOINT_FILES = 64
+
+# Per file: (mtime, size) and a sorted list of (character offset, stream position)
+# recorded while reading, so the next page seeks close to its offset instead of
+# decoding the file from the start
+_checkpoints = collections.OrderedDict()
+_checkpoints_lock = threading.Lock()
+
+def get_file_content(working_directory, file_path, offset=None, length=None, start_line=None, end_line=None):
     """
-    Return content of a file as string.
+    Return content of a file as string, optionally a character range or a window of lines.
+
+    The file is streamed, so at most the requested part (plus one read chunk) is
+    held in memory and large files can be paged through. Partial reads end with a
+    metadata line carrying the file size and the offset (or line) to continue from.
+    Offsets count characters after newline translation, like the text read whole.
 
     Parameters:
         working_directory (str): Base directory (root of allowed operations)
         file_path (str): Relative path inside working_directory
+        offset (int): Character offset to start reading at
+        length (int): Number of characters to read, capped at the character limit
+        start_line (int): First line to return, 1-based
+        end_line (int): Last line to return, inclusive
 
     Returns:
         a str: File content up to the character limit, or an error message string.
@@ -25,35 +49,186 @@ def get_file_content(working_directory, file_path):
         # Ensure the path exists and is a directory
         if not os.path.isfile(full_path):
             return f'Error: File not found or is not a regular file: "{file_path}"'
-        
-        # Open and read the file    
-        with open(full_path, "r", encoding="utf-8") as f:
-            content = f.read()
 
-        # Truncate if longer than character limit
-        if len(content) > FILE_CHARACTER_LIMIT:
-            truncated_content = content[:FILE_CHARACTER_LIMIT]
-            truncated_content += f'\n[...File "{full_path}" truncated at 10000 characters]'
-            return truncated_content
+        total_size = os.path.getsize(full_path)
+
+        # Line window: stream lines, never holding more than the window in memory
+        if start_line is not None or end_line is not None:
+            with tracing.span("get_file_content.read_lines", start_line=start_line, end_line=end_line):
+                return _read_lines(full_path, file_path, total_size, start_line, end_line)
+
+        # Character range (defaults to the start of the file)
+        offset = int(offset or 0)
+        if offset < 0:
+            return f'Error: offset {offset} is outside "{file_path}"'
+        length = FILE_CHARACTER_LIMIT if length is None else min(int(length), FILE_CHARACTER_LIMIT)
+        if length <= 0:
+            return f'Error: length must be positive, got {length}'
+
+        with tracing.span("get_file_content.read", offset=offset, file_size=total_size) as read_span:
+            checkpoints = _file_checkpoints(full_path)
+            with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+                skipped = _skip_characters(f, offset, checkpoints)
+                if skipped < offset:
+                    return f'Error: offset {offset} is outside "{file_path}" ({skipped} characters)'
+                content = f.read(length)
+                next_offset = offset + len(content)
+                _remember(checkpoints, next_offset, f.tell())
+                # One extra character tells whether the range reaches the end of the file
+                at_eof = not f.read(1)
+            read_span.set(characters=len(content))
+
+        # Whole file requested and it fits, return it as is
+        if offset == 0 and at_eof:
+            return content
 
+        if offset == 0 and length == FILE_CHARACTER_LIMIT:
+            content += f'\n[...File "{file_path}" truncated at {FILE_CHARACTER_LIMIT} characters, {total_size} bytes on disk.'
+        else:
+            content += f'\n[File "{file_path}": characters {offset}-{next_offset}, {total_size} bytes on disk.'
+        if not at_eof:
+            content += f' Continue with offset={next_offset}]'
+        else:
+            content += ' End of file]'
         return content
 
     except Exception as e:
         # Catch any other unexpected errors
         return f'Error: {e}'
 
-    
+
+def _file_checkpoints(full_path):
+    """
+    Returns the checkpoint list of a file, starting over when it changed.
+    """
+    stat = os.stat(full_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _checkpoints_lock:
+        entry = _checkpoints.get(full_path)
+        if entry is None or entry[0] != key:
+            entry = (key, [(0, 0)])
+            _checkpoints[full_path] = entry
+        _checkpoints.move_to_end(full_path)
+        while len(_checkpoints) > CHECKPOINT_FILES:
+            _checkpoints.popitem(last=False)
+        return entry[1]
+
+
+def _remember(checkpoints, offset, position):
+    with _checkpoints_lock:
+        index = bisect.bisect_left(checkpoints, (offset,))
+        if index == len(checkpoints) or checkpoints[index][0] != offset:
+            checkpoints.insert(index, (offset, position))
+
+
+def _skip_characters(f, count, checkpoints):
+    """
+    Moves past count characters and returns how many there were.
+
+    Seeks to the nearest checkpoint at or before count (tell() positions carry
+    the decoder state, so multi-byte characters and CRLF split at a chunk edge
+    are fine) and reads the rest in chunks, recording a checkpoint per chunk.
+    """
+    with _checkpoints_lock:
+        skipped, position = checkpoints[bisect.bisect_right(checkpoints, (count, float("inf"))) - 1]
+    f.seek(position)
+    while skipped < count:
+        chunk = f.read(min(count - skipped, READ_CHUNK_CHARACTERS))
+        if not chunk:
+            break
+        skipped += len(chunk)
+        _remember(checkpoints, skipped, f.tell())
+    return skipped
+
+
+def _read_line(f, limit):
+    """
+    Returns the next line cut to limit characters, the rest of a longer line is
+    skipped without holding it in memory. Also returns whether it was cut.
+    """
+    line = f.readline(limit + 1)
+    if len(line) <= limit or line[limit:] == "\n":
+        return line, False
+    rest = line[limit:]
+    while rest and not rest.endswith("\n"):
+        rest = f.readline(READ_CHUNK_CHARACTERS)
+    return line[:limit] + "\n", True
+
+
+def _read_lines(full_path, file_path, total_size, start_line, end_line):
+    start_line = max(int(start_line or 1), 1)
+    end_line = int(end_line) if end_line is not None else None
+    if end_line is not None and end_line < start_line:
+        return f'Error: end_line {end_line} is before start_line {start_line}'
+
+    lines = []
+    chars = 0
+    line_number = 0
+    next_line = None
+    with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            if end_line is not None and line_number >= end_line:
+                if f.readline(1):
+                    next_line = line_number + 1
+                break
+            line, cut = _read_line(f, FILE_CHARACTER_LIMIT)
+            if not line:
+                break
+            line_number += 1
+            if line_number < start_line:
+                continue
+            if lines and chars + len(line) > FILE_CHARACTER_LIMIT:
+                # Stop at the character limit, the caller continues from this line
+                next_line = line_number
+                break
+            if cut:
+                line += f'[...line {line_number} truncated at {FILE_CHARACTER_LIMIT} characters]\n'
+            lines.append(line)
+            chars += len(line)
+
+    if not lines:
+        return f'Error: "{file_path}" has only {line_number} lines, start_line {start_line} is past the end'
+
+    last_line = start_line + len(lines) - 1
+    content = "".join(lines)
+    content += f'\n[File "{file_path}": lines {start_line}-{last_line}, {total_size} bytes on disk.'
+    if next_line is not None:
+        content += f' Continue with start_line={next_line}]'
+    else:
+        content += ' End of file]'
+    return content
+
+
 # Define the function schema for AI integration
-schema_get_file_content = types.FunctionDeclaration(
-    name="get_file_content",
-    description="Returns content of a file as string up to a preconfigured character limit, constrained to the working directory.",
-    parameters=types.Schema(
-        type=types.Type.OBJECT,
-        properties={
-            "file_path": types.Schema(
-                type=types.Type.STRING,
-                description="The path to the file whose content is returned, relative to the working directory. If path is invalid or the file is to accessible an error is returned.",
-            ),
-        },
-    ),
-)
\ No newline at end of file
+def schema_get_file_content():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="get_file_content",
+        description="Returns content of a file as string up to a preconfigured character limit, constrained to the working directory. Large files can be paged through with offset/length (characters) or start_line/end_line; partial reads end with the offset or line to continue from.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "file_path": types.Schema(
+                    type=types.Type.STRING,
+                    description="The path to the file whose content is returned, relative to the working directory. If path is invalid or the file is to accessible an error is returned.",
+                ),
+                "offset": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Character offset to start reading at. Defaults to 0.",
+                ),
+                "length": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Number of characters to read from offset, capped at the character limit.",
+                ),
+                "start_line": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="First line to return (1-based). Use with end_line to read a window of lines instead of a character range.",
+                ),
+                "end_line": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Last line to return (inclusive). Defaults to as many lines as fit the character limit.",
+                ),
+            },
+        ),
+    )
@@ -1,16 +1,41 @@
+import fnmatch
 import os
-from google.genai import types
+from config import *
 
-def get_files_info(working_directory, directory="."):
+import tracing
+
+def get_files_info(
+    working_directory,
+    directory=".",
+    recursive=False,
+    max_depth=None,
+    include=None,
+    exclude=None,
+    respect_ignore=None,
+    cursor=None,
+    limit=None,
+):
     """
     Lists file info for a directory inside the working_directory.
 
+    Entries are listed in sorted order with os.scandir, optionally recursively.
+    Large listings are split into pages; each page ends with the cursor to pass
+    to get the next one.
+
     Parameters:
         working_directory (str): Base directory (root of allowed operations)
         directory (str): Relative path inside working_directory
+        recursive (bool): Whether to descend into subdirectories
+        max_depth (int): How many levels to descend, 1 is the directory itself
+        include (list[str]): Glob patterns, only matching files are listed
+        exclude (list[str]): Glob patterns for files and directories to leave out
+        respect_ignore (bool): Whether to skip FILES_INFO_IGNORE names and .gitignore patterns,
+            defaults to True for recursive listings and False otherwise
+        cursor (str): Path of the last entry of the previous page
+        limit (int): Maximum number of entries per page
 
     Returns:
-        list[dict] | str: A list of file info dicts, or an error message string.
+        str: One line of file info per entry, or an error message string.
     """
     try:
     # Build the full path
@@ -25,17 +50,33 @@ def get_files_info(working_directory, directory="."):
         if not os.path.isdir(full_path):
             return f'Error: "{directory}" is not a directory'
 
-    # Gather file info
+    # Resolve listing options
+        if max_depth is None:
+            max_depth = None if recursive else 1
+        elif not recursive:
+            max_depth = 1
+        limit = int(limit or FILES_INFO_PAGE_SIZE)
+        include = _as_list(include)
+        exclude = _as_list(exclude)
+        if respect_ignore is None:
+            # A plain listing shows the directory as it is, recursive ones would drown in caches
+            respect_ignore = bool(recursive)
+        ignore_patterns = load_ignore_patterns(working_directory) if respect_ignore else []
+        cursor_key = tuple(cursor.split("/")) if cursor else None
+
+    # Gather file info, one extra entry tells whether there is another page
         lines = []
-        for entry in os.listdir(full_path):
-            entry_path = os.path.join(full_path, entry)
-            try:
-                is_dir = os.path.isdir(entry_path)
-                size = os.path.getsize(entry_path)
-                lines.append(f"- {entry}: file_size={size} bytes, is_dir={is_dir}")
-            except Exception as e:
-                # Catch errors per entry (e.g., permission denied)
-                return f"Error: Could not access '{entry}': {e}"
+        last_key = None
+        with tracing.span("get_files_info.walk", recursive=bool(recursive), max_depth=max_depth) as walk_span:
+            for key, line in _walk(
+                full_path, working_directory, (), max_depth, include, exclude, ignore_patterns, cursor_key
+            ):
+                if len(lines) == limit:
+                    lines.append(f'[Listing truncated at {limit} entries. Continue with cursor="{"/".join(last_key)}"]')
+                    break
+                lines.append(line)
+                last_key = key
+            walk_span.set(entries=len(lines))
 
         return "\n".join(lines)
 
@@ -44,17 +85,158 @@ def get_files_info(working_directory, directory="."):
         return f"Error: {e}"
 
 
+def _as_list(patterns):
+    if not patterns:
+        return []
+    if isinstance(patterns, str):
+        return [patterns]
+    return list(patterns)
+
+
+def _walk(path, working_directory, parent_key, max_depth, include, exclude, ignore_patterns, cursor_key):
+    """
+    Yields (key, line) for every listed entry below path in sorted depth-first order.
+
+    The key is the tuple of path components relative to the listed directory. That
+    order matches the traversal order, so subtrees before the cursor are skipped
+    without being scanned.
+    """
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError as e:
+        yield parent_key, f"- {'/'.join(parent_key) or '.'}: error={e}"
+        return
+
+    for entry in entries:
+        key = parent_key + (entry.name,)
+        relative_path = "/".join(key)
+
+        # The cursor points into this subtree, or the whole subtree was on earlier pages
+        before_cursor = cursor_key is not None and key <= cursor_key
+        inside_cursor = cursor_key is not None and cursor_key[: len(key)] == key
+
+        try:
+            # DirEntry caches the stat data from the directory scan
+            is_dir = entry.is_dir()
+            if ignore_patterns and is_ignored(
+                os.path.relpath(entry.path, working_directory), entry.name, is_dir, ignore_patterns
+            ):
+                continue
+            if exclude and _matches(relative_path, entry.name, exclude):
+                continue
+
+            listed = not include or (not is_dir and _matches(relative_path, entry.name, include))
+            if listed and not before_cursor:
+                size = entry.stat().st_size
+                yield key, f"- {relative_path}: file_size={size} bytes, is_dir={is_dir}"
+
+            # Don't follow symlinked directories, they could loop or leave the working directory
+            descend = is_dir and not entry.is_symlink() and (max_depth is None or len(key) < max_depth)
+            if descend and (not before_cursor or inside_cursor):
+                yield from _walk(
+                    entry.path, working_directory, key, max_depth, include, exclude, ignore_patterns, cursor_key
+                )
+
+        except OSError as e:
+            # Report errors per entry (e.g., permission denied) and keep listing
+            if not before_cursor:
+                yield key, f"- {relative_path}: error={e}"
+
+
+def _matches(relative_path, name, patterns):
+    return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def load_ignore_patterns(working_directory):
+    """
+    Returns the ignore rules for a working directory: FILES_INFO_IGNORE plus its .gitignore.
+
+    Each rule is a tuple (pattern, anchored, dir_only). Negated .gitignore patterns
+    are not supported and skipped.
+    """
+    patterns = [(name, False, False) for name in FILES_INFO_IGNORE]
+    try:
+        with open(os.path.join(working_directory, ".gitignore"), encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or line.startswith("!"):
+                    continue
+                dir_only = line.endswith("/")
+                line = line.rstrip("/")
+                anchored = "/" in line
+                patterns.append((line.lstrip("/"), anchored, dir_only))
+    except OSError:
+        pass
+    return patterns
+
+
+def is_ignored(relative_path, name, is_dir, ignore_patterns):
+    """
+    Checks an entry against ignore rules from load_ignore_patterns().
+
+    Parameters:
+        relative_path (str): Path of the entry relative to the working directory.
+        name (str): Base name of the entry.
+        is_dir (bool): Whether the entry is a directory.
+        ignore_patterns (list[tuple]): The ignore rules.
+
+    Returns:
+        bool: True if the entry should be skipped.
+    """
+    relative_path = relative_path.replace(os.sep, "/")
+    for pattern, anchored, dir_only in ignore_patterns:
+        if dir_only and not is_dir:
+            continue
+        if fnmatch.fnmatch(relative_path if anchored else name, pattern):
+            return True
+    return False
+
+
 # Define the function schema for AI integration
-schema_get_files_info = types.FunctionDeclaration(
-    name="get_files_info",
-    description="Lists files in the specified directory along with their sizes, constrained to the working directory.",
-    parameters=types.Schema(
-        type=types.Type.OBJECT,
-        properties={
-            "directory": types.Schema(
-                type=types.Type.STRING,
-                description="The directory to list files from, relative to the working directory. If not provided, lists files in the working directory itself.",
-            ),
-        },
-    ),
-)
\ No newline at end of file
+def schema_get_files_info():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="get_files_info",
+        description="Lists files in the specified directory along with their sizes, constrained to the working directory. Can list recursively with glob filters; large listings are paginated with a cursor.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "directory": types.Schema(
+                    type=types.Type.STRING,
+                    description="The directory to list files from, relative to the working directory. If not provided, lists files in the working directory itself.",
+                ),
+                "recursive": types.Schema(
+                    type=types.Type.BOOLEAN,
+                    description="List subdirectories recursively. Paths are then relative to the listed directory.",
+                ),
+                "max_depth": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="With recursive, how many directory levels to list (1 lists only the directory itself).",
+                ),
+                "include": types.Schema(
+                    type=types.Type.ARRAY,
+                    items=types.Schema(type=types.Type.STRING),
+                    description="Glob patterns (e.g. '*.py'); only matching files are listed.",
+                ),
+                "exclude": types.Schema(
+                    type=types.Type.ARRAY,
+                    items=types.Schema(type=types.Type.STRING),
+                    description="Glob patterns for files and directories to leave out.",
+                ),
+                "respect_ignore": types.Schema(
+                    type=types.Type.BOOLEAN,
+                    description="Skip .gitignore matches and caches like __pycache__. Defaults to true for recursive listings and false otherwise.",
+                ),
+                "cursor": types.Schema(
+                    type=types.Type.STRING,
+                    description="Cursor from a truncated listing, returns the next page.",
+                ),
+                "limit": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Maximum number of entries per page.",
+                ),
+            },
+        ),
+    )
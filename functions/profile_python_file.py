@@ -0,0 +1,202 @@
+import os
+import pstats
+import sys
+import tempfile
+from config import *
+
+import tracing
+from functions.run_python_file import run_capped_process
+
+# Runs the script under cProfile in the child, then saves the stats and the peak RSS
+# even if the script raised or called sys.exit()
+PROFILE_DRIVER = """
+import cProfile, os, runpy, sys
+stats_path, rss_path, script = sys.argv[1:4]
+sys.argv = sys.argv[3:]
+sys.path[0] = os.path.dirname(script)
+profiler = cProfile.Profile()
+try:
+    profiler.runcall(runpy.run_path, script, run_name="__main__")
+finally:
+    profiler.dump_stats(stats_path)
+    try:
+        # VmHWM starts over at exec, ru_maxrss on Linux also counts the forked parent
+        with open("/proc/self/status") as f:
+            peak = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+            peak *= 1 if sys.platform == "darwin" else 1024
+        except ImportError:
+            peak = None
+    if peak is not None:
+        with open(rss_path, "w") as f:
+            f.write(str(peak))
+"""
+
+# Frames of the driver and the import machinery, import time still shows in the <module> entries
+SKIPPED_FILES = ("runpy.py", "<frozen runpy>", "<string>")
+SKIPPED_PREFIXES = ("<frozen importlib",)
+
+
+def profile_python_file(working_directory, file_path, args=[], top=None):
+    """
+    Runs a Python file under cProfile and summarizes where the time went.
+
+    Parameters:
+        working_directory (str): Base directory for allowed execution.
+        file_path (str): Relative path to the Python file to profile.
+        args (list): Additional command-line arguments to pass to the script.
+        top (int): Number of functions per ranking, defaults to PROFILE_TOP_FUNCTIONS.
+
+    Returns:
+        str: The top functions by cumulative and by self time, the peak memory
+        and the end of the script's output, or an error message prefixed with "Error:".
+    """
+    try:
+        # Resolve absolute paths
+        full_path = os.path.abspath(os.path.join(working_directory, file_path))
+        working_directory = os.path.abspath(working_directory)
+
+        # Security check: ensure file is inside working_directory
+        if not full_path.startswith(working_directory):
+            return f'Error: Cannot profile "{file_path}" as it is outside the permitted working directory'
+
+        # Check file existence
+        if not os.path.isfile(full_path):
+            return f'Error: File "{file_path}" not found.'
+
+        # Check file extension
+        if not full_path.endswith(".py"):
+            return f'Error: "{file_path}" is not a Python file.'
+
+        top = max(1, int(top or PROFILE_TOP_FUNCTIONS))
+
+        with tempfile.TemporaryDirectory() as profile_dir:
+            stats_path = os.path.join(profile_dir, "profile.stats")
+            rss_path = os.path.join(profile_dir, "peak_rss")
+            cmd = [sys.executable, "-c", PROFILE_DRIVER, stats_path, rss_path, full_path] + list(args)
+
+            with tracing.span("profile_python_file.process") as process_span:
+                stdout, stderr, exit_code, killed_reason = run_capped_process(cmd, working_directory, RUN_PYTHON_TIMEOUT)
+                process_span.set(exit_code=exit_code, killed=killed_reason)
+
+            if not os.path.exists(stats_path):
+                # Killed before the profile could be saved
+                reason = killed_reason or f"exited with code {exit_code}"
+                return f"Error: No profile was recorded, the process {reason}.\n" + _output_tail(stdout, stderr)
+
+            stats = pstats.Stats(stats_path)
+            peak_rss = _read_peak_rss(rss_path)
+
+        lines = [_header(file_path, stats, peak_rss, exit_code, killed_reason)]
+        rows = _rows(stats, working_directory)
+        lines.append(f"Top {top} by cumulative time (time in the function and everything it calls):")
+        lines.extend(_table(sorted(rows, key=lambda row: row[3], reverse=True)[:top]))
+        lines.append(f"Top {top} by self time (time in the function's own code):")
+        lines.extend(_table(sorted(rows, key=lambda row: row[2], reverse=True)[:top]))
+
+        output = _output_tail(stdout, stderr)
+        if output:
+            lines.append(output)
+        return "\n".join(lines)
+
+    except Exception as e:
+        return f"Error: profiling Python file: {e}"
+
+
+def _header(file_path, stats, peak_rss, exit_code, killed_reason):
+    header = f'Profile of "{file_path}": {stats.total_tt:.3f}s profiled, {stats.total_calls} function calls'
+    if peak_rss is not None:
+        header += f", peak RSS {peak_rss / (1024 * 1024):.1f} MiB"
+    if killed_reason:
+        header += f", process killed: {killed_reason}"
+    elif exit_code != 0:
+        header += f", exited with code {exit_code}"
+    return header
+
+
+def _rows(stats, working_directory):
+    """
+    Returns (name, calls, self time, cumulative time) for every profiled function.
+    """
+    rows = []
+    for (filename, line, function), (_, calls, self_time, cumulative, _) in stats.stats.items():
+        if (
+            filename.endswith(SKIPPED_FILES)
+            or filename.startswith(SKIPPED_PREFIXES)
+            or function == "<built-in method builtins.exec>"
+        ):
+            continue
+        if filename == "~":
+            # Built-in functions have no source file
+            name = function
+        else:
+            if filename.startswith(working_directory + os.sep):
+                filename = os.path.relpath(filename, working_directory)
+            else:
+                filename = os.path.basename(filename)
+            name = f"{filename}:{line}({function})"
+        rows.append((name, calls, self_time, cumulative))
+    return rows
+
+
+def _table(rows):
+    lines = [f"  {'cumulative':>10} {'self':>9} {'calls':>8}  function"]
+    for name, calls, self_time, cumulative in rows:
+        lines.append(f"  {cumulative:>9.3f}s {self_time:>8.3f}s {calls:>8}  {name}")
+    return lines
+
+
+def _read_peak_rss(rss_path):
+    try:
+        with open(rss_path) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _output_tail(stdout, stderr):
+    parts = []
+    for name, text in (("STDOUT", stdout), ("STDERR", stderr)):
+        text_lines = text.strip().splitlines()
+        if not text_lines:
+            continue
+        skipped = len(text_lines) - PROFILE_OUTPUT_LINES
+        if skipped > 0:
+            text_lines = [f"[... {skipped} earlier lines]"] + text_lines[-PROFILE_OUTPUT_LINES:]
+        parts.append(f"{name}:\n" + "\n".join(text_lines))
+    return "\n".join(parts)
+
+
+# Define the function schema for AI integration
+def schema_profile_python_file():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="profile_python_file",
+        description="Runs a python file under cProfile, constrained to the working directory, and returns the functions with the most cumulative and self time, the peak memory and the end of the script's output.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "file_path": types.Schema(
+                    type=types.Type.STRING,
+                    description="The path to the python file to profile, relative to the working directory.",
+                ),
+                "args": types.Schema(
+                    type=types.Type.ARRAY,
+                    items=types.Schema(
+                        type=types.Type.STRING,
+                    ),
+                    description="A list of command-line arguments to pass to the python script.",
+                ),
+                "top": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Number of functions listed in each ranking.",
+                ),
+            },
+            required=["file_path"],
+        ),
+    )
@@ -0,0 +1,71 @@
+from config import *
+
+import spill_store
+
+def read_spilled(working_directory, handle, offset=None, length=None):
+    """
+    Returns a slice of a tool result that was spilled to disk.
+
+    Parameters:
+        working_directory (str): Base directory, only outputs spilled for it can be read
+        handle (str): The handle given in the truncated tool result
+        offset (int): Character offset to start reading at
+        length (int): Number of characters to read, capped at the character limit
+
+    Returns:
+        str: The slice followed by a metadata line, or an error message string.
+    """
+    try:
+        try:
+            # Handles of other sessions' working directories don't resolve here
+            text = spill_store.default_store.read(handle, owner=working_directory)
+        except KeyError:
+            return f'Error: Unknown spilled output "{handle}", it may have been pruned. Run the tool again'
+
+        offset = int(offset or 0)
+        if offset < 0 or offset > len(text):
+            return f"Error: offset {offset} is outside the spilled output ({len(text)} characters)"
+        length = FILE_CHARACTER_LIMIT if length is None else min(int(length), FILE_CHARACTER_LIMIT)
+        if length <= 0:
+            return f"Error: length must be positive, got {length}"
+
+        end = min(offset + length, len(text))
+        content = text[offset:end]
+        content += f"\n[Spilled output {handle}: characters {offset}-{end} of {len(text)} total."
+        if end < len(text):
+            content += f" Continue with offset={end}]"
+        else:
+            content += " End of output]"
+        return content
+
+    except Exception as e:
+        # Catch any other unexpected errors
+        return f"Error: {e}"
+
+
+# Define the function schema for AI integration
+def schema_read_spilled():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="read_spilled",
+        description="Reads part of a long tool output that was shortened to a preview and a handle.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "handle": types.Schema(
+                    type=types.Type.STRING,
+                    description="The handle from the shortened output.",
+                ),
+                "offset": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Character offset to start reading at, e.g. the offset given with the handle.",
+                ),
+                "length": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Number of characters to read.",
+                ),
+            },
+            required=["handle"],
+        ),
+    )
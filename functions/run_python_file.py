@@ -1,9 +1,14 @@
 import os
 import subprocess
 import sys
-from google.genai import types
+import tempfile
+import threading
+from config import *
 
-def run_python_file(working_directory, file_path, args=[]):
+import interpreter_pool
+import tracing
+
+def run_python_file(working_directory, file_path, args=[], warm=None):
     """
     Executes a Python file safely within a working directory.
 
@@ -11,6 +16,8 @@ def run_python_file(working_directory, file_path, args=[]):
         working_directory (str): Base directory for allowed execution.
         file_path (str): Relative path to the Python file to execute.
         args (list): Additional command-line arguments to pass to the script.
+        warm (bool): Run in a child of the warm interpreter pool instead of a fresh
+            interpreter. Defaults to RUN_PYTHON_USE_WARM_POOL.
 
     Returns:
         str: Formatted output, or an error message prefixed with "Error:".
@@ -32,21 +39,36 @@ def run_python_file(working_directory, file_path, args=[]):
         if not full_path.endswith(".py"):
             return f'Error: "{file_path}" is not a Python file.'
 
-        # Build the command: python <file> [args...]
-        cmd = [sys.executable, full_path] + args
+        if warm is None:
+            warm = RUN_PYTHON_USE_WARM_POOL
+
+        use_pool = warm and interpreter_pool.available()
+        with tracing.span("run_python_file.process", warm=bool(use_pool)) as process_span:
+            if use_pool:
+                # Fork from a pre-started interpreter, skipping startup and common imports
+                with tempfile.TemporaryDirectory() as capture_dir:
+                    stdout_path = os.path.join(capture_dir, "stdout")
+                    stderr_path = os.path.join(capture_dir, "stderr")
+                    exit_code, killed_reason = interpreter_pool.run_script(
+                        full_path, args, working_directory, RUN_PYTHON_TIMEOUT, stdout_path, stderr_path
+                    )
+                    stdout = read_capped_file(stdout_path)
+                    stderr = read_capped_file(stderr_path)
+            else:
+                # Build the command: python <file> [args...]
+                cmd = [sys.executable, full_path] + args
+
+                # Run the subprocess, reading its output as it is produced
+                stdout, stderr, exit_code, killed_reason = run_capped_process(
+                    cmd, working_directory, RUN_PYTHON_TIMEOUT
+                )
 
-        # Run the subprocess
-        completed_process = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd=working_directory,
-            timeout=30
-        )
+            process_span.set(
+                exit_code=exit_code, killed=killed_reason, stdout_chars=len(stdout), stderr_chars=len(stderr)
+            )
 
-        stdout = completed_process.stdout.strip()
-        stderr = completed_process.stderr.strip()
-        exit_code = completed_process.returncode
+        stdout = stdout.strip()
+        stderr = stderr.strip()
 
         # Prepare output
         output_lines = []
@@ -54,7 +76,9 @@ def run_python_file(working_directory, file_path, args=[]):
             output_lines.append(f"STDOUT:\n{stdout}")
         if stderr:
             output_lines.append(f"STDERR:\n{stderr}")
-        if exit_code != 0:
+        if killed_reason:
+            output_lines.append(f"Process killed: {killed_reason}")
+        elif exit_code != 0:
             output_lines.append(f"Process exited with code {exit_code}")
 
         if not output_lines:
@@ -64,26 +88,143 @@ def run_python_file(working_directory, file_path, args=[]):
 
     except Exception as e:
         return f"Error: executing Python file: {e}"
-    
+
+
+class CappedOutput:
+    """
+    Keeps the first and last bytes of a stream within a fixed budget.
+
+    Everything in between is counted but dropped, so memory stays bounded no
+    matter how much the process prints.
+    """
+
+    def __init__(self, cap=RUN_PYTHON_OUTPUT_CAP_BYTES):
+        self.head_limit = cap // 2
+        self.tail_limit = cap - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        # A reader may still be appending when text() is called (e.g. a grandchild kept the pipe open)
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        with self.lock:
+            self.total += len(data)
+            room = self.head_limit - len(self.head)
+            if room > 0:
+                self.head += data[:room]
+                data = data[room:]
+            if data:
+                self.tail += data
+                if len(self.tail) > self.tail_limit:
+                    del self.tail[: len(self.tail) - self.tail_limit]
+
+    def text(self):
+        with self.lock:
+            head, tail, total = bytes(self.head), bytes(self.tail), self.total
+        return _join_capped(head, tail, total)
+
+
+def _decode(data):
+    # Same newline translation as reading the pipes in text mode
+    return data.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _join_capped(head, tail, total):
+    dropped = total - len(head) - len(tail)
+    if dropped <= 0:
+        # Decoded together, so a character or CRLF split between the two stays whole
+        return _decode(head + tail)
+    return _decode(head) + f"\n[... {dropped} bytes of output dropped ...]\n" + _decode(tail)
+
+
+def read_capped_file(path, cap=RUN_PYTHON_OUTPUT_CAP_BYTES):
+    """
+    Reads the first and last bytes of a capture file within a fixed budget.
+    """
+    head_limit = cap // 2
+    tail_limit = cap - head_limit
+    with open(path, "rb") as f:
+        total = os.fstat(f.fileno()).st_size
+        head = f.read(head_limit)
+        tail = b""
+        if total > len(head):
+            f.seek(max(len(head), total - tail_limit))
+            tail = f.read()
+    return _join_capped(head, tail, total)
+
+
+def run_capped_process(cmd, cwd, timeout, cap=RUN_PYTHON_OUTPUT_CAP_BYTES, kill_after_bytes=RUN_PYTHON_KILL_AFTER_BYTES):
+    """
+    Runs a command and reads its STDOUT and STDERR incrementally into capped buffers.
+
+    The process is killed early once it ran for timeout seconds or printed more
+    than kill_after_bytes in total.
+
+    Returns:
+        tuple[str, str, int, str | None]: STDOUT, STDERR, the exit code and
+        the reason the process was killed (None if it exited by itself).
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+    )
+    outputs = [CappedOutput(cap), CappedOutput(cap)]
+    killed_reasons = []
+
+    def pump(stream, output):
+        with stream:
+            for chunk in iter(lambda: stream.read1(65536), b""):
+                output.write(chunk)
+                if outputs[0].total + outputs[1].total > kill_after_bytes and not killed_reasons:
+                    killed_reasons.append(f"output exceeded {kill_after_bytes} bytes")
+                    process.kill()
+
+    readers = [
+        threading.Thread(target=pump, args=(process.stdout, outputs[0]), daemon=True),
+        threading.Thread(target=pump, args=(process.stderr, outputs[1]), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        exit_code = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        killed_reasons.append(f"timed out after {timeout} seconds")
+        process.kill()
+        exit_code = process.wait()
+
+    # Don't hang on a grandchild that kept the pipes open, the buffers are read under their locks
+    for reader in readers:
+        reader.join(timeout=1.0)
+    killed_reason = killed_reasons[0] if killed_reasons else None
+    return outputs[0].text(), outputs[1].text(), exit_code, killed_reason
+
 
 # Define the function schema for AI integration
-schema_run_python_file = types.FunctionDeclaration(
-    name="run_python_file",
-    description="Executes a python file, constrained to the working directory.",
-    parameters=types.Schema(
-        type=types.Type.OBJECT,
-        properties={
-            "file_path": types.Schema(
-                type=types.Type.STRING,
-                description="The path to the python file that is executed, relative to the working directory. If path is invalid or it's not a python fiel an error is returned.",
-            ),
-            "args": types.Schema(
-                type=types.Type.ARRAY,
-                items=types.Schema(
+def schema_run_python_file():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="run_python_file",
+        description="Executes a python file, constrained to the working directory.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "file_path": types.Schema(
                     type=types.Type.STRING,
+                    description="The path to the python file that is executed, relative to the working directory. If path is invalid or it's not a python fiel an error is returned.",
+                ),
+                "args": types.Schema(
+                    type=types.Type.ARRAY,
+                    items=types.Schema(
+                        type=types.Type.STRING,
+                    ),
+                    description="A list of command-line arguments to pass to the python script.",
                 ),
-                description="A list of command-line arguments to pass to the python script.",
-            ),
-        },
-    ),
-)
\ No newline at end of file
+            },
+        ),
+    )
@@ -0,0 +1,451 @@
+import ast
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import *
+
+import tracing
+import workspace_tracker
+from functions.run_python_file import run_capped_process
+
+# Child side of run_tests. "discover" writes the test ids found below a directory,
+# "run" runs the given ids and appends one JSON line per finished test, so the
+# results of a worker that gets killed are kept up to that test.
+TEST_DRIVER = """
+import json, sys, time, unittest
+mode, argument, output_path = sys.argv[1:4]
+loader = unittest.TestLoader()
+
+if mode == "discover":
+    start_dir, pattern = json.loads(argument)
+    def ids(suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                yield from ids(test)
+            elif not test.id().startswith("unittest.loader._FailedTest."):
+                yield test.id()
+    suite = loader.discover(start_dir, pattern, top_level_dir=".")
+    with open(output_path, "w") as f:
+        json.dump({"tests": list(ids(suite)), "errors": loader.errors}, f)
+    sys.exit(0)
+
+output = open(output_path, "a", buffering=1)
+
+class Result(unittest.TestResult):
+    def startTest(self, test):
+        self.started = time.perf_counter()
+        self.current_test = test
+        self.subtest_failures = []
+        super().startTest(test)
+
+    def stopTest(self, test):
+        # A test whose subtests failed gets no outcome of its own
+        if self.subtest_failures:
+            self.record(test, "fail")
+        super().stopTest(test)
+
+    def record(self, test, status, detail=None):
+        # Failing subtests are reported under the id of their test
+        failures = getattr(self, "subtest_failures", None) if test is getattr(self, "current_test", None) else None
+        if failures:
+            if any(failure_status == "error" for failure_status, _ in failures):
+                status = "error"
+            elif status == "pass":
+                status = "fail"
+            detail = "\\n".join([failure_detail for _, failure_detail in failures] + ([detail] if detail else []))
+            self.subtest_failures = []
+        # setUpClass and module fixture errors have no startTest
+        duration = time.perf_counter() - getattr(self, "started", time.perf_counter())
+        output.write(json.dumps({"id": test.id(), "status": status, "duration": duration, "detail": detail}) + "\\n")
+        self.started = time.perf_counter()
+
+    def addSuccess(self, test):
+        self.record(test, "pass")
+
+    def addFailure(self, test, err):
+        self.record(test, "fail", self._exc_info_to_string(err, test))
+
+    def addError(self, test, err):
+        self.record(test, "error", self._exc_info_to_string(err, test))
+
+    def addSkip(self, test, reason):
+        self.record(test, "skip", reason)
+
+    def addExpectedFailure(self, test, err):
+        self.record(test, "pass")
+
+    def addUnexpectedSuccess(self, test):
+        self.record(test, "fail", "Unexpected success")
+
+    def addSubTest(self, test, subtest, err):
+        if err is not None:
+            status = "fail" if issubclass(err[0], test.failureException) else "error"
+            self.subtest_failures.append((status, subtest.id() + "\\n" + self._exc_info_to_string(err, test)))
+
+with open(argument) as f:
+    names = json.load(f)
+loader.loadTestsFromNames(names).run(Result())
+"""
+
+STATUS_LABELS = {"pass": "PASS", "fail": "FAIL", "error": "ERROR", "skip": "SKIP"}
+
+# Results of the last runs per working directory, for only_failed and affected
+_last_runs = {}
+_last_runs_lock = threading.Lock()
+
+
+def run_tests(working_directory, directory=".", pattern=None, tests=None, only_failed=False, affected=False, workers=None, details=False):
+    """
+    Discovers unittest tests and runs them sharded over several worker processes.
+
+    Test classes are kept together in one shard, so class fixtures run once, and
+    shards are balanced with the durations of earlier runs. The results of every
+    run are remembered per working directory, which lets the next call rerun only
+    the tests that failed or the tests affected by files changed since then.
+
+    Parameters:
+        working_directory (str): Base directory, the top level for test imports.
+        directory (str): Relative path to discover tests below.
+        pattern (str): File name pattern of test files, defaults to TESTS_PATTERN.
+        tests (list): Test ids or prefixes (module, class) to run instead of discovering.
+        only_failed (bool): Run only the tests that failed or errored last time.
+        affected (bool): Run only the tests whose module, or a module it imports,
+            changed since the last run (plus new tests).
+        workers (int): Number of worker processes, capped at TESTS_MAX_WORKERS.
+        details (bool): List every test with its status and duration.
+
+    Returns:
+        str: A summary line, the failures with the end of their tracebacks and
+        the slowest tests, or an error message prefixed with "Error:".
+    """
+    try:
+        # Resolve absolute paths
+        full_path = os.path.abspath(os.path.join(working_directory, directory))
+        working_directory = os.path.abspath(working_directory)
+
+        # Security check: ensure the test directory is inside working_directory
+        if not full_path.startswith(working_directory):
+            return f'Error: Cannot run tests in "{directory}" as it is outside the permitted working directory'
+
+        if not os.path.isdir(full_path):
+            return f'Error: "{directory}" is not a directory'
+
+        with _last_runs_lock:
+            last_run = _last_runs.get(working_directory)
+        previous_results = last_run["results"] if last_run else {}
+
+        # Taken before the run, so files the tests write count as changes next time
+        tracker = workspace_tracker.get_tracker(working_directory)
+        with tracing.span("run_tests.snapshot") as snapshot_span:
+            _, files = tracker.snapshot()
+            snapshot_span.set(files=len(files))
+
+        with tempfile.TemporaryDirectory() as run_dir:
+            collection_errors = []
+            if tests:
+                test_ids = sorted(set(tests))
+            else:
+                with tracing.span("run_tests.discover") as discover_span:
+                    test_ids, collection_errors = _discover(working_directory, full_path, pattern or TESTS_PATTERN, run_dir)
+                    discover_span.set(tests=len(test_ids), errors=len(collection_errors))
+
+            selection = None
+            if only_failed or affected:
+                if last_run is None:
+                    selection = "first run, running all tests"
+                else:
+                    selected = set()
+                    if only_failed:
+                        # Explicit tests may be prefixes (a module or class), the results are per test
+                        selected |= {
+                            result_id
+                            for result_id, result in previous_results.items()
+                            if result["status"] in ("fail", "error")
+                            and any(result_id == test_id or result_id.startswith(test_id + ".") for test_id in test_ids)
+                        }
+                    if affected:
+                        changed = _affected_modules(last_run["files"], files)
+                        selected |= {
+                            test_id
+                            for test_id in test_ids
+                            if test_id not in previous_results or _module_path(test_id, working_directory) in changed
+                        }
+                    reason = " or ".join(name for name, on in (("failed last time", only_failed), ("affected by changes", affected)) if on)
+                    if not selected and not collection_errors:
+                        return f"No tests {reason} ({len(test_ids)} tests found). {_last_summary(previous_results)}"
+                    selection = f"{len(selected)} of {len(test_ids)} tests {reason}"
+                    test_ids = sorted(selected)
+
+            shards = _shards(test_ids, previous_results, workers)
+            started = time.perf_counter()
+            with tracing.span("run_tests.run", tests=len(test_ids), shards=len(shards)):
+                with ThreadPoolExecutor(max_workers=max(1, len(shards))) as executor:
+                    outcomes = list(executor.map(lambda item: _run_shard(working_directory, run_dir, *item), enumerate(shards)))
+            elapsed = time.perf_counter() - started
+
+        results = {}
+        for outcome in outcomes:
+            results.update(outcome)
+        for message in collection_errors:
+            results[f"<collecting> {_error_name(message)}"] = {"status": "error", "duration": 0.0, "detail": message}
+
+        with _last_runs_lock:
+            # A test's result replaces any recorded for its subtests, e.g. "<id> (i=2)"
+            merged = {
+                result_id: result
+                for result_id, result in previous_results.items()
+                if result_id.split(" (", 1)[0] not in results
+            }
+            merged.update(results)
+            _last_runs[working_directory] = {"results": merged, "files": files}
+
+        return _report(results, len(shards), elapsed, selection, details)
+
+    except Exception as e:
+        return f"Error: running tests: {e}"
+
+
+def _discover(working_directory, start_dir, pattern, run_dir):
+    output_path = os.path.join(run_dir, "discovered.json")
+    cmd = [sys.executable, "-c", TEST_DRIVER, "discover", json.dumps([start_dir, pattern]), output_path]
+    stdout, stderr, exit_code, killed_reason = run_capped_process(cmd, working_directory, RUN_PYTHON_TIMEOUT)
+    if not os.path.exists(output_path):
+        reason = killed_reason or f"exited with code {exit_code}"
+        raise RuntimeError(f"test discovery {reason}: {stderr.strip()[-2000:]}")
+    with open(output_path) as f:
+        discovered = json.load(f)
+    return sorted(set(discovered["tests"])), discovered["errors"]
+
+
+def _shards(test_ids, previous_results, workers):
+    """
+    Splits the tests into balanced shards, longest test classes first onto the
+    least loaded shard. Tests without an earlier duration count as average.
+    """
+    if not test_ids:
+        return []
+    groups = {}
+    for test_id in test_ids:
+        groups.setdefault(test_id.rsplit(".", 1)[0], []).append(test_id)
+
+    known = [previous_results[test_id]["duration"] for test_id in test_ids if test_id in previous_results]
+    default = sum(known) / len(known) if known else 0.01
+    weights = {
+        group: sum(previous_results.get(test_id, {}).get("duration", default) for test_id in ids)
+        for group, ids in groups.items()
+    }
+
+    if workers:
+        count = min(int(workers), TESTS_MAX_WORKERS)
+    else:
+        count = min(TESTS_MAX_WORKERS, os.cpu_count() or 1, -(-len(test_ids) // TESTS_MIN_PER_SHARD))
+    shards = [[] for _ in range(max(1, min(count, len(groups))))]
+    loads = [0.0] * len(shards)
+    for group in sorted(groups, key=lambda group: weights[group], reverse=True):
+        index = loads.index(min(loads))
+        shards[index].extend(groups[group])
+        loads[index] += weights[group]
+    return [shard for shard in shards if shard]
+
+
+def _run_shard(working_directory, run_dir, index, test_ids):
+    names_path = os.path.join(run_dir, f"shard{index}.json")
+    output_path = os.path.join(run_dir, f"shard{index}.jsonl")
+    with open(names_path, "w") as f:
+        json.dump(test_ids, f)
+
+    cmd = [sys.executable, "-c", TEST_DRIVER, "run", names_path, output_path]
+    with tracing.span("run_tests.shard", shard=index, tests=len(test_ids)) as shard_span:
+        stdout, stderr, exit_code, killed_reason = run_capped_process(cmd, working_directory, RUN_PYTHON_TIMEOUT)
+        shard_span.set(exit_code=exit_code, killed=killed_reason)
+
+    results = {}
+    if os.path.exists(output_path):
+        with open(output_path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # Cut off by the kill
+                    continue
+                results[result.pop("id")] = result
+
+    # Tests the worker never got to, because it was killed or crashed
+    missing = [test_id for test_id in test_ids if test_id not in results and not any(key.startswith(test_id + ".") for key in results)]
+    if missing:
+        reason = killed_reason or f"exited with code {exit_code}"
+        detail = f"Worker {reason} before the test finished.\n{stderr.strip()[-2000:]}"
+        for test_id in missing:
+            results[test_id] = {"status": "error", "duration": 0.0, "detail": detail}
+    return results
+
+
+def _module_path(test_id, working_directory):
+    """
+    Returns the relative path of the module a test id belongs to, or None.
+    """
+    parts = test_id.split(".")
+    for end in range(len(parts) - 1, 0, -1):
+        path = "/".join(parts[:end]) + ".py"
+        if os.path.isfile(os.path.join(working_directory, path)):
+            return path
+    return None
+
+
+def _affected_modules(old_files, new_files):
+    """
+    Returns the Python files that changed between two snapshots, together with
+    every file that imports one of them, directly or through other files.
+    """
+    changed = {path for _, path in workspace_tracker.compare(old_files, new_files) if path.endswith(".py")}
+    if not changed:
+        return changed
+
+    modules = {}
+    for path in new_files.keys() | old_files.keys():
+        if path.endswith(".py"):
+            name = path[:-3].replace("/", ".")
+            modules[name[:-9] if name.endswith(".__init__") else name] = path
+
+    importers = {}
+    for path, (_, _, content) in new_files.items():
+        if not path.endswith(".py") or content is None:
+            continue
+        for name in _imported_names(path, content):
+            if name in modules:
+                importers.setdefault(modules[name], set()).add(path)
+
+    affected = set(changed)
+    pending = list(changed)
+    while pending:
+        for importer in importers.get(pending.pop(), ()):
+            if importer not in affected:
+                affected.add(importer)
+                pending.append(importer)
+    return affected
+
+
+def _imported_names(path, content):
+    """
+    Returns the module names a file imports, including the submodule candidates
+    of "from package import name".
+    """
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return set()
+    package = path[:-3].replace("/", ".").split(".")[:-1]
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[: len(package) - node.level + 1]
+                module = ".".join(base + ([node.module] if node.module else []))
+            else:
+                module = node.module or ""
+            if module:
+                names.add(module)
+            names.update(f"{module}.{alias.name}" if module else alias.name for alias in node.names)
+    return names
+
+
+def _error_name(message):
+    # loader.errors entries end with the exception, e.g. "ModuleNotFoundError: No module named 'x'"
+    lines = message.strip().splitlines()
+    return lines[-1] if lines else "error"
+
+
+def _last_summary(results):
+    counts = _counts(results)
+    return "Last results: " + ", ".join(f"{counts[status]} {name}" for status, name in (("pass", "passed"), ("fail", "failed"), ("error", "errors"), ("skip", "skipped")))
+
+
+def _counts(results):
+    counts = {"pass": 0, "fail": 0, "error": 0, "skip": 0}
+    for result in results.values():
+        counts[result["status"]] += 1
+    return counts
+
+
+def _report(results, shard_count, elapsed, selection, details):
+    counts = _counts(results)
+    summed = sum(result["duration"] for result in results.values())
+    lines = [
+        f"Ran {len(results)} tests in {shard_count} worker(s) in {elapsed:.2f}s (test time {summed:.2f}s): "
+        f"{counts['pass']} passed, {counts['fail']} failed, {counts['error']} errors, {counts['skip']} skipped"
+    ]
+    if selection:
+        lines.append(f"Selected {selection}")
+
+    if details:
+        for test_id in sorted(results):
+            result = results[test_id]
+            lines.append(f"{STATUS_LABELS[result['status']]:<5} {result['duration']:.3f}s {test_id}")
+
+    for test_id in sorted(results):
+        result = results[test_id]
+        if result["status"] not in ("fail", "error"):
+            continue
+        lines.append(f"{STATUS_LABELS[result['status']]}: {test_id} ({result['duration']:.3f}s)")
+        detail_lines = (result["detail"] or "").strip().splitlines()
+        skipped = len(detail_lines) - TESTS_FAILURE_LINES
+        if skipped > 0:
+            detail_lines = [f"[... {skipped} earlier lines]"] + detail_lines[-TESTS_FAILURE_LINES:]
+        lines.extend("    " + line for line in detail_lines)
+
+    slowest = sorted(results.items(), key=lambda item: item[1]["duration"], reverse=True)[:5]
+    if len(results) > 1 and not details:
+        lines.append("Slowest: " + ", ".join(f"{test_id} {result['duration']:.3f}s" for test_id, result in slowest))
+    return "\n".join(lines)
+
+
+# Define the function schema for AI integration
+def schema_run_tests():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="run_tests",
+        description="Discovers and runs unittest tests in parallel worker processes, constrained to the working directory, and returns a pass/fail summary with the failing tests and their tracebacks. Can rerun only the tests that failed last time or that are affected by files changed since the last run.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "directory": types.Schema(
+                    type=types.Type.STRING,
+                    description="The directory to discover tests in, relative to the working directory. Defaults to the working directory itself.",
+                ),
+                "pattern": types.Schema(
+                    type=types.Type.STRING,
+                    description=f'File name pattern of the test files. Defaults to "{TESTS_PATTERN}".',
+                ),
+                "tests": types.Schema(
+                    type=types.Type.ARRAY,
+                    items=types.Schema(
+                        type=types.Type.STRING,
+                    ),
+                    description='Run only these tests instead of discovering, as dotted ids or prefixes, e.g. "tests.TestCalculator" or "tests.TestCalculator.test_addition".',
+                ),
+                "only_failed": types.Schema(
+                    type=types.Type.BOOLEAN,
+                    description="Rerun only the tests that failed or errored in the last run.",
+                ),
+                "affected": types.Schema(
+                    type=types.Type.BOOLEAN,
+                    description="Run only the tests whose module, or a module it imports, changed since the last run.",
+                ),
+                "workers": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Number of worker processes to shard the tests over.",
+                ),
+                "details": types.Schema(
+                    type=types.Type.BOOLEAN,
+                    description="List every test with its status and duration, not just the failures.",
+                ),
+            },
+        ),
+    )
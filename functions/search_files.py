@@ -0,0 +1,159 @@
+import fnmatch
+import os
+import re
+from config import *
+
+import search_index
+import tracing
+
+def search_files(
+    working_directory,
+    query,
+    regex=False,
+    case_sensitive=True,
+    directory=".",
+    include=None,
+    context=0,
+    max_results=None,
+):
+    """
+    Searches the text files of the working directory for a literal string or regex.
+
+    Candidate files come from the trigram index of the working directory, so only
+    files that can contain the query are scanned.
+
+    Parameters:
+        working_directory (str): Base directory (root of allowed operations)
+        query (str): The text or regular expression to search for
+        regex (bool): Whether query is a regular expression
+        case_sensitive (bool): Whether matching is case sensitive
+        directory (str): Relative path inside working_directory to restrict the search to
+        include (list[str]): Glob patterns, only matching files are searched
+        context (int): Lines of context around each hit, capped at SEARCH_MAX_CONTEXT
+        max_results (int): Maximum number of hits, capped at SEARCH_MAX_RESULTS
+
+    Returns:
+        str: One "path:line: text" entry per hit, or an error message string.
+    """
+    try:
+        # Build the full path
+        full_path = os.path.abspath(os.path.join(working_directory, directory))
+        working_directory = os.path.abspath(working_directory)
+
+        # Security check: Ensure full_path is inside working_directory
+        if not full_path.startswith(working_directory):
+            return f'Error: Cannot search "{directory}" as it is outside the permitted working directory'
+
+        if not query:
+            return "Error: query must not be empty"
+
+        flags = 0 if case_sensitive else re.IGNORECASE
+        try:
+            pattern = re.compile(query if regex else re.escape(query), flags)
+        except re.error as e:
+            return f"Error: invalid regular expression: {e}"
+
+        context = max(0, min(int(context or 0), SEARCH_MAX_CONTEXT))
+        max_results = min(int(max_results or SEARCH_MAX_RESULTS), SEARCH_MAX_RESULTS)
+        include = [include] if isinstance(include, str) else list(include or [])
+        prefix = os.path.relpath(full_path, working_directory).replace(os.sep, "/")
+        prefix = "" if prefix == "." else prefix + "/"
+
+        # Narrow the files down with the index
+        index = search_index.get_index(working_directory)
+        with tracing.span("search_files.refresh"):
+            index.refresh()
+        required = set()
+        for literal in search_index.required_literals(query, regex):
+            required |= search_index.trigrams(literal)
+
+        lines = []
+        hits = 0
+        files_scanned = 0
+        candidates = index.candidates(required)
+        tracing.annotate(candidates=len(candidates), indexed_files=len(index.files))
+        for relative_path in candidates:
+            if not relative_path.startswith(prefix):
+                continue
+            if include and not any(
+                fnmatch.fnmatch(relative_path, p) or fnmatch.fnmatch(os.path.basename(relative_path), p)
+                for p in include
+            ):
+                continue
+
+            text = search_index.read_text(os.path.join(working_directory, relative_path))
+            if text is None:
+                continue
+            files_scanned += 1
+
+            file_lines = text.splitlines()
+            for number, line in enumerate(file_lines, start=1):
+                if not pattern.search(line):
+                    continue
+                if hits == max_results:
+                    lines.append(f"[Results truncated at {max_results} hits]")
+                    return "\n".join(lines)
+                hits += 1
+
+                # Add the hit with its context lines
+                first = max(number - context, 1)
+                last = min(number + context, len(file_lines))
+                for context_number in range(first, last + 1):
+                    separator = ":" if context_number == number else "-"
+                    context_line = file_lines[context_number - 1][:SEARCH_LINE_CHARS]
+                    lines.append(f"{relative_path}{separator}{context_number}{separator} {context_line}")
+                if context:
+                    lines.append("--")
+
+        if not hits:
+            return f'No matches found for "{query}" ({files_scanned} files scanned)'
+        return "\n".join(lines)
+
+    except Exception as e:
+        # Catch any other unexpected errors
+        return f"Error: {e}"
+
+
+# Define the function schema for AI integration
+def schema_search_files():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="search_files",
+        description="Searches the text files in the working directory for a literal string or regular expression and returns file:line hits, using an index so it is much cheaper than reading files one by one.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "query": types.Schema(
+                    type=types.Type.STRING,
+                    description="The text to search for, or a Python regular expression if regex is true.",
+                ),
+                "regex": types.Schema(
+                    type=types.Type.BOOLEAN,
+                    description="Treat query as a regular expression. Defaults to false.",
+                ),
+                "case_sensitive": types.Schema(
+                    type=types.Type.BOOLEAN,
+                    description="Match case. Defaults to true.",
+                ),
+                "directory": types.Schema(
+                    type=types.Type.STRING,
+                    description="Only search below this directory, relative to the working directory.",
+                ),
+                "include": types.Schema(
+                    type=types.Type.ARRAY,
+                    items=types.Schema(type=types.Type.STRING),
+                    description="Glob patterns (e.g. '*.py'); only matching files are searched.",
+                ),
+                "context": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Number of lines to show before and after each hit.",
+                ),
+                "max_results": types.Schema(
+                    type=types.Type.INTEGER,
+                    description="Maximum number of hits to return.",
+                ),
+            },
+            required=["query"],
+        ),
+    )
@@ -1,5 +1,6 @@
 import os
-from google.genai import types
+
+import tracing
 
 def write_file(working_directory, file_path, content):
     """
@@ -27,8 +28,9 @@ def write_file(working_directory, file_path, content):
         os.makedirs(parent_dir, exist_ok=True)
 
         # Write content to the file (overwriting if it exists)
-        with open(full_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        with tracing.span("write_file.write", chars=len(content)):
+            with open(full_path, "w", encoding="utf-8") as f:
+                f.write(content)
 
         return f'Successfully wrote to "{file_path}" ({len(content)} characters written)'
 
@@ -38,20 +40,23 @@ def write_file(working_directory, file_path, content):
     
 
 # Define the function schema for AI integration
-schema_write_file = types.FunctionDeclaration(
-    name="write_file",
-    description="Writes content to a file safely within a permitted working directory.",
-    parameters=types.Schema(
-        type=types.Type.OBJECT,
-        properties={
-            "file_path": types.Schema(
-                type=types.Type.STRING,
-                description="The path to the file to write, relative to the working directory.",
-            ),
-            "content": types.Schema(
-                type=types.Type.STRING,
-                description="The text content to write into the file.",
-            ),
-        },
-    ),
-)
\ No newline at end of file
+def schema_write_file():
+    from google.genai import types
+
+    return types.FunctionDeclaration(
+        name="write_file",
+        description="Writes content to a file safely within a permitted working directory.",
+        parameters=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "file_path": types.Schema(
+                    type=types.Type.STRING,
+                    description="The path to the file to write, relative to the working directory.",
+                ),
+                "content": types.Schema(
+                    type=types.Type.STRING,
+                    description="The text content to write into the file.",
+                ),
+            },
+        ),
+    )
@@ -0,0 +1,228 @@
+import importlib
+import json
+import os
+import queue
+import runpy
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+from config import *
+
+
+# The agent's own directory, scripts must not be able to import its modules
+AGENT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def available():
+    """
+    Returns whether warm interpreters are supported on this platform (needs os.fork).
+    """
+    return hasattr(os, "fork")
+
+
+class WarmWorker:
+    """
+    A pre-started interpreter that has already imported RUN_PYTHON_PRELOAD_MODULES.
+
+    For every run it forks a child, so runs are isolated from each other and from
+    the worker, but skip interpreter startup and the preloaded imports.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, request):
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("warm interpreter exited unexpectedly")
+        return json.loads(line)
+
+    def close(self):
+        if self.alive():
+            self.process.stdin.close()
+            self.process.wait()
+
+
+def get_pool():
+    """
+    Returns the queue of idle workers, starting RUN_PYTHON_POOL_SIZE of them on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = queue.Queue()
+            for _ in range(RUN_PYTHON_POOL_SIZE):
+                _pool.put(WarmWorker())
+    return _pool
+
+
+def run_script(full_path, args, cwd, timeout, stdout_path, stderr_path):
+    """
+    Runs a Python file in a child forked from a warm interpreter.
+
+    Waits for an idle worker if all of them are busy.
+
+    Parameters:
+        full_path (str): Absolute path of the script.
+        args (list[str]): Command-line arguments for the script.
+        cwd (str): Working directory for the run.
+        timeout (float): Seconds before the run is killed.
+        stdout_path (str): File that receives the script's STDOUT.
+        stderr_path (str): File that receives the script's STDERR.
+
+    Returns:
+        tuple[int, str | None]: The exit code of the script, and the reason it was
+        killed (timeout or too much output), None if it exited by itself.
+    """
+    pool = get_pool()
+    worker = pool.get()
+    try:
+        if not worker.alive():
+            worker = WarmWorker()
+        response = worker.run({
+            "path": full_path,
+            "args": list(args),
+            "cwd": cwd,
+            "timeout": timeout,
+            "stdout": stdout_path,
+            "stderr": stderr_path,
+            "kill_after_bytes": RUN_PYTHON_KILL_AFTER_BYTES,
+        })
+    except Exception:
+        worker.close()
+        worker = WarmWorker()
+        raise
+    finally:
+        pool.put(worker)
+
+    return response["exit_code"], response["killed_reason"]
+
+
+def _run_child(request):
+    # Send the script's output to the capture files, stdin is empty like in capture_output runs
+    null_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null_fd, 0)
+    os.close(null_fd)
+    for fd, path in ((1, request["stdout"]), (2, request["stderr"])):
+        capture_fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(capture_fd, fd)
+        os.close(capture_fd)
+
+    # Forget the agent's own modules and match what "python <file> [args...]" would see
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, "__file__", None) or ""
+        if module_file.startswith(AGENT_ROOT + os.sep):
+            del sys.modules[name]
+    os.chdir(request["cwd"])
+    sys.argv = [request["path"]] + request["args"]
+    sys.path[:] = [os.path.dirname(request["path"])] + [
+        path for path in sys.path if path not in ("", AGENT_ROOT)
+    ]
+
+    exit_code = 0
+    try:
+        runpy.run_path(request["path"], run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        # Hide the pool's own frames, like a traceback from "python <file>"
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != request["path"]:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        exit_code = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(exit_code)
+
+
+def _wait_child(pid, request):
+    """
+    Waits for a forked child, killing it after the timeout or once its output got too big.
+
+    Returns:
+        tuple[int, str | None]: The exit code, and the reason the child was killed.
+    """
+    deadline = time.monotonic() + request["timeout"]
+    pidfd = os.pidfd_open(pid) if hasattr(os, "pidfd_open") else None
+    killed_reason = None
+    try:
+        while True:
+            done_pid, status = os.waitpid(pid, os.WNOHANG)
+            if done_pid:
+                return os.waitstatus_to_exitcode(status), None
+
+            output_size = 0
+            for path in (request["stdout"], request["stderr"]):
+                try:
+                    output_size += os.path.getsize(path)
+                except OSError:
+                    pass
+            remaining = deadline - time.monotonic()
+            if output_size > request["kill_after_bytes"]:
+                killed_reason = f"output exceeded {request['kill_after_bytes']} bytes"
+            elif remaining <= 0:
+                killed_reason = f"timed out after {request['timeout']} seconds"
+            if killed_reason:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                return -signal.SIGKILL, killed_reason
+
+            # Wake up on exit, or every 50ms to check the output size
+            if pidfd is not None:
+                select.select([pidfd], [], [], min(remaining, 0.05))
+            else:
+                time.sleep(min(remaining, 0.005))
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def worker_main():
+    """
+    Entry point of a warm worker: preload modules, then fork one child per request line.
+    """
+    for name in RUN_PYTHON_PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        pid = os.fork()
+        if pid == 0:
+            _run_child(request)
+        exit_code, killed_reason = _wait_child(pid, request)
+        sys.stdout.write(json.dumps({"exit_code": exit_code, "killed_reason": killed_reason}) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--worker"]:
+    worker_main()
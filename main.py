@@ -1,152 +1,246 @@
+import atexit
 import os
 import sys
 
-from dotenv import load_dotenv
-from google import genai
-from google.genai import Client, types
 from config import *
 
-# Import the function schema
-from functions.get_files_info import schema_get_files_info
-from functions.get_file_content import schema_get_file_content
-from functions.run_python_file import schema_run_python_file
-from functions.write_file import schema_write_file
-
-#Import helper function to call functions
-from call_function import call_function
-
-# Load environment variables from file
-load_dotenv("gemini.env")
-
-# Get the API key
-api_key = os.environ.get("GEMINI_API_KEY")
-if not api_key:
-    print("❌ Error: GEMINI_API_KEY not found in environment.")
-    sys.exit(1)
-
-# Initialize the Gemini client
-client = genai.Client(api_key=api_key)
+#Import the agent loop
+from agent import run_agent
+
+#Import batch mode
+from batch import run_batch
+
+#Import span tracing
+import tracing
+
+
+USAGE = """Usage: python main.py [options] "<prompt>"
+
+Options:
+  --verbose              Print token usage, tool calls and their results
+  --async                Stream responses and run tools while the model generates
+  --prefetch             Read small listed files in the background before the model asks for them
+  --batch FILE           Run the prompts of a JSONL file concurrently
+  --output FILE          Where --batch writes its NDJSON results (default: stdout)
+  --concurrency N        Sessions running at the same time in --batch and --serve mode
+  --rpm N                Model requests per minute across all --batch or --serve sessions
+  --serve                Serve sessions over HTTP from one warm process (POST /sessions)
+  --listen ADDRESS       Where --serve listens, "host:port" or "unix:/path" (default: 127.0.0.1:8765)
+  --root DIRS            Directories sessions may work in, separated by os.pathsep
+  --record FILE          Save the model responses of the run to FILE
+  --replay FILE          Serve model responses from a recording instead of the API
+  --session NAME         Checkpoint every iteration as NAME so the session can be resumed
+  --resume NAME          Continue a checkpointed session from its last iteration
+  --max-iterations N     Total model turns of the session, including resumed ones
+  --trace-jsonl FILE     Write tracing spans as JSON lines
+  --trace-chrome FILE    Write tracing spans in Chrome trace format
+  -h, --help             Show this message"""
+
+
+def create_client():
+    """
+    Builds the Gemini client from GEMINI_API_KEY (loaded from gemini.env if present),
+    behind a TransportClient that retries transient errors. GEMINI_BASE_URL points
+    it at another server, e.g. a local stand-in.
+
+    google.genai is imported here rather than at module level, it is by far the
+    slowest import and not needed for --help or argument errors.
+    """
+    from dotenv import load_dotenv
+    from google import genai
+    from transport import TransportClient, http_options
+
+    # Load environment variables from file
+    load_dotenv("gemini.env")
+
+    # Get the API key
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        print("❌ Error: GEMINI_API_KEY not found in environment.")
+        sys.exit(1)
 
+    # Initialize the Gemini client on a pool of keep-alive connections
+    client = genai.Client(api_key=api_key, http_options=http_options(os.environ.get("GEMINI_BASE_URL")))
+    return TransportClient(client)
 
 
 def main(argv):
+    # Handle --help flag
+    if "--help" in argv or "-h" in argv:
+        print(USAGE)
+        return
+
     # Handle --verbose flag
     verbose = "--verbose" in argv
     argv = [arg for arg in argv if arg != "--verbose"]
 
-    # If no arguments, print a message and exit with code 1
-    if argv == []:
+    # Handle --async flag (streamed responses on the async client)
+    use_async = "--async" in argv
+    argv = [arg for arg in argv if arg != "--async"]
+
+    # Handle --prefetch flag (background reads of listed files)
+    if "--prefetch" in argv:
+        import call_function
+        call_function.prefetcher.enabled = True
+    argv = [arg for arg in argv if arg != "--prefetch"]
+
+    # Handle --batch mode options
+    batch_path, argv = pop_option(argv, "--batch")
+    output_path, argv = pop_option(argv, "--output", "-")
+    concurrency, argv = pop_option(argv, "--concurrency", BATCH_CONCURRENCY)
+    requests_per_minute, argv = pop_option(argv, "--rpm", BATCH_REQUESTS_PER_MINUTE)
+
+    # Handle server mode options
+    serve = "--serve" in argv
+    argv = [arg for arg in argv if arg != "--serve"]
+    listen_address, argv = pop_option(argv, "--listen", SERVER_ADDRESS)
+    roots, argv = pop_option(argv, "--root")
+
+    # Handle model backend options: record responses to a file, or replay them offline
+    record_path, argv = pop_option(argv, "--record")
+    replay_path, argv = pop_option(argv, "--replay")
+
+    # Handle tracing options: spans as JSON lines and/or a Chrome trace
+    trace_jsonl_path, argv = pop_option(argv, "--trace-jsonl")
+    trace_chrome_path, argv = pop_option(argv, "--trace-chrome")
+    if trace_jsonl_path or trace_chrome_path:
+        tracing.enable(trace_jsonl_path, trace_chrome_path)
+        # Write the trace however the run ends
+        atexit.register(tracing.export)
+
+    # Handle session options: with --session or --resume every iteration is checkpointed
+    session_id, argv = pop_option(argv, "--session")
+    resume_id, argv = pop_option(argv, "--resume")
+    max_iterations, argv = pop_option(argv, "--max-iterations")
+
+    if use_async and (record_path or replay_path):
+        print("--record and --replay work with the synchronous loop only.")
+        sys.exit(1)
+
+    if (use_async or batch_path) and (session_id or resume_id or max_iterations):
+        print("--session, --resume and --max-iterations work with the synchronous loop only.")
+        sys.exit(1)
+
+    # Resuming takes the prompt from the checkpoint
+    if resume_id:
+        checkpoint = load_checkpoint(resume_id)
+        if checkpoint.final_response is not None:
+            print(f"Session {resume_id} is already finished.")
+            print("Final response:")
+            print(checkpoint.final_response)
+            return
+        argv = [checkpoint.user_prompt]
+
+    if serve and (batch_path or use_async or session_id or resume_id):
+        print("--serve can't be combined with --batch, --async, --session or --resume.")
+        sys.exit(1)
+
+    # If no prompt and no batch file, print a message and exit with code 1
+    if argv == [] and not batch_path and not serve:
         print("Please provide a prompt as a command-line argument.")
         sys.exit(1)
 
+    # Build the client only once the arguments are known to be valid
+    transport = None
+    if replay_path:
+        from model_backend import ReplayClient
+        client = ReplayClient(replay_path)
+    else:
+        client = transport = create_client()
+        if record_path:
+            from model_backend import RecordingClient
+            client = RecordingClient(client, record_path)
+
+    if serve:
+        from server import AgentServer
+
+        server = AgentServer(
+            client,
+            listen_address,
+            allowed_roots=roots.split(os.pathsep) if roots else SERVER_ALLOWED_ROOTS,
+            max_sessions=int(concurrency),
+            requests_per_minute=float(requests_per_minute),
+        )
+        print(f"Serving agent sessions on {listen_address}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if batch_path:
+        run_batch(
+            client,
+            batch_path,
+            output_path,
+            concurrency=int(concurrency),
+            requests_per_minute=float(requests_per_minute),
+            verbose=verbose,
+        )
+        return
+
     # Combine arguments into a single prompt
     user_prompt = " ".join(argv)
 
-    #intialize token counters
-    prompt_tokens = 0
-    response_tokens = 0
+    if use_async:
+        # The streaming loop pulls in asyncio, only import it for --async
+        import asyncio
+        from async_agent import run_agent_async
 
+        asyncio.run(run_agent_async(client, user_prompt, verbose=verbose))
+        return
 
-    # Define the available functions for the AI to use
-    available_functions = types.Tool(
-    function_declarations=[
-        schema_get_files_info,
-        schema_get_file_content,
-        schema_run_python_file,
-        schema_write_file,
-    ]
+    if resume_id:
+        working_directory = checkpoint.working_directory
+        # Without a limit, a resumed session gets a fresh allowance of iterations
+        max_iterations = int(max_iterations) if max_iterations else checkpoint.iterations + MAX_ITERATIONS
+    else:
+        working_directory = WORKING_DIRECTORY
+        max_iterations = int(max_iterations) if max_iterations else MAX_ITERATIONS
+        checkpoint = None
+        if session_id:
+            from checkpoint import SessionCheckpoint
+
+            checkpoint = SessionCheckpoint.create(session_id, user_prompt, working_directory)
+
+    result = run_agent(
+        client,
+        user_prompt,
+        verbose=verbose,
+        working_directory=working_directory,
+        max_iterations=max_iterations,
+        checkpoint=checkpoint,
     )
+    if verbose and transport:
+        print(f"Model transport: {transport.stats()}")
+    if result["error"] and checkpoint:
+        print(f"Session saved after {checkpoint.iterations} iteration(s), continue it with --resume {checkpoint.session_id}")
 
-    # Intialize the conversation messages list
-    messages = [
-    types.Content(role="user", parts=[types.Part(text=user_prompt)]),
-    ]
 
-    MAX_ITERATIONS = 20
+def load_checkpoint(session_id):
+    from checkpoint import SessionCheckpoint
 
-    for iteration in range(MAX_ITERATIONS):
-        try:
-            #Call the model to generate content
-            response = client.models.generate_content(
-            model = model_name,
-            contents = messages,
-            config=types.GenerateContentConfig(
-                tools=[available_functions],
-                system_instruction=system_prompt
-                )
-            )
-
-            # Get token usage (if available)
-            usage = getattr(response, "usage_metadata", None)
-            if usage:
-                pt = getattr(usage, "prompt_token_count", 0) or 0
-                ct = getattr(usage, "candidates_token_count", 0) or 0
-                prompt_tokens += pt
-                response_tokens += ct
-
-            # If verbose, print debug information
-            if verbose:
-                print(f"User prompt: {user_prompt}")
-                print(f"Prompt tokens: {prompt_tokens}")
-                print(f"Response tokens: {response_tokens}")
-
-            # Add each candidate’s content to the conversation
-            if hasattr(response, "candidates"):
-                for candidate in response.candidates:
-                    if hasattr(candidate, "content") and candidate.content:
-                        messages.append(candidate.content)  # Add model’s reply
-
-                        # Check for function calls inside this candidate
-                        for part in candidate.content.parts:
-                            if hasattr(part, "function_call") and part.function_call:
-                                # Call the actual Python function
-                                function_call_result = call_function(part.function_call, verbose=verbose)
-
-                                # Validate result structure
-                                try:
-                                    response_data = function_call_result.parts[0].function_response.response
-                                except (AttributeError, IndexError) as e:
-                                    raise RuntimeError(
-                                        f"❌ Fatal: call_function() did not return a valid response structure: {e}"
-                                    )
-
-                                # Print function call result if verbose
-                                if verbose:
-                                    print(f"-> {response_data}")
-
-                                # Convert the function response into a user message
-                                function_response_message = types.Content(
-                                    role="user",
-                                    parts=function_call_result.parts,
-                                )
-
-                                # Add it to the ongoing conversation
-                                messages.append(function_response_message)
-
-            done_texts = []
-            for cand in getattr(response, "candidates", []):
-                content = getattr(cand, "content", None)
-                if not content: continue
-                has_call = any(getattr(p, "function_call", None) for p in content.parts)
-                if not has_call:
-                    for p in content.parts:
-                        if getattr(p, "text", None):
-                            done_texts.append(p.text)
-            if done_texts:
-                print("Final response:")
-                print("\n".join(done_texts))
-                break
-
-        except Exception as e:
-            print(f"❌ Error during iteration {iteration + 1}: {e}")
-            break
-    else:
-        print("⚠️ Max iterations reached without final response.")
+    try:
+        return SessionCheckpoint.load(session_id)
+    except (OSError, ValueError) as e:
+        print(f"Cannot resume session {session_id}: {e}")
+        sys.exit(1)
 
 
-    # If the model didn’t call a function, print fallback text
-    if not hasattr(response, "candidates") or not response.candidates:
-        print(getattr(response, "text", None) or "⚠️ No text content found in response.")
+def pop_option(argv, name, default=None):
+    """
+    Removes "name value" from argv.
+
+    Returns:
+        tuple: The value (or default if the option is missing) and the remaining arguments.
+    """
+    if name not in argv:
+        return default, argv
+    index = argv.index(name)
+    if index + 1 >= len(argv):
+        print(f"Missing value for {name}.")
+        sys.exit(1)
+    return argv[index + 1], argv[:index] + argv[index + 2:]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import http.server
+import json
+import threading
+import time
+
+from google.genai import types
+
+
+def request_hash(model, contents):
+    """
+    Returns a stable hash of a generate_content request (model and conversation).
+
+    Only what decides the model's next step is hashed: the text, the function
+    calls and the names of the functions that answered. Tool outputs are left
+    out, they carry timings and other details that differ between runs (e.g.
+    "Ran 17 tests in 0.004s"), so a recorded session replays after them.
+    """
+    payload = {
+        "model": model,
+        "contents": [_content_key(content) for content in contents],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _content_key(content):
+    if not hasattr(content, "model_dump"):
+        return content
+    parts = []
+    for part in content.parts or []:
+        if part.function_response is not None:
+            parts.append({"function_response": part.function_response.name})
+        elif part.function_call is not None:
+            parts.append({"function_call": part.function_call.model_dump(mode="json", exclude_none=True)})
+        else:
+            parts.append({"text": part.text})
+    return {"role": content.role, "parts": parts}
+
+
+class RecordingClient:
+    """
+    Wraps a genai.Client and appends every generate_content exchange to a JSONL file.
+
+    Each line holds the request hash and the full response, which ReplayClient
+    serves back later without network access.
+    """
+
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+        self.models = self
+        self.lock = threading.Lock()
+        # Start a fresh recording
+        open(path, "w").close()
+
+    def generate_content(self, model, contents, config=None):
+        response = self.client.models.generate_content(model=model, contents=contents, config=config)
+        record = {
+            "request_hash": request_hash(model, contents),
+            "messages": len(contents),
+            "response": response.model_dump(mode="json", exclude_none=True),
+        }
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        return response
+
+
+class ReplayMismatchError(Exception):
+    pass
+
+
+class ReplayClient:
+    """
+    Serves recorded generate_content responses in order.
+
+    With strict=True a request that differs from the recorded one (e.g. because
+    the prompt changed or the model's calls no longer line up) raises
+    ReplayMismatchError instead of silently diverging.
+    """
+
+    def __init__(self, path, strict=True):
+        with open(path, encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+        self.strict = strict
+        self.position = 0
+        self.models = self
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            if self.position >= len(self.records):
+                raise ReplayMismatchError(f"recording has only {len(self.records)} responses")
+            record = self.records[self.position]
+            self.position += 1
+
+        if self.strict and record["request_hash"] != request_hash(model, contents):
+            raise ReplayMismatchError(
+                f"request {self.position} differs from the recording "
+                f"({len(contents)} messages, recorded {record['messages']})"
+            )
+        return types.GenerateContentResponse.model_validate(record["response"])
+
+
+class ScriptedClient:
+    """
+    Fake client answering from a script, for tests and offline benchmarks.
+
+    script is either a list of responses served in order, or a function that
+    receives the conversation and returns the response. The same script also
+    backs client.aio.models.generate_content_stream, which yields one chunk per part.
+    """
+
+    def __init__(self, script, chunk_delay=0.0):
+        self.script = script if callable(script) else list(script)
+        self.chunk_delay = chunk_delay
+        self.requests = []
+        self.models = self
+        self.aio = _AsyncScriptedModels(self)
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            self.requests.append(list(contents))
+            if callable(self.script):
+                return self.script(contents)
+            return self.script.pop(0)
+
+
+class _AsyncScriptedModels:
+    def __init__(self, client):
+        self.models = self
+        self.client = client
+
+    async def generate_content_stream(self, model, contents, config=None):
+        response = self.client.generate_content(model=model, contents=contents, config=config)
+        chunk_delay = self.client.chunk_delay
+
+        async def stream():
+            for candidate in response.candidates or []:
+                for part in candidate.content.parts or []:
+                    await asyncio.sleep(chunk_delay)
+                    yield types.GenerateContentResponse(
+                        candidates=[types.Candidate(content=types.Content(role="model", parts=[part]))]
+                    )
+            if response.usage_metadata:
+                yield types.GenerateContentResponse(usage_metadata=response.usage_metadata)
+
+        return stream()
+
+
+class FakeGeminiServer:
+    """
+    Local HTTP stand-in for the Gemini API that can inject delays and errors.
+
+    Requests are answered from steps, in order of arrival. A step is a response
+    (see text_response), or a dict with an optional "delay" in seconds, and
+    either a "response" or an error "status" with an optional "retry_after"
+    header value. Connections are kept alive like the real API, the addresses
+    of the connections seen are collected in connections.
+
+    Used as a context manager, base_url is the URL to give genai.Client.
+    """
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.requests = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps the connection open between requests
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handle(self, handler):
+        handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+        with self.lock:
+            self.requests += 1
+            self.connections.add(handler.client_address)
+            step = self.steps.pop(0) if self.steps else {"status": 500}
+        if not isinstance(step, dict):
+            step = {"response": step}
+
+        time.sleep(step.get("delay", 0))
+        status = step.get("status", 200)
+        if status == 200:
+            # The API speaks camelCase, which the pydantic aliases produce
+            body = step["response"].model_dump(mode="json", by_alias=True, exclude_none=True)
+        else:
+            body = {"error": {"code": status, "message": "Injected error", "status": "UNAVAILABLE"}}
+        data = json.dumps(body).encode("utf-8")
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        if "retry_after" in step:
+            handler.send_header("Retry-After", str(step["retry_after"]))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+def text_response(text, prompt_tokens=0, response_tokens=0):
+    """
+    Builds a model response with a final text answer.
+    """
+    return _response([types.Part(text=text)], prompt_tokens, response_tokens)
+
+
+def function_call_response(*calls, prompt_tokens=0, response_tokens=0):
+    """
+    Builds a model response calling functions, each call given as (name, args).
+    """
+    parts = [types.Part(function_call=types.FunctionCall(name=name, args=args)) for name, args in calls]
+    return _response(parts, prompt_tokens, response_tokens)
+
+
+def _response(parts, prompt_tokens, response_tokens):
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=parts))],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=response_tokens,
+        ),
+    )
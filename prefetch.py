@@ -0,0 +1,178 @@
+import concurrent.futures
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import tracing
+from config import *
+
+# A file line of a get_files_info listing: "- pkg/render.py: file_size=1911 bytes, is_dir=False"
+LISTING_FILE = re.compile(r"^- (.+): file_size=(\d+) bytes, is_dir=False$", re.MULTILINE)
+
+
+class Prefetcher:
+    """
+    Reads the small files of the latest directory listing in the background.
+
+    After get_files_info, the model usually asks for some of the listed files
+    next. schedule() reads them with the real get_file_content while the model
+    is generating, and lookup() serves a later whole-file read of the same path
+    if its mtime and size haven't changed since. A newer listing cancels the
+    loads still pending for the previous listing of the same working directory,
+    sessions in other working directories keep theirs.
+    """
+
+    def __init__(
+        self,
+        read_file,
+        enabled=PREFETCH_FILES,
+        max_file_bytes=PREFETCH_MAX_FILE_BYTES,
+        max_files=PREFETCH_MAX_FILES,
+        max_bytes=PREFETCH_MAX_BYTES,
+        workers=PREFETCH_WORKERS,
+    ):
+        self.read_file = read_file
+        self.enabled = enabled
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.workers = workers
+
+        # path -> (result, (mtime_ns, size), used)
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        # working directory -> futures of its latest listing
+        self.pending = {}
+        self.pool = None
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.unused = 0
+        self.lock = threading.Lock()
+
+    def schedule(self, args, listing):
+        """
+        Starts loading the small files of a get_files_info result.
+
+        Parameters:
+            args (dict): The arguments of the get_files_info call, including working_directory.
+            listing (str): Its result.
+        """
+        if not self.enabled or listing.startswith("Error"):
+            return
+        working_directory = os.path.abspath(args["working_directory"])
+        directory = os.path.join(working_directory, args.get("directory") or ".")
+
+        file_paths = []
+        for match in LISTING_FILE.finditer(listing):
+            if int(match.group(2)) > self.max_file_bytes:
+                continue
+            full_path = os.path.abspath(os.path.join(directory, match.group(1)))
+            with self.lock:
+                if full_path in self.entries:
+                    continue
+            file_paths.append(os.path.relpath(full_path, working_directory))
+            if len(file_paths) >= self.max_files:
+                break
+
+        with self.lock:
+            # Only the latest listing of a working directory is worth prefetching for
+            for future in self.pending.pop(working_directory, []):
+                future.cancel()
+            if self.pool is None:
+                self.pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="prefetch")
+            # Forget finished listings, so directories of past sessions don't pile up
+            self.pending = {key: futures for key, futures in self.pending.items() if not all(f.done() for f in futures)}
+            self.pending[working_directory] = [
+                self.pool.submit(self._load, working_directory, file_path) for file_path in file_paths
+            ]
+        tracing.annotate(prefetch_scheduled=len(file_paths))
+
+    def _load(self, working_directory, file_path):
+        full_path = os.path.abspath(os.path.join(working_directory, file_path))
+        try:
+            # Stat before reading: a change during the read makes the entry stale, never wrong
+            stat = os.stat(full_path)
+        except OSError:
+            return
+        result = self.read_file(working_directory=working_directory, file_path=file_path)
+        if result.startswith("Error"):
+            return
+
+        size = len(result)
+        with self.lock:
+            if full_path in self.entries:
+                return
+            self.entries[full_path] = (result, (stat.st_mtime_ns, stat.st_size), False)
+            self.total_bytes += size
+            self.prefetched += 1
+            # Evict least recently used entries until the budgets are met
+            while self.total_bytes > self.max_bytes or len(self.entries) > self.max_files:
+                _, (evicted, _, used) = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+                self.unused += not used
+
+    def lookup(self, args):
+        """
+        Returns the prefetched result of a get_file_content call, or None.
+
+        Only reads of a whole file (no offset, length or line window) are served.
+        """
+        if not self.enabled:
+            return None
+        if any(args.get(name) is not None for name in ("offset", "length", "start_line", "end_line")):
+            return None
+        full_path = os.path.abspath(os.path.join(args["working_directory"], args.get("file_path", "")))
+
+        with self.lock:
+            entry = self.entries.get(full_path)
+        if entry is not None:
+            try:
+                stat = os.stat(full_path)
+                fresh = (stat.st_mtime_ns, stat.st_size) == entry[1]
+            except OSError:
+                fresh = False
+            with self.lock:
+                if fresh and full_path in self.entries:
+                    self.entries[full_path] = (entry[0], entry[1], True)
+                    self.entries.move_to_end(full_path)
+                    self.hits += 1
+                    tracing.annotate(prefetch="hit")
+                    return entry[0]
+                if full_path in self.entries:
+                    self._drop(full_path)
+
+        with self.lock:
+            self.misses += 1
+        tracing.annotate(prefetch="miss")
+        return None
+
+    def invalidate(self, path):
+        """
+        Drops the entry of a file written through the agent.
+        """
+        with self.lock:
+            if os.path.abspath(path) in self.entries:
+                self._drop(os.path.abspath(path))
+
+    def _drop(self, full_path):
+        result, _, used = self.entries.pop(full_path)
+        self.total_bytes -= len(result)
+        self.unused += not used
+
+    def stats(self):
+        """
+        Returns the hit counters, the files loaded and those dropped without being read.
+        """
+        with self.lock:
+            reads = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / reads, 3) if reads else None,
+                "prefetched": self.prefetched,
+                "unused": self.unused,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+            }
@@ -0,0 +1,336 @@
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+
+from config import *
+from functions.get_files_info import load_ignore_patterns, is_ignored
+
+
+INDEX_VERSION = 2
+
+# Characters that end a literal run in a regex
+REGEX_SPECIAL = set(".^$*+?{}[]()|\\")
+# Characters following \x, \u and \U in a regex
+ESCAPE_PAYLOAD_LENGTHS = {"x": 2, "u": 4, "U": 8}
+
+
+WORD_RUN = re.compile(r"\w{3,}")
+
+
+def trigrams(text):
+    """
+    Returns the set of lowercase 3-character substrings of the word runs in text.
+
+    Only trigrams inside runs of word characters are kept: a query's word runs
+    are substrings of the file's word runs, so filtering stays exact, and
+    repeated identifiers are only split once.
+    """
+    words = set(WORD_RUN.findall(text.lower()))
+    return {word[i : i + 3] for word in words for i in range(len(word) - 2)}
+
+
+class SearchIndex:
+    """
+    Trigram inverted index over the text files of a working directory.
+
+    Every file maps to the set of trigrams in its content and whether it is a
+    searchable text file, and every trigram maps to the files containing it. A query only has to scan the files that contain
+    all trigrams of its literal parts. The index is saved to disk and refreshed
+    incrementally: only files whose mtime or size changed are read again.
+    """
+
+    def __init__(self, working_directory, index_path):
+        self.working_directory = os.path.abspath(working_directory)
+        self.index_path = index_path
+        self.files = {}
+        self.postings = {}
+        self.last_refresh = 0.0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return
+        if data.get("version") != INDEX_VERSION or data.get("working_directory") != self.working_directory:
+            return
+        self.files = data["files"]
+        for relative_path, (_, _, file_trigrams, _) in self.files.items():
+            self._add_postings(relative_path, file_trigrams)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(
+                {"version": INDEX_VERSION, "working_directory": self.working_directory, "files": self.files},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(temp_path, self.index_path)
+
+    def _add_postings(self, relative_path, file_trigrams):
+        for trigram in file_trigrams:
+            self.postings.setdefault(trigram, set()).add(relative_path)
+
+    def _remove(self, relative_path):
+        entry = self.files.pop(relative_path, None)
+        if entry is None:
+            return
+        for trigram in entry[2]:
+            paths = self.postings.get(trigram)
+            if paths is not None:
+                paths.discard(relative_path)
+                if not paths:
+                    del self.postings[trigram]
+
+    def _index_file(self, relative_path, stat):
+        self._remove(relative_path)
+        file_trigrams = frozenset()
+        # Binary and oversize files are never scanned, text without any trigram still is
+        searchable = False
+        if stat.st_size <= SEARCH_MAX_FILE_BYTES:
+            text = read_text(os.path.join(self.working_directory, relative_path))
+            if text is not None:
+                file_trigrams = frozenset(trigrams(text))
+                searchable = True
+        self.files[relative_path] = (stat.st_mtime_ns, stat.st_size, file_trigrams, searchable)
+        self._add_postings(relative_path, file_trigrams)
+
+    def refresh(self, force=False):
+        """
+        Re-indexes files whose mtime or size changed and drops deleted files.
+
+        Walks are skipped if the last one was less than SEARCH_REFRESH_INTERVAL
+        seconds ago; writes through the agent are applied by update_file() instead.
+        """
+        with self.lock:
+            if not force and time.monotonic() - self.last_refresh < SEARCH_REFRESH_INTERVAL:
+                return
+            ignore_patterns = load_ignore_patterns(self.working_directory)
+            seen = set()
+            changed = False
+            stack = [self.working_directory]
+            while stack:
+                directory = stack.pop()
+                try:
+                    with os.scandir(directory) as it:
+                        entries = list(it)
+                except OSError:
+                    continue
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        relative_path = os.path.relpath(entry.path, self.working_directory).replace(os.sep, "/")
+                        if is_ignored(relative_path, entry.name, is_dir, ignore_patterns):
+                            continue
+                        if is_dir:
+                            stack.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    seen.add(relative_path)
+                    known = self.files.get(relative_path)
+                    if known is None or known[0] != stat.st_mtime_ns or known[1] != stat.st_size:
+                        self._index_file(relative_path, stat)
+                        changed = True
+
+            for relative_path in list(self.files):
+                if relative_path not in seen:
+                    self._remove(relative_path)
+                    changed = True
+
+            self.last_refresh = time.monotonic()
+            if changed or self.dirty:
+                self.save()
+                self.dirty = False
+
+    def update_file(self, relative_path):
+        """
+        Re-indexes one file right after it was written.
+        """
+        relative_path = os.path.normpath(relative_path).replace(os.sep, "/")
+        with self.lock:
+            if is_ignored_path(relative_path, load_ignore_patterns(self.working_directory)):
+                # The walk skips it, so a search must not find it either
+                self._remove(relative_path)
+                return
+            try:
+                stat = os.stat(os.path.join(self.working_directory, relative_path))
+            except OSError:
+                self._remove(relative_path)
+            else:
+                self._index_file(relative_path, stat)
+            # Saved with the next refresh, a stale file on disk is fixed by its mtime anyway
+            self.dirty = True
+
+    def candidates(self, required_trigrams):
+        """
+        Returns the sorted paths of the files that contain all required trigrams.
+        """
+        with self.lock:
+            if not required_trigrams:
+                return sorted(path for path, entry in self.files.items() if entry[3])
+            # Intersect the smallest posting lists first
+            postings = sorted((self.postings.get(t, set()) for t in required_trigrams), key=len)
+            result = set(postings[0])
+            for paths in postings[1:]:
+                result &= paths
+                if not result:
+                    break
+            return sorted(result)
+
+
+def is_ignored_path(relative_path, ignore_patterns):
+    """
+    Checks a file path and every directory above it against the ignore rules.
+    """
+    parts = relative_path.split("/")
+    for end in range(1, len(parts) + 1):
+        if is_ignored("/".join(parts[:end]), parts[end - 1], end < len(parts), ignore_patterns):
+            return True
+    return False
+
+
+def read_text(path):
+    """
+    Reads a file as UTF-8 text, or returns None for binary or unreadable files.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def required_literals(pattern, is_regex):
+    """
+    Returns literal strings every match of the query must contain.
+
+    For regexes this is conservative: alternations give up entirely, groups,
+    classes and optional characters are skipped, so no real match is filtered out.
+    """
+    if not is_regex:
+        return [pattern]
+
+    literals = []
+    current = ""
+    i = 0
+    depth = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "|":
+            return []
+        if char == "\\" and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            i += 2
+            if depth == 0 and not escaped.isalnum():
+                current += escaped
+                continue
+            # Skip the payload of escapes that stand for another character (\x41, \N{name}, \1)
+            if escaped in ESCAPE_PAYLOAD_LENGTHS:
+                i += ESCAPE_PAYLOAD_LENGTHS[escaped]
+            elif escaped == "N" and pattern.startswith("{", i):
+                closing = pattern.find("}", i)
+                i = len(pattern) if closing == -1 else closing + 1
+            elif escaped.isdigit():
+                end = i
+                while end < len(pattern) and end < i + 2 and pattern[end].isdigit():
+                    end += 1
+                i = end
+            literals.append(current)
+            current = ""
+            continue
+        if char == "[":
+            # Skip the character class
+            literals.append(current)
+            current = ""
+            i += 1
+            if i < len(pattern) and pattern[i] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+            continue
+        if char == "{":
+            # Skip the repetition count, the previous character may occur zero times
+            literals.append(current[:-1])
+            current = ""
+            while i < len(pattern) and pattern[i] != "}":
+                i += 1
+            i += 1
+            continue
+        if char in "?*":
+            # The previous character is optional
+            current = current[:-1]
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(depth - 1, 0)
+        if char in REGEX_SPECIAL or depth > 0:
+            literals.append(current)
+            current = ""
+        else:
+            current += char
+        i += 1
+    literals.append(current)
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_path_for(working_directory):
+    index_dir = SEARCH_INDEX_DIR
+    if not os.path.isabs(index_dir):
+        index_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), index_dir)
+    digest = hashlib.sha1(os.path.abspath(working_directory).encode()).hexdigest()[:16]
+    return os.path.join(index_dir, f"search_index_{digest}.pickle")
+
+
+def get_index(working_directory):
+    """
+    Returns the index for a working directory, loading it from disk on first use.
+    """
+    working_directory = os.path.abspath(working_directory)
+    with _indexes_lock:
+        index = _indexes.get(working_directory)
+        if index is None:
+            index = SearchIndex(working_directory, index_path_for(working_directory))
+            index.load()
+            _indexes[working_directory] = index
+    return index
+
+
+def notify_write(working_directory, file_path):
+    """
+    Updates an already loaded index after a file was written through the agent.
+    """
+    index = _indexes.get(os.path.abspath(working_directory))
+    if index is not None:
+        index.update_file(file_path)
+
+
+def discard_index(working_directory):
+    """
+    Drops the index of a working directory from memory and disk (e.g. a temporary session copy).
+    """
+    working_directory = os.path.abspath(working_directory)
+    with _indexes_lock:
+        _indexes.pop(working_directory, None)
+    try:
+        os.remove(index_path_for(working_directory))
+    except OSError:
+        pass
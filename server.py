@@ -0,0 +1,297 @@
+import http.server
+import json
+import os
+import socketserver
+import stat
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import *
+
+#Import the agent loop and the tool declarations
+from agent import run_agent
+from call_function import get_available_functions, tool_cache, prefetcher
+
+#Import the shared model call limiter
+from batch import RateLimiter
+
+#Import span tracing and the store of spilled tool results
+import spill_store
+import tracing
+
+
+class FairScheduler:
+    """
+    Admits at most slots sessions at a time, round-robin over workspaces.
+
+    Sessions of the same workspace never run at the same time, so they can't
+    see each other's half-done edits. When a slot frees up it goes to the
+    workspace that was served longest ago, a client queueing many sessions on
+    one workspace can't starve the others.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.running = set()
+        # workspace -> waiting sessions, in the order the workspaces will be served
+        self.queues = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, key):
+        ticket = threading.Event()
+        with self.lock:
+            self.queues.setdefault(key, deque()).append(ticket)
+            self._dispatch()
+        ticket.wait()
+
+    def release(self, key):
+        with self.lock:
+            self.running.discard(key)
+            self._dispatch()
+
+    def _dispatch(self):
+        for key in list(self.queues):
+            if len(self.running) >= self.slots:
+                return
+            if key in self.running:
+                continue
+            tickets = self.queues.pop(key)
+            ticket = tickets.popleft()
+            if tickets:
+                # Back of the line until every other waiting workspace had its turn
+                self.queues[key] = tickets
+            self.running.add(key)
+            ticket.set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "running": len(self.running),
+                "queued": sum(len(tickets) for tickets in self.queues.values()),
+            }
+
+
+class SessionError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AgentServer:
+    """
+    Serves agent sessions over HTTP on a TCP or Unix socket from one warm process.
+
+    The client, tool schemas, tool cache, search indexes and the interpreter pool
+    are created once and shared by all sessions. Each session runs on its own
+    thread with its own messages and working directory, admitted by a FairScheduler.
+
+    Endpoints:
+        POST /sessions  {"prompt", "working_directory", "max_iterations", "id"} -> session result
+        GET /stats      Session counters, scheduler, tool cache and transport stats
+        GET /health     {"status": "ok"}
+    """
+
+    def __init__(
+        self,
+        client,
+        address=SERVER_ADDRESS,
+        allowed_roots=SERVER_ALLOWED_ROOTS,
+        max_sessions=BATCH_CONCURRENCY,
+        requests_per_minute=BATCH_REQUESTS_PER_MINUTE,
+    ):
+        self.client = client
+        self.address = address
+        self.allowed_roots = [os.path.realpath(root) for root in allowed_roots]
+        self.scheduler = FairScheduler(max_sessions)
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.counters = {"sessions": 0, "errors": 0, "prompt_tokens": 0, "response_tokens": 0}
+        self.lock = threading.Lock()
+        self.httpd = _make_http_server(address, self)
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        The base URL of a TCP server (with the actual port if it was 0).
+        """
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def warm_up(self):
+        # Pay the one-time costs before the first session instead of during it
+        get_available_functions()
+        if RUN_PYTHON_USE_WARM_POOL:
+            import interpreter_pool
+
+            if interpreter_pool.available():
+                interpreter_pool.get_pool()
+
+    def start(self):
+        """
+        Serves requests on a background thread.
+        """
+        self.warm_up()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="agent-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.warm_up()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        if self.thread:
+            self.httpd.shutdown()
+            self.thread.join()
+        self.close()
+
+    def close(self):
+        self.httpd.server_close()
+        if self.address.startswith("unix:") and os.path.exists(self.address[len("unix:"):]):
+            os.unlink(self.address[len("unix:"):])
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def resolve_working_directory(self, working_directory):
+        """
+        Returns the real path of a session's working directory.
+
+        Raises:
+            SessionError: If it is outside the allowed roots or not a directory.
+        """
+        path = os.path.realpath(working_directory or WORKING_DIRECTORY)
+        if not any(path == root or path.startswith(root + os.sep) for root in self.allowed_roots):
+            raise SessionError(403, f'"{working_directory}" is outside the allowed roots')
+        if not os.path.isdir(path):
+            raise SessionError(400, f'"{working_directory}" is not a directory')
+        return path
+
+    def run_session(self, request):
+        """
+        Runs one session request and returns its result.
+
+        Returns:
+            dict: The final response, error, token usage, tool call count and the
+            time the session waited for a slot and ran.
+        """
+        prompt = request.get("prompt")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise SessionError(400, 'The request needs a "prompt"')
+        working_directory = self.resolve_working_directory(request.get("working_directory"))
+        max_iterations = request.get("max_iterations")
+        if max_iterations is None:
+            max_iterations = MAX_ITERATIONS
+        elif isinstance(max_iterations, bool) or not isinstance(max_iterations, int) or max_iterations < 1:
+            raise SessionError(400, '"max_iterations" must be a positive integer')
+        # Clients may lower the limit, not raise it past what the server allows
+        max_iterations = min(max_iterations, MAX_ITERATIONS)
+
+        start = time.perf_counter()
+        self.scheduler.acquire(working_directory)
+        started = time.perf_counter()
+        try:
+            with tracing.span("server.session", id=request.get("id"), workspace=working_directory):
+                result = run_agent(
+                    self.client,
+                    prompt,
+                    working_directory=working_directory,
+                    rate_limiter=self.rate_limiter,
+                    quiet=True,
+                    max_iterations=max_iterations,
+                )
+        finally:
+            self.scheduler.release(working_directory)
+
+        # Summarize tool timings, the per-call list is too big for the response
+        result["tool_calls"] = len(result.pop("tool_timings"))
+        result["tool_wall_time"] = round(result["tool_wall_time"], 3)
+        result["id"] = request.get("id")
+        result["queued"] = round(started - start, 3)
+        result["duration"] = round(time.perf_counter() - started, 3)
+
+        with self.lock:
+            self.counters["sessions"] += 1
+            self.counters["errors"] += 1 if result["error"] else 0
+            self.counters["prompt_tokens"] += result["prompt_tokens"]
+            self.counters["response_tokens"] += result["response_tokens"]
+        return result
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["scheduler"] = self.scheduler.stats()
+        stats["tool_cache"] = tool_cache.stats()
+        stats["spill"] = spill_store.default_store.stats()
+        if prefetcher.enabled:
+            stats["prefetch"] = prefetcher.stats()
+        if hasattr(self.client, "stats"):
+            stats["transport"] = self.client.stats()
+        return stats
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests of a client
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send(200, self.server.agent_server.stats())
+        else:
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/sessions":
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"null")
+            if not isinstance(request, dict):
+                raise SessionError(400, "The request body must be a JSON object")
+            self._send(200, self.server.agent_server.run_session(request))
+        except json.JSONDecodeError as e:
+            self._send(400, {"error": f"Invalid JSON: {e}"})
+        except SessionError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"Error: {e}"})
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _make_http_server(address, agent_server):
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        # A socket file left behind by a previous server would make bind fail
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+        httpd = _UnixHTTPServer(path, _Handler)
+    else:
+        host, _, port = address.rpartition(":")
+        httpd = http.server.ThreadingHTTPServer((host or "127.0.0.1", int(port)), _Handler)
+        httpd.daemon_threads = True
+    httpd.agent_server = agent_server
+    return httpd
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+import tracing
+from config import *
+
+# Handles are the first 16 hex digits of the SHA-256 of the content
+HANDLE = re.compile(r"^[0-9a-f]{16}$")
+
+
+class SpillStore:
+    """
+    Content-addressed store for large tool results on disk.
+
+    A result is saved once under the hash of its content, so identical outputs
+    (the same file read or test run twice) share one file. Only the handle and a
+    preview stay in the conversation, read() serves slices of the rest. Results
+    are kept apart per owner (the working directory of the session), a handle
+    only resolves for the owner that spilled it. When the store grows past
+    max_bytes the least recently stored or reused results are pruned.
+    """
+
+    def __init__(self, directory=None, threshold=SPILL_THRESHOLD_CHARS, preview_chars=SPILL_PREVIEW_CHARS, max_bytes=SPILL_MAX_BYTES):
+        directory = directory or SPILL_DIR
+        if not os.path.isabs(directory):
+            directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), directory)
+        self.directory = directory
+        self.threshold = threshold
+        self.preview_chars = preview_chars
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        self.spilled = 0
+        self.deduplicated = 0
+        self.lock = threading.Lock()
+
+    def _path(self, handle, owner):
+        namespace = hashlib.sha256(os.path.abspath(owner).encode()).hexdigest()[:16] if owner else "shared"
+        return os.path.join(self.directory, namespace, handle[:2], f"{handle}.txt")
+
+    def put(self, text, owner=None):
+        """
+        Saves text for owner and returns its handle.
+        """
+        data = text.encode("utf-8")
+        handle = hashlib.sha256(data).hexdigest()[:16]
+        path = self._path(handle, owner)
+        with self.lock:
+            self.spilled += 1
+            if os.path.exists(path):
+                # Counts as recently used for pruning
+                os.utime(path)
+                self.deduplicated += 1
+                tracing.annotate(spill="dedup")
+                return handle
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            tracing.annotate(spill="write", spill_bytes=len(data))
+
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            else:
+                self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self._prune(keep=path)
+        return handle
+
+    def read(self, handle, owner=None):
+        """
+        Returns the text of a handle spilled by owner.
+
+        Raises:
+            KeyError: If the handle is malformed or not in the store for this owner (e.g. pruned).
+        """
+        if not HANDLE.match(handle or ""):
+            raise KeyError(handle)
+        try:
+            with open(self._path(handle, owner), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(handle) from None
+
+    def spill(self, result, owner=None):
+        """
+        Returns result unchanged if it is short, otherwise a preview of it with
+        the handle to read the rest with read_spilled.
+        """
+        if self.threshold is None or not isinstance(result, str) or len(result) <= self.threshold:
+            return result
+        with tracing.span("spill.put", chars=len(result)):
+            handle = self.put(result, owner)
+        preview = result[: self.preview_chars]
+        return (
+            f"{preview}\n[Output truncated: {len(result)} characters in total, stored as handle {handle}. "
+            f'Read more with read_spilled(handle="{handle}", offset={len(preview)})]'
+        )
+
+    def _scan_size(self):
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _prune(self, keep):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+        self.total_bytes = sum(size for _, size, _ in entries)
+        # Down to three quarters of the budget, so the next few results don't prune again
+        for _, size, path in entries:
+            if self.total_bytes <= self.max_bytes * 3 // 4:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+
+    def stats(self):
+        with self.lock:
+            return {"spilled": self.spilled, "deduplicated": self.deduplicated}
+
+
+# Shared by call_function, which spills results, and read_spilled, which reads them back
+default_store = SpillStore()
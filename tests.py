@@ -1,4 +1,54 @@
-from functions.run_python_file import run_python_file
+import asyncio
+import collections
+import concurrent.futures
+import http.client
+import json
+import os
+import tempfile
+import re
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+from google.genai import types
+
+from config import FILE_CHARACTER_LIMIT
+from functions.run_python_file import run_python_file, run_capped_process
+from functions.profile_python_file import profile_python_file
+from functions.run_tests import run_tests as run_test_suite
+from functions.get_file_content import get_file_content
+import functions.get_file_content as get_file_content_module
+from functions.get_files_info import get_files_info
+from functions.search_files import search_files
+from functions.edit_file import edit_file
+from functions.get_changes import get_changes
+from executor import execute_function_calls, CallOrdering
+from async_agent import run_agent_async
+from compaction import compact_messages, estimate_tokens
+from batch import run_batch
+from agent import run_agent
+from model_backend import (
+    ScriptedClient,
+    RecordingClient,
+    ReplayClient,
+    request_hash,
+    FakeGeminiServer,
+    text_response,
+    function_call_response,
+)
+from transport import TransportClient, http_options, retry_after
+from checkpoint import SessionCheckpoint, session_path
+from prefetch import Prefetcher
+from spill_store import SpillStore
+from tool_cache import ToolResultCache
+import spill_store
+import search_index
+from server import AgentServer, FairScheduler
+from call_function import call_function
+import call_function as call_function_module
+import tracing
 
 def run_tests():
     test_cases = [
@@ -20,5 +70,1061 @@ def run_tests():
                     print(f" {line}")
 
 
+def run_warm_pool_tests():
+    test_cases = [
+        ("calculator", "main.py", ["3 + 5"]),
+        ("calculator", "tests.py", []),
+        ("calculator", "main.py", []),
+    ]
+
+    # A warm run must produce exactly what a fresh interpreter produces
+    for working_directory, file_path, args in test_cases:
+        cold = run_python_file(working_directory, file_path, args, warm=False)
+        warm = run_python_file(working_directory, file_path, args, warm=True)
+        strip_timing = lambda output: re.sub(r"in \d+\.\d+s", "", output)
+        assert strip_timing(cold) == strip_timing(warm), (cold, warm)
+        print(f"Warm run of {file_path} {args} matches cold run")
+
+
+def run_capped_output_tests():
+    script = "import sys\nfor i in range(20000): print('line', i)\nprint('done', file=sys.stderr)"
+
+    stdout, stderr, exit_code, killed_reason = run_capped_process(
+        [sys.executable, "-c", script], ".", timeout=30, cap=1000
+    )
+    assert stdout.startswith("line 0\n") and stdout.endswith("line 19999\n"), stdout
+    assert "bytes of output dropped" in stdout
+    assert stderr == "done\n" and exit_code == 0 and killed_reason is None
+
+    # Printing past the kill limit stops the process early
+    _, _, _, killed_reason = run_capped_process(
+        [sys.executable, "-c", "while True: print('x' * 1000)"], ".", timeout=30, cap=1000, kill_after_bytes=100000
+    )
+    assert killed_reason == "output exceeded 100000 bytes", killed_reason
+
+    # CRLF and lone CR come back as newlines, like text-mode pipes
+    crlf_stdout, _, _, _ = run_capped_process(
+        [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'a\\r\\nb\\rc\\n')"], ".", timeout=30
+    )
+    assert crlf_stdout == "a\nb\nc\n", repr(crlf_stdout)
+    print(f"Capped output: {len(stdout)} characters kept, killed: {killed_reason}")
+
+
+def run_profile_python_file_tests():
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "work.py"), "w", encoding="utf-8") as f:
+            f.write(
+                "import sys\n"
+                "def slow():\n"
+                "    return sum(i * i for i in range(300000))\n"
+                "def fast():\n"
+                "    return 1\n"
+                "def main():\n"
+                "    print(slow() + fast(), sys.argv[1:])\n"
+                "    sys.exit(3)\n"
+                "main()\n"
+            )
+
+        result = profile_python_file(directory, "work.py", ["--flag"], top=3)
+        print("    " + result.replace("\n", "\n    "))
+        lines = result.splitlines()
+        assert lines[0].startswith('Profile of "work.py"') and "peak RSS" in lines[0], result
+        assert lines[0].endswith("exited with code 3"), result
+
+        # main calls slow, both rank above everything else by cumulative time
+        cumulative = [line.split()[-1] for line in lines[3:6]]
+        assert cumulative[:3] == ["work.py:1(<module>)", "work.py:6(main)", "work.py:2(slow)"], cumulative
+        assert "work.py:3(<genexpr>)" in result and "runpy" not in result
+        assert "STDOUT:\n8999955000050001 ['--flag']" in result, result
+
+        assert profile_python_file(directory, "../work.py").startswith("Error: Cannot profile")
+        assert profile_python_file(directory, "missing.py").startswith("Error: File")
+
+
+def run_test_runner_tests():
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "pkg"))
+        files = {
+            "pkg/__init__.py": "",
+            "pkg/shapes.py": "def area(w, h):\n    return w * h\n",
+            "pkg/words.py": "def shout(text):\n    return text.upper()\n",
+            "test_shapes.py": (
+                "import unittest\n"
+                "from pkg.shapes import area\n"
+                "class TestShapes(unittest.TestCase):\n"
+                "    def test_area(self):\n"
+                "        self.assertEqual(area(2, 3), 6)\n"
+                "    def test_square(self):\n"
+                "        self.assertEqual(area(2, 2), 5)\n"
+            ),
+            "test_words.py": (
+                "import unittest\n"
+                "from pkg import words\n"
+                "class TestWords(unittest.TestCase):\n"
+                + "".join(f"    def test_shout_{i}(self):\n        self.assertEqual(words.shout('a' * {i}), 'A' * {i})\n" for i in range(10))
+            ),
+            "test_broken.py": "import missing_module\n",
+        }
+        for path, content in files.items():
+            with open(os.path.join(directory, path), "w", encoding="utf-8") as f:
+                f.write(content)
+
+        result = run_test_suite(directory, workers=2)
+        print("    " + result.replace("\n", "\n    "))
+        lines = result.splitlines()
+        assert lines[0].startswith("Ran 13 tests in 2 worker(s)"), lines[0]
+        assert lines[0].endswith("11 passed, 1 failed, 1 errors, 0 skipped"), lines[0]
+        assert "FAIL: test_shapes.TestShapes.test_square" in result and "AssertionError: 4 != 5" in result, result
+        assert "ERROR: <collecting> ModuleNotFoundError: No module named 'missing_module'" in result, result
+
+        # Only the failing test runs again, the collection error is reported again
+        result = run_test_suite(directory, only_failed=True)
+        assert result.splitlines()[0].startswith("Ran 2 tests in 1 worker(s)"), result
+        assert "Selected 1 of 12 tests failed last time" in result, result
+
+        # Changing a module reruns only the tests that import it
+        os.remove(os.path.join(directory, "test_broken.py"))
+        with open(os.path.join(directory, "pkg/shapes.py"), "w", encoding="utf-8") as f:
+            f.write("def area(w, h):\n    return w * h + 1\n")
+        result = run_test_suite(directory, affected=True, details=True)
+        print("    " + result.replace("\n", "\n    "))
+        assert result.splitlines()[0].endswith("1 passed, 1 failed, 0 errors, 0 skipped"), result
+        assert "Selected 2 of 12 tests affected by changes" in result, result
+        assert run_test_suite(directory, affected=True).startswith("No tests affected by changes (12 tests found)")
+
+        result = run_test_suite(directory, tests=["test_words.TestWords.test_shout_3"])
+        assert result.splitlines()[0].endswith("1 passed, 0 failed, 0 errors, 0 skipped"), result
+        assert run_test_suite(directory, "..").startswith("Error: Cannot run tests")
+
+    # Failing subtests count once, under the id of their test
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "test_sub.py")
+        source = (
+            "import unittest\n"
+            "class TestSub(unittest.TestCase):\n"
+            "    def test_values(self):\n"
+            "        for i in range(3):\n"
+            "            with self.subTest(i=i):\n"
+            "                self.assertNotEqual(i, 2)\n"
+            "    def test_other(self):\n"
+            "        pass\n"
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source)
+        result = run_test_suite(directory)
+        assert result.splitlines()[0].startswith("Ran 2 tests"), result
+        assert result.splitlines()[0].endswith("1 passed, 1 failed, 0 errors, 0 skipped"), result
+        assert "FAIL: test_sub.TestSub.test_values" in result and "(i=2)" in result, result
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source.replace("assertNotEqual(i, 2)", "assertNotEqual(i, 3)"))
+        result = run_test_suite(directory, only_failed=True)
+        assert result.splitlines()[0].endswith("1 passed, 0 failed, 0 errors, 0 skipped"), result
+        assert run_test_suite(directory, only_failed=True).startswith("No tests failed last time"), result
+
+
+def run_get_file_content_tests():
+    with open("calculator/main.py", encoding="utf-8") as f:
+        main_source = f.read()
+    size = os.path.getsize("calculator/main.py")
+
+    assert get_file_content("calculator", "main.py") == main_source
+    result = get_file_content("calculator", "main.py", offset=0, length=40)
+    assert result == main_source[:40] + f'\n[File "main.py": characters 0-40, {size} bytes on disk. Continue with offset=40]', result
+    result = get_file_content("calculator", "main.py", offset=700)
+    assert result.startswith(main_source[700:]) and result.endswith("End of file]"), result
+    result = get_file_content("calculator", "main.py", start_line=3, end_line=5)
+    assert result == "".join(main_source.splitlines(True)[2:5]) + f'\n[File "main.py": lines 3-5, {size} bytes on disk. Continue with start_line=6]', result
+    assert get_file_content("calculator", "main.py", start_line=300).startswith('Error: "main.py" has only')
+    assert get_file_content("calculator", "main.py", offset=-1).startswith("Error: offset -1")
+    assert get_file_content("calculator", "main.py", offset=10**6).startswith("Error: offset 1000000")
+    assert get_file_content("calculator", "../main.py").startswith("Error: Cannot read")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Offsets and the limit count characters, CRLF is read as a newline
+        with open(os.path.join(directory, "crlf.txt"), "wb") as f:
+            f.write("é line one\r\nline two\r\n".encode("utf-8"))
+        assert get_file_content(directory, "crlf.txt") == "é line one\nline two\n"
+        result = get_file_content(directory, "crlf.txt", offset=2, length=9)
+        assert result.startswith("line one\n\n[File \"crlf.txt\": characters 2-11,"), result
+        assert result.endswith("Continue with offset=11]"), result
+
+        # A line longer than the limit is cut with a marker, the window goes on after it
+        with open(os.path.join(directory, "long.txt"), "w", encoding="utf-8") as f:
+            f.write("short\n" + "é" * (FILE_CHARACTER_LIMIT + 50) + "\nafter\n")
+        result = get_file_content(directory, "long.txt", start_line=2, end_line=2)
+        lines = result.splitlines()
+        assert lines[0] == "é" * FILE_CHARACTER_LIMIT, len(lines[0])
+        assert lines[1] == f"[...line 2 truncated at {FILE_CHARACTER_LIMIT} characters]", lines[1]
+        assert lines[-1].endswith("Continue with start_line=3]"), lines[-1]
+        assert get_file_content(directory, "long.txt", start_line=3).startswith("after\n")
+
+        result = get_file_content(directory, "long.txt")
+        assert result.startswith("short\n") and f"truncated at {FILE_CHARACTER_LIMIT} characters" in result
+        assert result.endswith(f"Continue with offset={FILE_CHARACTER_LIMIT}]"), result[-100:]
+
+        # Paging continues from a checkpoint of the previous page, also across chunk edges
+        # falling inside a multi-byte character or a CRLF
+        text = "ab\r\né\r\n€x\r\n" * 300
+        with open(os.path.join(directory, "pages.txt"), "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        expected = text.replace("\r\n", "\n")
+        original_chunk = get_file_content_module.READ_CHUNK_CHARACTERS
+        get_file_content_module.READ_CHUNK_CHARACTERS = 5
+        try:
+            assert get_file_content(directory, "pages.txt", offset=1001, length=30).startswith(expected[1001:1031])
+            pages = []
+            offset = 0
+            while True:
+                result = get_file_content(directory, "pages.txt", offset=offset, length=7)
+                page, metadata = result.rsplit("\n[", 1)
+                pages.append(page)
+                if metadata.endswith("End of file]"):
+                    break
+                offset = int(metadata.rsplit("offset=", 1)[1][:-1])
+                checkpoints = get_file_content_module._checkpoints[os.path.join(directory, "pages.txt")][1]
+                assert offset in [checkpoint[0] for checkpoint in checkpoints]
+            assert "".join(pages) == expected
+        finally:
+            get_file_content_module.READ_CHUNK_CHARACTERS = original_chunk
+
+    print("get_file_content: character ranges, line windows and truncation markers")
+
+
+def run_get_files_info_tests():
+    test_cases = [
+        ("calculator", {}),
+        ("calculator", {"directory": "pkg"}),
+        ("calculator", {"directory": "../"}),
+        ("calculator", {"recursive": True, "include": ["*.py"]}),
+        ("calculator", {"recursive": True, "limit": 2}),
+        ("calculator", {"recursive": True, "limit": 2, "cursor": "main.py"}),
+    ]
+
+    for working_directory, kwargs in test_cases:
+        result = get_files_info(working_directory, **kwargs)
+        print(f"Result for {kwargs}:")
+        for line in result.splitlines():
+            print(f"    {line}")
+
+    # Plain listings show everything, recursive ones skip ignored names unless asked not to
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "__pycache__"))
+        for name in ("main.py", ".gitignore", "build.log"):
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                f.write("*.log\n" if name == ".gitignore" else "x\n")
+
+        def names(**kwargs):
+            return [line.split(":")[0][2:] for line in get_files_info(directory, **kwargs).splitlines()]
+
+        assert names() == [".gitignore", "__pycache__", "build.log", "main.py"], names()
+        assert names(recursive=True) == [".gitignore", "main.py"], names(recursive=True)
+        assert names(respect_ignore=True) == [".gitignore", "main.py"], names(respect_ignore=True)
+        assert names(recursive=True, respect_ignore=False) == names()
+
+
+def run_search_files_tests():
+    test_cases = [
+        ("calculator", {"query": "def evaluate"}),
+        ("calculator", {"query": r"_apply_\w+\(", "regex": True, "max_results": 2}),
+        ("calculator", {"query": "calculator", "case_sensitive": False, "include": ["main.py"]}),
+        ("calculator", {"query": "no such symbol"}),
+        ("calculator", {"query": "x", "directory": "../"}),
+    ]
+
+    for working_directory, kwargs in test_cases:
+        result = search_files(working_directory, **kwargs)
+        print(f"Result for {kwargs}:")
+        for line in result.splitlines():
+            print(f"    {line}")
+
+    # Files and queries without any run of three word characters are still searched
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            for name, content in (("sum.txt", "3 + 5\n"), ("assign.py", "x = 1 + 2\n"), (".gitignore", "build/\n")):
+                with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                    f.write(content)
+            assert "sum.txt:1: 3 + 5" in search_files(directory, "+")
+            assert "assign.py:1: x = 1 + 2" in search_files(directory, "+")
+            assert search_files(directory, "1 + 2") == "assign.py:1: x = 1 + 2"
+            assert "assign.py:1:" in search_files(directory, "x = 1")
+
+            # Escapes standing for a character are not required literally
+            with open(os.path.join(directory, "letters.txt"), "w", encoding="utf-8") as f:
+                f.write("ABCDEF\n")
+            search_index.notify_write(directory, "letters.txt")
+            for query in (r"\x41BCD", r"\u0041BCD", r"\U00000041BCD", r"\N{LATIN CAPITAL LETTER A}BCD", r"\101BCD", r"(A)\1?BCD"):
+                assert search_files(directory, query, regex=True) == "letters.txt:1: ABCDEF", query
+            assert search_index.required_literals(r"\x41BCD", True) == ["BCD"]
+
+            # A write below an ignored directory is not indexed
+            os.makedirs(os.path.join(directory, "build"))
+            with open(os.path.join(directory, "build", "out.txt"), "w", encoding="utf-8") as f:
+                f.write("generated_symbol\n")
+            search_index.notify_write(directory, "build/out.txt")
+            assert search_files(directory, "generated_symbol").startswith("No matches found"), search_files(directory, "generated_symbol")
+        finally:
+            search_index.discard_index(directory)
+
+
+def run_edit_file_tests():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "module.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(f"value_{i} = {i}\n" for i in range(1, 201)))
+
+        result = edit_file(directory, "module.py", edits=[{"old_text": "value_7 = 7\n", "new_text": "value_7 = 70\n"}])
+        print(f"    {result}")
+        assert result.startswith('Successfully edited "module.py": 1 change at line 7'), result
+
+        patch = "--- a/module.py\n+++ b/module.py\n@@ -100,3 +100,4 @@\n value_99 = 99\n-value_100 = 100\n+value_100 = 1000\n+value_100b = 1\n value_101 = 101\n"
+        result = edit_file(directory, "module.py", patch=patch)
+        print(f"    {result}")
+        assert "(-1 +2 lines)" in result, result
+
+        # Stale edits are rejected and leave the file untouched
+        with open(path, encoding="utf-8") as f:
+            before = f.read()
+        for kwargs in (
+            {"edits": [{"old_text": "value_7 = 7\n", "new_text": "x"}]},
+            {"edits": [{"old_text": "value_1", "new_text": "x"}]},
+            {"patch": patch},
+        ):
+            result = edit_file(directory, "module.py", **kwargs)
+            print(f"    {result}")
+            assert result.startswith("Error: Conflict"), result
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == before
+
+        assert "value_100b = 1\nvalue_101" in before and "value_7 = 70\n" in before
+        assert os.listdir(directory) == ["module.py"], "temp files must not be left behind"
+        assert edit_file(directory, "../module.py", edits=[]).startswith("Error: Cannot edit")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lines.txt")
+
+        def reset():
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("".join(f"v{i}\n" for i in range(1, 11)))
+
+        # Line numbers in the summary refer to the edited file, after every edit of the call
+        reset()
+        result = edit_file(directory, "lines.txt", edits=[
+            {"old_text": "v8\n", "new_text": "v8a\n"},
+            {"old_text": "v2\n", "new_text": "v2a\nv2b\nv2c\n"},
+        ])
+        assert result.startswith('Successfully edited "lines.txt": 2 changes at lines 2-4, 10 '), result
+        with open(path, encoding="utf-8") as f:
+            assert f.read().splitlines()[9] == "v8a"
+
+        # File headers between hunks are not removed or added lines
+        reset()
+        patch = (
+            "--- a/lines.txt\n+++ b/lines.txt\n@@ -2,1 +2,2 @@\n-v2\n+v2a\n+v2b\n"
+            "diff --git a/lines.txt b/lines.txt\nindex 1a2b3c4..5d6e7f8 100644\n"
+            "--- a/lines.txt\n+++ b/lines.txt\n@@ -8,1 +9,1 @@\n-v8\n+v8a\n"
+        )
+        result = edit_file(directory, "lines.txt", patch=patch)
+        assert result.startswith('Successfully edited "lines.txt": 2 changes at lines 2-3, 9 (-2 +3 lines)'), result
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "v1\nv2a\nv2b\nv3\nv4\nv5\nv6\nv7\nv8a\nv9\nv10\n"
+
+
+def run_prefetch_tests():
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "pkg"))
+        files = {"main.py": "print('hi')\n", "pkg/util.py": "X = 1\n", "notes.txt": "todo\n", "big.txt": "x" * 5000}
+        for name, text in files.items():
+            with open(os.path.join(directory, name), "w") as f:
+                f.write(text)
+
+        prefetcher = Prefetcher(get_file_content, enabled=True, max_file_bytes=1000)
+        args = {"working_directory": directory, "recursive": True}
+        prefetcher.schedule(args, get_files_info(**args))
+        concurrent.futures.wait(prefetcher.pending[directory])
+
+        # Small files are served as get_file_content would return them, big ones are left alone
+        read = lambda file_path, **options: prefetcher.lookup({"working_directory": directory, "file_path": file_path, **options})
+        assert read("pkg/util.py") == get_file_content(directory, "pkg/util.py") == "X = 1\n"
+        assert read("big.txt") is None
+        assert read("main.py", start_line=1) is None
+
+        # A file changed on disk is never served stale
+        with open(os.path.join(directory, "notes.txt"), "a") as f:
+            f.write("more\n")
+        assert read("notes.txt") is None
+
+        stats = prefetcher.stats()
+        assert (stats["prefetched"], stats["hits"], stats["misses"], stats["unused"]) == (3, 1, 2, 1), stats
+        assert stats["entries"] == 2, stats
+
+        # Through call_function: the listing schedules the reads, writes drop the entry
+        call_function_module.prefetcher = prefetcher
+        try:
+            call_function(types.FunctionCall(name="get_files_info", args={}), working_directory=directory, quiet=True)
+            concurrent.futures.wait(prefetcher.pending[directory])
+            call_function(
+                types.FunctionCall(name="write_file", args={"file_path": "main.py", "content": "print('bye')\n"}),
+                working_directory=directory,
+                quiet=True,
+            )
+            result = call_function(types.FunctionCall(name="get_file_content", args={"file_path": "main.py"}), working_directory=directory, quiet=True)
+        finally:
+            call_function_module.prefetcher = Prefetcher(get_file_content)
+        assert result.parts[0].function_response.response["result"] == "print('bye')\n", result
+        assert prefetcher.stats()["misses"] == 3, prefetcher.stats()
+
+    # A listing in another working directory (another session) leaves the pending loads alone
+    with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+        for directory in (first, second):
+            for name in ("a.txt", "b.txt"):
+                with open(os.path.join(directory, name), "w") as f:
+                    f.write(name)
+        release = threading.Event()
+
+        def slow_read(**args):
+            release.wait(5)
+            return get_file_content(**args)
+
+        shared = Prefetcher(slow_read, enabled=True, workers=1)
+        for directory in (first, second):
+            shared.schedule({"working_directory": directory}, get_files_info(directory))
+        release.set()
+        concurrent.futures.wait(shared.pending[first] + shared.pending[second])
+        assert not any(future.cancelled() for future in shared.pending[first]), shared.pending
+        assert shared.stats()["prefetched"] == 4, shared.stats()
+
+    print(f"Prefetch: {prefetcher.stats()}")
+
+
+def run_get_changes_tests():
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "pkg"))
+        for name in ("main.py", "pkg/util.py", "old.txt"):
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                f.write("".join(f"line {i}\n" for i in range(1, 21)))
+
+        result = get_changes(directory)
+        print(f"    {result}")
+        token = re.search(r"Snapshot (\d+) taken \(3 files\)", result).group(1)
+        assert get_changes(directory, since=token).startswith(f"No changes since snapshot {token}")
+
+        # A script run changes the workspace behind the agent's back
+        with open(os.path.join(directory, "pkg/util.py"), "r+", encoding="utf-8") as f:
+            text = f.read()
+            f.seek(0)
+            f.write(text.replace("line 10\n", "line ten\n"))
+            f.truncate()
+        with open(os.path.join(directory, "pkg/new.py"), "w", encoding="utf-8") as f:
+            f.write("created\n")
+        os.remove(os.path.join(directory, "old.txt"))
+        os.utime(os.path.join(directory, "main.py"))
+
+        result = get_changes(directory, since=token, diff=True)
+        print("    " + result.replace("\n", "\n    "))
+        lines = result.splitlines()
+        assert lines[0].startswith(f"3 change(s) since snapshot {token}"), result
+        assert lines[1:4] == ["D old.txt", "A pkg/new.py (8 bytes)", "M pkg/util.py (151 -> 152 bytes)"], lines
+        assert "-line 10" in lines and "+line ten" in lines and "+created" in lines, result
+        # Only the changed lines and one line of context, not the whole file
+        assert "line 5" not in result and "main.py" not in result
+
+        # Restricted to a directory
+        assert get_changes(directory, since=token, directory="pkg").count("\n") == 2
+
+        # Writes through call_function are tracked like any other change
+        token = re.search(r"current snapshot: (\d+)", result).group(1)
+        call_function(
+            types.FunctionCall(name="write_file", args={"file_path": "main.py", "content": "rewritten\n"}),
+            working_directory=directory,
+            quiet=True,
+        )
+        result = call_function(types.FunctionCall(name="get_changes", args={"since": token}), working_directory=directory, quiet=True)
+        assert result.parts[0].function_response.response["result"].splitlines()[1] == "M main.py (151 -> 10 bytes)", result
+        assert get_changes(directory, since="999").startswith("Error: Unknown or expired snapshot")
+        assert get_changes(directory, directory="..").startswith("Error: Cannot track")
+
+
+def run_spill_tests():
+    with tempfile.TemporaryDirectory() as directory:
+        store = SpillStore(os.path.join(directory, "spill"), threshold=1000, preview_chars=100, max_bytes=6000)
+        with open(os.path.join(directory, "big.txt"), "w", encoding="utf-8") as f:
+            f.write("".join(f"row {i:04}\n" for i in range(500)))
+
+        original_store = spill_store.default_store
+        spill_store.default_store = store
+        try:
+            read = lambda name, **args: call_function(
+                types.FunctionCall(name=name, args=args), working_directory=directory, quiet=True
+            ).parts[0].function_response.response["result"]
+
+            # The conversation keeps a preview and the handle, identical outputs share one file
+            preview = read("get_file_content", file_path="big.txt")
+            handle = re.search(r'handle="([0-9a-f]{16})", offset=100', preview).group(1)
+            assert preview.startswith("row 0000\n") and len(preview) < 300, preview
+            assert read("get_file_content", file_path="big.txt") == preview
+            assert store.stats() == {"spilled": 2, "deduplicated": 1}, store.stats()
+
+            # Slices come back on demand, and are never spilled again
+            page = read("read_spilled", handle=handle, offset=90, length=18)
+            assert page.startswith("row 0010\nrow 0011\n\n[Spilled output"), page
+            assert page.endswith("characters 90-108 of 4500 total. Continue with offset=108]"), page
+            assert len(read("read_spilled", handle=handle)) > 4500
+            assert read("read_spilled", handle="0" * 16).startswith("Error: Unknown spilled output")
+
+            # Another working directory (another session) can't read the output by its handle
+            other = call_function(
+                types.FunctionCall(name="read_spilled", args={"handle": handle}), working_directory="calculator", quiet=True
+            ).parts[0].function_response.response["result"]
+            assert other.startswith("Error: Unknown spilled output"), other
+        finally:
+            spill_store.default_store = original_store
+
+        # Past max_bytes the oldest outputs are pruned, the newest survives
+        handles = [store.put(f"{i}" * 2500) for i in range(3)]
+        assert store.read(handles[-1]) == "2" * 2500
+        try:
+            store.read(handles[0])
+            assert False, "the oldest output should have been pruned"
+        except KeyError:
+            pass
+
+    print(f"Spill: {store.stats()}")
+
+
+def run_executor_tests():
+    function_calls = [
+        types.FunctionCall(name="get_file_content", args={"file_path": "main.py"}),
+        types.FunctionCall(name="get_files_info", args={"directory": "pkg"}),
+        types.FunctionCall(name="run_python_file", args={"file_path": "main.py", "args": ["3 + 5"]}),
+        types.FunctionCall(name="get_file_content", args={"file_path": "pkg/calculator.py"}),
+    ]
+
+    results, stats = execute_function_calls(function_calls)
+
+    # Results must come back in the order the calls were made
+    names = [result.parts[0].function_response.name for result in results]
+    assert names == [call.name for call in function_calls], names
+
+    print(f"Executor ran {stats['calls']} calls:")
+    print(f"    wall-clock: {stats['wall_time']:.3f}s, summed tool time: {stats['tool_time']:.3f}s")
+
+    # A read, a search and a run of a file written earlier in the same turn see the new content,
+    # on the pool and when calls run one after another
+    with tempfile.TemporaryDirectory() as directory:
+        for max_workers in (4, 1):
+            for attempt in range(10):
+                content = f"print('run {max_workers} {attempt}')\n"
+                function_calls = [
+                    types.FunctionCall(name="write_file", args={"file_path": "a.py", "content": content}),
+                    types.FunctionCall(name="get_file_content", args={"file_path": "a.py"}),
+                    types.FunctionCall(name="search_files", args={"query": f"run {max_workers} {attempt}"}),
+                    types.FunctionCall(name="run_python_file", args={"file_path": "a.py"}),
+                ]
+                results, _ = execute_function_calls(
+                    function_calls, max_workers=max_workers, working_directory=directory, quiet=True
+                )
+                outputs = [result.parts[0].function_response.response["result"] for result in results]
+                assert outputs[1] == content, outputs
+                assert "a.py:1:" in outputs[2], outputs
+                assert f"run {max_workers} {attempt}" in outputs[3], outputs
+    print("Executor: reads and runs after a write in one turn see the written file")
+
+    # Snapshots before and after a script in one turn don't overlap it
+    ordering = CallOrdering()
+    turn = [
+        types.FunctionCall(name="get_changes", args={}),
+        types.FunctionCall(name="run_python_file", args={"file_path": "late.py"}),
+        types.FunctionCall(name="get_changes", args={"since": "1"}),
+    ]
+    assert [ordering.add(call) for call in turn] == [[], [0], [1]]
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "late.py"), "w", encoding="utf-8") as f:
+            f.write("import time\ntime.sleep(0.2)\nopen('out.txt', 'w').write('done')\n")
+        token = re.search(r"Snapshot (\d+) taken", get_changes(directory)).group(1)
+        turn[2] = types.FunctionCall(name="get_changes", args={"since": token})
+        results, _ = execute_function_calls(turn, working_directory=directory, quiet=True)
+        outputs = [result.parts[0].function_response.response["result"] for result in results]
+        assert "A out.txt" in outputs[2], outputs
+
+
+def run_async_agent_tests():
+    first_turn = function_call_response(("get_file_content", {"file_path": "main.py"}))
+    first_turn.candidates[0].content.parts.append(types.Part(text="Reading main.py"))
+    second_turn = text_response("The calculator ")
+    second_turn.candidates[0].content.parts.append(types.Part(text="evaluates infix."))
+    client = ScriptedClient([first_turn, second_turn], chunk_delay=0.01)
+
+    start = time.perf_counter()
+    final_text = asyncio.run(run_agent_async(client, "How does the calculator work?"))
+    print(f"Async agent finished in {time.perf_counter() - start:.3f}s")
+
+    assert final_text == "The calculator evaluates infix.", final_text
+
+    # The second request must carry the model turn and the tool response
+    second_request = client.requests[1]
+    assert second_request[-1].parts[0].function_response.name == "get_file_content"
+    assert "Calculator" in second_request[-1].parts[0].function_response.response["result"]
+
+
+def make_turn(name, args, result):
+    return [
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))]),
+        types.Content(role="user", parts=[types.Part.from_function_response(name=name, response={"result": result})]),
+    ]
+
+
+def run_compaction_tests():
+    messages = [types.Content(role="user", parts=[types.Part(text="Fix the calculator")])]
+    messages += make_turn("get_file_content", {"file_path": "pkg/calculator.py"}, "x" * 8000)
+    messages += make_turn("get_file_content", {"file_path": "pkg/render.py"}, "y" * 8000)
+    messages += make_turn("write_file", {"file_path": "pkg/calculator.py", "content": "fixed"}, "ok")
+    messages += make_turn("run_python_file", {"file_path": "tests.py"}, "z" * 8000)
+
+    compacted, stats = compact_messages(messages, token_budget=3000, keep_recent_turns=1, digest_chars=50)
+    print(f"Compaction: {stats['tokens_before']} -> {stats['tokens_after']} estimated tokens")
+
+    def result_of(contents, index):
+        return contents[index].parts[0].function_response.response["result"]
+
+    # The superseded read is dropped, the other old read is digested, the last turn is verbatim
+    assert "omitted" in result_of(compacted, 2), result_of(compacted, 2)
+    assert result_of(compacted, 4).startswith("[Compacted get_file_content"), result_of(compacted, 4)
+    assert result_of(compacted, 8) == "z" * 8000
+    assert stats["tokens_after"] == estimate_tokens(compacted)
+
+    # The full history is left untouched
+    assert result_of(messages, 2) == "x" * 8000
+
+
+def run_tool_cache_tests():
+    cache = call_function_module.tool_cache
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "notes.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("original")
+
+        def call(name, **args):
+            result = call_function(types.FunctionCall(name=name, args=args), working_directory=directory, quiet=True)
+            return result.parts[0].function_response.response["result"]
+
+        call("get_file_content", file_path="notes.txt")
+        hits_before = cache.hits
+        call("get_file_content", file_path="notes.txt")
+        assert cache.hits == hits_before + 1, cache.stats()
+
+        # Writing the file through the agent must invalidate the cached read
+        call("write_file", file_path="notes.txt", content="changed")
+        assert call("get_file_content", file_path="notes.txt") == "changed"
+
+        # A file growing behind the agent's back must not leave a stale listing
+        listing = call("get_files_info")
+        assert call("get_files_info") == listing
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(" outside")
+        assert call("get_files_info") != listing, listing
+        assert "15 bytes" in call("get_files_info"), call("get_files_info")
+
+    print(f"Tool cache: {cache.stats()}")
+
+
+def read_then_answer(contents):
+    # First turn writes a file, the second one answers with the original prompt
+    if contents[-1].parts[0].function_response:
+        return text_response(f"done: {contents[0].parts[0].text}")
+    return function_call_response(("write_file", {"file_path": "notes.txt", "content": "session"}))
+
+
+def run_batch_tests():
+    with tempfile.TemporaryDirectory() as directory:
+        prompts_path = os.path.join(directory, "prompts.jsonl")
+        output_path = os.path.join(directory, "results.ndjson")
+        with open(prompts_path, "w", encoding="utf-8") as f:
+            for i in range(6):
+                f.write(json.dumps({"id": f"p{i}", "prompt": f"prompt {i}"}) + "\n")
+                if i == 2:
+                    # Malformed lines are reported, they don't stop the batch
+                    f.write('{"id": "broken", "prompt": \n[1, 2]\n')
+
+        totals = run_batch(ScriptedClient(read_then_answer), prompts_path, output_path, concurrency=3, requests_per_minute=0)
+
+        with open(output_path, encoding="utf-8") as f:
+            results = [json.loads(line) for line in f]
+
+    assert totals["sessions"] == 8 and totals["errors"] == 2, totals
+    errors = sorted((result["id"], result["error"].split(":")[1]) for result in results if result.get("error"))
+    assert errors == [(4, " line 4 is not valid JSON"), (5, " line 5 is not a JSON object")], errors
+    assert sorted(result["final_response"] for result in results if not result.get("error")) == [f"done: prompt {i}" for i in range(6)]
+    # Sessions write to their own copy, never to the real working directory
+    assert not os.path.exists("calculator/notes.txt")
+    print(f"Batch: {totals}")
+
+
+def run_record_replay_tests():
+    script = [
+        function_call_response(("get_files_info", {"directory": "pkg"}), prompt_tokens=40, response_tokens=5),
+        function_call_response(("get_file_content", {"file_path": "pkg/render.py"}), prompt_tokens=90, response_tokens=5),
+        text_response("render.py draws the result box.", prompt_tokens=400, response_tokens=8),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        recording_path = os.path.join(directory, "session.jsonl")
+
+        recorded = run_agent(RecordingClient(ScriptedClient(script), recording_path), "What is in pkg?", quiet=True)
+        replayed = run_agent(ReplayClient(recording_path), "What is in pkg?", quiet=True)
+
+        assert recorded["final_response"] == "render.py draws the result box.", recorded
+        assert replayed["final_response"] == recorded["final_response"], replayed
+        assert (replayed["prompt_tokens"], replayed["iterations"]) == (530, 3), replayed
+        assert [name for name, _ in replayed["tool_timings"]] == ["get_files_info", "get_file_content"]
+
+        # A different prompt no longer matches the recorded requests
+        mismatched = run_agent(ReplayClient(recording_path), "Something else", quiet=True)
+        assert "differs from the recording" in mismatched["error"], mismatched
+
+    # Tool outputs vary between runs (timings), they don't change the hash
+    def turn(call_args, result):
+        return [
+            types.Content(role="user", parts=[types.Part(text="Run the tests")]),
+            *make_turn("run_python_file", call_args, result),
+        ]
+    first = request_hash("test-model", turn({"file_path": "tests.py"}, "Ran 17 tests in 0.004s"))
+    assert first == request_hash("test-model", turn({"file_path": "tests.py"}, "Ran 17 tests in 0.009s"))
+    assert first != request_hash("test-model", turn({"file_path": "main.py"}, "Ran 17 tests in 0.004s"))
+
+    print(f"Record/replay: {replayed['iterations']} iterations, {replayed['prompt_tokens']} prompt tokens")
+
+
+def run_checkpoint_tests():
+    script = [
+        function_call_response(("get_files_info", {"directory": "pkg", "limit": 9}), prompt_tokens=30, response_tokens=4),
+        function_call_response(("get_file_content", {"file_path": "pkg/render.py", "length": 77}), prompt_tokens=60, response_tokens=4),
+        text_response("Checkpointed.", prompt_tokens=200, response_tokens=5),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = SessionCheckpoint.create("checkpoint-test", "What is in pkg?", "calculator", directory=directory)
+        first = run_agent(ScriptedClient(script[:2]), "What is in pkg?", quiet=True, max_iterations=2, checkpoint=checkpoint)
+        assert first["error"] == "Max iterations reached without final response.", first
+
+        # The two finished iterations come back from disk: model turns, tool results and totals
+        loaded = SessionCheckpoint.load("checkpoint-test", directory=directory)
+        assert (loaded.iterations, loaded.prompt_tokens, loaded.user_prompt) == (2, 90, "What is in pkg?"), loaded
+        assert len(loaded.messages) == 5, loaded.messages
+        assert loaded.messages[2].parts[0].function_response.name == "get_files_info"
+
+        # Resuming with a higher limit makes one more model call, no tool runs again
+        resumed_from = loaded.iterations
+        client = ScriptedClient(script[2:])
+        resumed = run_agent(client, loaded.user_prompt, quiet=True, max_iterations=5, checkpoint=loaded)
+        assert resumed["final_response"] == "Checkpointed.", resumed
+        assert (resumed["iterations"], resumed["prompt_tokens"]) == (3, 290), resumed
+        assert resumed["tool_timings"] == [] and len(client.requests) == 1
+        assert len(client.requests[0]) == 5
+
+        # A record cut off by a crash is dropped, the complete ones still load
+        with open(loaded.path, "ab") as f:
+            f.write(b"\x1f\x8b\x08\x00partial")
+        finished = SessionCheckpoint.load("checkpoint-test", directory=directory)
+        assert (finished.iterations, finished.final_response) == (3, "Checkpointed."), finished
+
+        # The CLI only checkpoints a run given --session (replayed here, no API needed)
+        recording_path = os.path.join(directory, "hello.jsonl")
+        run_agent(RecordingClient(ScriptedClient([text_response("Hello.")]), recording_path), "Say hello", quiet=True)
+        session_file = session_path("cli-checkpoint-test")
+        session_dir = os.path.dirname(session_file)
+
+        def saved_sessions():
+            return set(os.listdir(session_dir)) if os.path.isdir(session_dir) else set()
+
+        sessions_before = saved_sessions()
+        result = subprocess.run([sys.executable, "main.py", "--replay", recording_path, "Say hello"], capture_output=True, text=True)
+        assert result.returncode == 0 and "Hello." in result.stdout, result
+        assert saved_sessions() == sessions_before, saved_sessions() - sessions_before
+        try:
+            command = [sys.executable, "main.py", "--replay", recording_path, "--session", "cli-checkpoint-test", "Say hello"]
+            assert subprocess.run(command, capture_output=True, text=True).returncode == 0
+            assert SessionCheckpoint.load("cli-checkpoint-test").final_response == "Hello."
+        finally:
+            if os.path.exists(session_file):
+                os.remove(session_file)
+
+    print(f"Checkpoint: resumed at iteration {resumed_from}, finished after {resumed['iterations']}")
+
+
+def run_transport_tests():
+    from google import genai
+    from google.genai import errors
+
+    def transport_for(server, **options):
+        client = genai.Client(api_key="test", http_options=http_options(server.base_url))
+        return TransportClient(client, backoff_base=0.01, **options)
+
+    # Rate limits and server errors are retried, all requests share one keep-alive connection
+    steps = [
+        {"status": 503},
+        {"status": 429, "retry_after": "0"},
+        function_call_response(("get_files_info", {"directory": "pkg"}), prompt_tokens=20, response_tokens=3),
+        text_response("Retried.", prompt_tokens=60, response_tokens=2),
+    ]
+    with FakeGeminiServer(steps) as server:
+        transport = transport_for(server)
+        result = run_agent(transport, "What is in pkg?", quiet=True)
+    assert result["final_response"] == "Retried.", result
+    assert result["prompt_tokens"] == 80, result
+    assert (server.requests, len(server.connections)) == (4, 1), (server.requests, server.connections)
+    stats = transport.stats()
+    assert (stats["requests"], stats["retries"], stats["failures"]) == (2, 2, 0), stats
+    assert stats["p50_ms"] <= stats["p99_ms"], stats
+
+    # Client errors are not retried, and retries stop after max_retries
+    with FakeGeminiServer([{"status": 400}, {"status": 500}, {"status": 500}]) as server:
+        transport = transport_for(server, max_retries=1)
+        for expected_requests in (1, 3):
+            try:
+                transport.models.generate_content(model="test-model", contents="Hi")
+                assert False, "expected an APIError"
+            except errors.APIError:
+                pass
+            assert server.requests == expected_requests, server.requests
+    assert transport.stats()["failures"] == 2, transport.stats()
+
+    # A Retry-After beyond the backoff limit fails right away instead of blocking the session
+    sleeps = []
+    with FakeGeminiServer([{"status": 429, "retry_after": "3600"}, text_response("Too late.")]) as server:
+        transport = transport_for(server, sleep=sleeps.append)
+        try:
+            transport.models.generate_content(model="test-model", contents="Hi")
+            assert False, "expected an APIError"
+        except errors.APIError:
+            pass
+        assert (server.requests, sleeps) == (1, []), (server.requests, sleeps)
+
+    # A slow request is hedged, the second copy answers first
+    steps = [{"delay": 1.0, "response": text_response("Slow.")}, text_response("Fast.")]
+    with FakeGeminiServer(steps) as server:
+        transport = transport_for(server, hedge_after=0.1)
+        start = time.perf_counter()
+        response = transport.models.generate_content(model="test-model", contents="Hi")
+        elapsed = time.perf_counter() - start
+    assert response.text == "Fast." and elapsed < 1.0, (response.text, elapsed)
+    assert (transport.stats()["hedges"], transport.stats()["hedge_wins"]) == (1, 1), transport.stats()
+
+    class Throttled(Exception):
+        def __init__(self, value):
+            self.response = SimpleNamespace(headers={"retry-after": value})
+
+    assert retry_after(Throttled("2.5")) == 2.5
+    assert 0 < retry_after(Throttled(time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60)))) <= 60
+    assert retry_after(Exception()) is None
+
+    print(f"Transport: {stats}")
+
+
+def run_server_tests():
+    # One slot: after a session of workspace "a", a waiting "b" goes before a's second one
+    scheduler = FairScheduler(1)
+    scheduler.acquire("a")
+    order = []
+
+    def session(key):
+        scheduler.acquire(key)
+        order.append(key)
+        scheduler.release(key)
+
+    threads = []
+    for key in ("a", "a", "b"):
+        threads.append(threading.Thread(target=session, args=(key,)))
+        threads[-1].start()
+        while scheduler.stats()["queued"] < len(threads):
+            time.sleep(0.001)
+    scheduler.release("a")
+    for thread in threads:
+        thread.join()
+    assert order == ["a", "b", "a"], order
+
+    def list_then_answer(contents):
+        if len(contents) == 1:
+            return function_call_response(("get_files_info", {"directory": "."}), prompt_tokens=10, response_tokens=2)
+        listing = contents[-1].parts[0].function_response.response["result"]
+        return text_response(f"{len(listing.splitlines())} entries", prompt_tokens=30, response_tokens=3)
+
+    def post(url, body):
+        connection = http.client.HTTPConnection(url.removeprefix("http://"))
+        connection.request("POST", "/sessions", body=json.dumps(body))
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    with tempfile.TemporaryDirectory() as root:
+        workspaces = [os.path.join(root, name) for name in ("one", "two")]
+        for number, workspace in enumerate(workspaces, start=1):
+            os.makedirs(workspace)
+            for index in range(number):
+                open(os.path.join(workspace, f"file{index}.txt"), "w").close()
+
+        with AgentServer(ScriptedClient(list_then_answer), "127.0.0.1:0", allowed_roots=[root]) as server:
+            results = [None, None]
+
+            def run(index):
+                results[index] = post(server.url, {"prompt": "Count", "working_directory": workspaces[index], "id": index})
+
+            session_threads = [threading.Thread(target=run, args=(index,)) for index in range(2)]
+            for thread in session_threads:
+                thread.start()
+            for thread in session_threads:
+                thread.join()
+
+            # Each session only sees its own workspace
+            assert [(status, body["final_response"]) for status, body in results] == [(200, "1 entries"), (200, "2 entries")], results
+            assert results[0][1]["tool_calls"] == 1, results
+
+            status, body = post(server.url, {"prompt": "Count", "working_directory": os.path.dirname(root)})
+            assert status == 403 and "outside the allowed roots" in body["error"], body
+            status, body = post(server.url, {"working_directory": workspaces[0]})
+            assert status == 400, body
+            for max_iterations in ("lots", 0, 2.5):
+                status, body = post(server.url, {"prompt": "Count", "working_directory": workspaces[0], "max_iterations": max_iterations})
+                assert status == 400 and "max_iterations" in body["error"], body
+
+            stats = server.stats()
+    assert (stats["sessions"], stats["errors"], stats["prompt_tokens"]) == (2, 0, 80), stats
+    print(f"Server: {stats['sessions']} sessions, scheduler {stats['scheduler']}")
+
+
+def read_chrome_trace(text):
+    # The JSON array format may end with a comma and without the closing bracket
+    return json.loads(text.rstrip().rstrip(",") + "]")
+
+
+def run_tracing_tests():
+    script = [
+        function_call_response(
+            ("get_file_content", {"file_path": "main.py", "length": 123}),
+            ("get_files_info", {"directory": "pkg", "limit": 7}),
+            prompt_tokens=50, response_tokens=6,
+        ),
+        text_response("Traced.", prompt_tokens=900, response_tokens=3),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl_path = os.path.join(directory, "trace.jsonl")
+        chrome_path = os.path.join(directory, "trace.json")
+
+        # A fresh tool cache, so the read misses whatever earlier tests cached
+        original_cache = call_function_module.tool_cache
+        call_function_module.tool_cache = ToolResultCache()
+        tracing.enable(jsonl_path, chrome_path)
+        try:
+            result = run_agent(ScriptedClient(script), "Trace this", quiet=True)
+        finally:
+            tracing.disable()
+            call_function_module.tool_cache = original_cache
+        tracing.export()
+        # Exported spans are not kept in memory
+        assert tracing.events() == []
+
+        with open(jsonl_path, encoding="utf-8") as f:
+            spans = [json.loads(line) for line in f]
+        with open(chrome_path, encoding="utf-8") as f:
+            chrome = read_chrome_trace(f.read())
+
+    assert result["final_response"] == "Traced.", result
+    by_name = {}
+    for event in spans:
+        by_name.setdefault(event["name"], []).append(event)
+
+    model_spans = by_name["model.generate_content"]
+    assert [event["attributes"]["prompt_tokens"] for event in model_spans] == [50, 900], model_spans
+
+    # Tool spans run on pool threads but still nest under the turn's span
+    execute_span = by_name["tools.execute"][0]
+    tool_span = by_name["tool.get_file_content"][0]
+    assert tool_span["parent_id"] == execute_span["span_id"], spans
+    assert tool_span["attributes"]["bytes_out"] > 0 and tool_span["attributes"]["cache"] == "miss", tool_span
+    read_span = by_name["get_file_content.read"][0]
+    assert read_span["parent_id"] == tool_span["span_id"], spans
+    assert by_name["get_files_info.walk"][0]["attributes"]["entries"] > 0
+
+    assert len(chrome) == len(spans)
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in chrome)
+
+    # Only the most recent spans are held until the next export, which appends them
+    # and reports how many were dropped
+    original_events = tracing._events
+    tracing._events = collections.deque(maxlen=3)
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl_path = os.path.join(directory, "trace.jsonl")
+        chrome_path = os.path.join(directory, "trace.json")
+        tracing.enable(jsonl_path, chrome_path)
+        try:
+            with tracing.span("first"):
+                pass
+            tracing.export()
+            for i in range(5):
+                with tracing.span(f"bounded.{i}"):
+                    pass
+            assert [event["name"] for event in tracing.events()] == ["bounded.2", "bounded.3", "bounded.4"]
+            assert tracing.dropped() == 2
+            tracing.export()
+        finally:
+            tracing.disable()
+            tracing._events = original_events
+
+        with open(jsonl_path, encoding="utf-8") as f:
+            bounded_spans = [json.loads(line) for line in f]
+        with open(chrome_path, encoding="utf-8") as f:
+            bounded_chrome = read_chrome_trace(f.read())
+    expected = ["first", "tracing.dropped", "bounded.2", "bounded.3", "bounded.4"]
+    assert [event["name"] for event in bounded_spans] == expected, bounded_spans
+    assert bounded_spans[1]["attributes"] == {"dropped": 2}, bounded_spans
+    assert [event["name"] for event in bounded_chrome] == expected, bounded_chrome
+
+    # Disabled tracing hands out one shared no-op span
+    assert tracing.span("anything") is tracing.span("other")
+    start = time.perf_counter()
+    for _ in range(100000):
+        with tracing.span("noop", key=1):
+            pass
+    print(f"Tracing: {len(spans)} spans, disabled span cost {(time.perf_counter() - start) * 10:.3f} us")
+
+
+
+def run_startup_tests():
+    # Importing the agent and its tools must not load the SDK, it is only needed for model calls
+    for module in ("main", "call_function"):
+        result = subprocess.run(
+            [sys.executable, "-c", f"import sys, {module}; print('google.genai' in sys.modules)"],
+            capture_output=True,
+            text=True,
+        )
+        assert result.stdout.strip() == "False", (module, result.stdout, result.stderr)
+
+    result = subprocess.run([sys.executable, "main.py", "--help"], capture_output=True, text=True)
+    assert result.returncode == 0 and "--batch FILE" in result.stdout, result
+    print("Startup: google.genai is loaded lazily")
+
+
 if __name__ == "__main__":
-    run_tests()
\ No newline at end of file
+    # Search indexes of the tests' temporary directories go here instead of .agent_cache
+    with tempfile.TemporaryDirectory() as index_dir:
+        search_index.SEARCH_INDEX_DIR = index_dir
+        run_tests()
+        run_warm_pool_tests()
+        run_capped_output_tests()
+        run_profile_python_file_tests()
+        run_test_runner_tests()
+        run_get_file_content_tests()
+        run_get_files_info_tests()
+        run_search_files_tests()
+        run_edit_file_tests()
+        run_get_changes_tests()
+        run_prefetch_tests()
+        run_spill_tests()
+        run_executor_tests()
+        run_async_agent_tests()
+        run_compaction_tests()
+        run_tool_cache_tests()
+        run_batch_tests()
+        run_record_replay_tests()
+        run_checkpoint_tests()
+        run_transport_tests()
+        run_server_tests()
+        run_tracing_tests()
+        run_startup_tests()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import tracing
+from config import *
+
+
+class ToolResultCache:
+    """
+    LRU cache for the results of read-only tools, validated by mtime and size.
+
+    A cache key is the function name, the normalized arguments and a fingerprint
+    of the path the tool looks at (mtime and size of the file, or of every entry
+    of the listed directory), so an entry is never served after it changed on disk. Writes done through the
+    agent also invalidate matching entries right away.
+    """
+
+    def __init__(self, max_bytes=TOOL_CACHE_MAX_BYTES, cache_run_python_file=TOOL_CACHE_RUN_PYTHON_FILE):
+        self.max_bytes = max_bytes
+        self.cache_run_python_file = cache_run_python_file
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _target_path(self, function_name, args):
+        working_directory = os.path.abspath(args["working_directory"])
+        if function_name == "get_files_info":
+            return os.path.abspath(os.path.join(working_directory, args.get("directory", ".")))
+        if function_name == "run_python_file":
+            return working_directory
+        return os.path.abspath(os.path.join(working_directory, args.get("file_path", "")))
+
+    def _fingerprint(self, function_name, path):
+        if function_name == "run_python_file":
+            return _tree_fingerprint(path)
+        if function_name == "get_files_info":
+            # The directory's own mtime misses files changing size inside it,
+            # e.g. written by a script or outside the agent
+            return _listing_fingerprint(path)
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def make_key(self, function_name, args):
+        """
+        Returns the cache key for a call, or None if the call can't be cached.
+        """
+        if function_name not in ("get_file_content", "get_files_info", "run_python_file"):
+            return None
+        if function_name == "run_python_file" and not self.cache_run_python_file:
+            return None
+        # The directory's own mtime says nothing about changes deeper in the tree
+        if function_name == "get_files_info" and args.get("recursive"):
+            return None
+
+        try:
+            path = self._target_path(function_name, args)
+            fingerprint = self._fingerprint(function_name, path)
+        except OSError:
+            # Missing paths produce error messages, those are cheap and not worth caching
+            return None
+
+        normalized_args = {name: value for name, value in args.items() if name != "working_directory"}
+        return (function_name, path, json.dumps(normalized_args, sort_keys=True, default=str), fingerprint)
+
+    def call(self, function_name, function, args):
+        """
+        Returns the cached result for a call, or runs the function and caches its result.
+
+        Parameters:
+            function_name (str): Name of the tool.
+            function (callable): The tool implementation.
+            args (dict): Keyword arguments for the tool, including working_directory.
+
+        Returns:
+            The result of the tool.
+        """
+        key = self.make_key(function_name, args)
+        if key is None:
+            tracing.annotate(cache="bypass")
+            return function(**args)
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                tracing.annotate(cache="hit")
+                return self.entries[key][0]
+            self.misses += 1
+        tracing.annotate(cache="miss")
+
+        result = function(**args)
+        size = len(str(result))
+        if size > self.max_bytes:
+            return result
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (result, size)
+                self.total_bytes += size
+            # Evict least recently used entries until the byte budget is met
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return result
+
+    def invalidate(self, path):
+        """
+        Drops every entry affected by a write to path: reads of the file,
+        listings of any directory containing it and cached script runs.
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            for key in list(self.entries):
+                function_name, entry_path = key[0], key[1]
+                if (
+                    entry_path == path
+                    or path.startswith(entry_path + os.sep)
+                    or function_name == "run_python_file"
+                ):
+                    _, size = self.entries.pop(key)
+                    self.total_bytes -= size
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+        }
+
+
+def _listing_fingerprint(directory):
+    """
+    Hashes the name, type, mtime and size of every entry of directory.
+    """
+    digest = hashlib.sha1()
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except OSError:
+            # Broken symlink, listed without a size
+            digest.update(f"{entry.name}:missing;".encode())
+            continue
+        digest.update(f"{entry.name}:{entry.is_dir()}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()
+
+
+def _tree_fingerprint(directory):
+    """
+    Hashes the path, mtime and size of every file below directory.
+    """
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(directory):
+        # Bytecode caches change on every run and don't affect the result
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f"{os.path.join(root, name)}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()
@@ -0,0 +1,211 @@
+import collections
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+
+from config import *
+
+
+# Tracing is off unless enable() is called, span() then returns a shared no-op
+_enabled = False
+# Bounded so a long --serve process keeps only the most recent spans
+_events = collections.deque(maxlen=TRACE_MAX_EVENTS)
+_dropped = 0
+_events_lock = threading.Lock()
+_jsonl_path = None
+_chrome_path = None
+_start_ns = 0
+_span_ids = itertools.count(1)
+
+# The innermost open span, followed into asyncio tasks and copied contexts
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    A timed section of work with attributes, recorded when the with block ends.
+    """
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_span_ids)
+        self.parent = None
+        self.token = None
+        self.start_ns = 0
+
+    def set(self, **attributes):
+        """
+        Adds attributes to the span, e.g. sizes or counts only known at the end.
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        _current_span.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        event = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "start_us": (self.start_ns - _start_ns) // 1000,
+            "duration_us": (end_ns - self.start_ns) // 1000,
+            "thread": threading.get_ident(),
+            "attributes": self.attributes,
+        }
+        global _dropped
+        with _events_lock:
+            if len(_events) == _events.maxlen:
+                _dropped += 1
+            _events.append(event)
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """
+    Returns a context manager timing the enclosed block as a span.
+
+    When tracing is disabled this is a shared object that does nothing.
+
+    Parameters:
+        name (str): Name of the span, e.g. "model.generate_content" or "tool.search_files".
+        **attributes: Values recorded with the span.
+
+    Returns:
+        Span: Use as "with span(...) as s:", s.set(...) adds attributes.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def annotate(**attributes):
+    """
+    Adds attributes to the innermost open span (e.g. a cache hit deep inside a tool call).
+    """
+    if not _enabled:
+        return
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(jsonl_path=None, chrome_path=None):
+    """
+    Starts recording spans, export() appends them to the given files.
+
+    Parameters:
+        jsonl_path (str): File for one JSON object per span, emptied here.
+        chrome_path (str): File in Chrome trace event format (chrome://tracing, Perfetto), emptied here.
+    """
+    global _enabled, _jsonl_path, _chrome_path, _start_ns, _dropped
+    _jsonl_path = jsonl_path
+    _chrome_path = chrome_path
+    _start_ns = time.perf_counter_ns()
+    with _events_lock:
+        _events.clear()
+        _dropped = 0
+    for path in (jsonl_path, chrome_path):
+        if path:
+            open(path, "w", encoding="utf-8").close()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def events():
+    """
+    Returns a copy of the spans recorded so far, in the order they ended.
+    """
+    with _events_lock:
+        return list(_events)
+
+
+def dropped():
+    """
+    Returns how many of the oldest spans were dropped because TRACE_MAX_EVENTS were held.
+    """
+    with _events_lock:
+        return _dropped
+
+
+def export():
+    """
+    Appends the recorded spans to the files given to enable() and clears them,
+    so it can be called repeatedly (e.g. periodically by a long-running server).
+
+    Spans dropped since the last export are reported as one "tracing.dropped"
+    event with their count, so a truncated trace is visible as such.
+    """
+    global _dropped
+    with _events_lock:
+        recorded = list(_events)
+        dropped_count = _dropped
+        _events.clear()
+        _dropped = 0
+    if dropped_count:
+        recorded.insert(0, {
+            "name": "tracing.dropped",
+            "span_id": None,
+            "parent_id": None,
+            "start_us": recorded[0]["start_us"] if recorded else (time.perf_counter_ns() - _start_ns) // 1000,
+            "duration_us": 0,
+            "thread": threading.get_ident(),
+            "attributes": {"dropped": dropped_count},
+        })
+
+    if _jsonl_path:
+        with open(_jsonl_path, "a", encoding="utf-8") as f:
+            for event in recorded:
+                f.write(json.dumps(event, default=str) + "\n")
+
+    if _chrome_path:
+        pid = os.getpid()
+        # The JSON array format, which viewers accept without the closing bracket,
+        # so later exports can append to it
+        with open(_chrome_path, "a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                f.write("[\n")
+            for event in sorted(recorded, key=lambda event: event["start_us"]):
+                trace_event = {
+                    "name": event["name"],
+                    "cat": event["name"].split(".", 1)[0],
+                    "ph": "X" if event["span_id"] is not None else "i",
+                    "ts": event["start_us"],
+                    "dur": event["duration_us"],
+                    "pid": pid,
+                    "tid": event["thread"],
+                    "args": event["attributes"],
+                }
+                f.write(json.dumps(trace_event, default=str) + ",\n")
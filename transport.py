@@ -0,0 +1,205 @@
+import collections
+import concurrent.futures
+import contextvars
+import email.utils
+import random
+import threading
+import time
+
+from config import *
+
+#Import span tracing
+import tracing
+
+# HTTP statuses worth another attempt: timeouts, rate limits and server-side failures
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Latencies kept for the percentiles, the oldest are dropped first
+LATENCY_WINDOW = 1024
+
+
+def http_options(base_url=None):
+    """
+    Returns the HttpOptions for genai.Client: a request timeout and a bounded
+    pool of keep-alive connections, so consecutive model calls reuse a warm
+    TLS connection instead of opening a new one.
+
+    Parameters:
+        base_url (str): Send requests to this server instead of the Gemini API
+            (a local stand-in in tests and benchmarks).
+    """
+    import httpx
+    from google.genai import types
+
+    return types.HttpOptions(
+        base_url=base_url,
+        # HttpOptions.timeout is in milliseconds
+        timeout=int(TRANSPORT_TIMEOUT * 1000),
+        client_args={
+            "limits": httpx.Limits(
+                max_connections=TRANSPORT_MAX_CONNECTIONS,
+                max_keepalive_connections=TRANSPORT_MAX_CONNECTIONS,
+                keepalive_expiry=TRANSPORT_KEEPALIVE_EXPIRY,
+            ),
+        },
+    )
+
+
+class TransportClient:
+    """
+    Wraps a client so that transient model errors don't end the session.
+
+    generate_content is retried after 429, 5xx, timeouts and connection errors
+    with jittered exponential backoff, waiting for Retry-After instead when the
+    server sends it. A Retry-After longer than backoff_max fails right away
+    rather than blocking the session. With hedge_after set, a request still unanswered after that
+    many seconds is sent a second time and whichever copy answers first wins.
+    The latency of every call, retries included, feeds stats().
+
+    Only client.models.generate_content is wrapped, client.aio is passed through.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_retries=TRANSPORT_MAX_RETRIES,
+        backoff_base=TRANSPORT_BACKOFF_BASE,
+        backoff_max=TRANSPORT_BACKOFF_MAX,
+        hedge_after=TRANSPORT_HEDGE_AFTER,
+        sleep=time.sleep,
+    ):
+        self.client = client
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.sleep = sleep
+        self.models = self
+        self.aio = getattr(client, "aio", None)
+
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.counters = collections.Counter()
+        self.hedge_pool = None
+
+    def generate_content(self, model, contents, config=None):
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._attempt(model, contents, config)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count("failures")
+                    raise
+                delay = retry_after(e)
+                if delay is not None and delay > self.backoff_max:
+                    # The server asks for a longer pause than a retry may take, report the error now
+                    self._count("failures")
+                    raise
+                if delay is None:
+                    # Full jitter, concurrent sessions hitting the same limit don't retry in lockstep
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                self._count("retries")
+                tracing.annotate(retries=attempt + 1, last_error=type(e).__name__)
+                self.sleep(delay)
+
+        with self.lock:
+            self.counters["requests"] += 1
+            self.latencies.append(time.perf_counter() - start)
+        return response
+
+    def _attempt(self, model, contents, config):
+        send = lambda: self.client.models.generate_content(model=model, contents=contents, config=config)
+        if not self.hedge_after:
+            return send()
+
+        pool = self._pool()
+        first = pool.submit(contextvars.copy_context().run, send)
+        done, _ = concurrent.futures.wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        # Too slow: race a second copy, the loser finishes in the background and is ignored
+        self._count("hedges")
+        tracing.annotate(hedged=True)
+        second = pool.submit(contextvars.copy_context().run, send)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _pool(self):
+        with self.lock:
+            if self.hedge_pool is None:
+                # Each call may hold two threads while it is hedged
+                self.hedge_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=2 * max(BATCH_CONCURRENCY, 1), thread_name_prefix="hedge"
+                )
+            return self.hedge_pool
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        """
+        Returns the request, retry and hedging counters, and the p50/p90/p99
+        call latencies in milliseconds over the last LATENCY_WINDOW calls.
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {name: self.counters[name] for name in ("requests", "retries", "failures", "hedges", "hedge_wins")}
+        for percentile in (50, 90, 99):
+            stats[f"p{percentile}_ms"] = round(percentile_of(latencies, percentile) * 1000, 1) if latencies else None
+        return stats
+
+
+def percentile_of(sorted_values, percentile):
+    # Nearest rank, always one of the measured values
+    rank = max(1, -(-len(sorted_values) * percentile // 100))
+    return sorted_values[rank - 1]
+
+
+def is_retryable(error):
+    """
+    Returns True for errors a later attempt can fix: retryable HTTP statuses,
+    timeouts and network errors. Bad requests, auth errors and bugs are not.
+    """
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in RETRY_STATUS_CODES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+def retry_after(error):
+    """
+    Returns the seconds the server asked to wait in a Retry-After header
+    (delay in seconds or an HTTP date), or None if it didn't send one.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
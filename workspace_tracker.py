@@ -0,0 +1,157 @@
+import os
+import threading
+from collections import OrderedDict
+
+from config import *
+from functions.get_files_info import load_ignore_patterns, is_ignored
+from search_index import read_text
+
+
+class WorkspaceTracker:
+    """
+    Numbered snapshots of the files of a working directory, to report what changed.
+
+    A snapshot maps every file (same ignore rules as get_files_info) to its mtime,
+    size and, for text files up to CHANGES_DIFF_MAX_BYTES, its content. Files whose
+    mtime and size match the previous snapshot are not read again, their content
+    is shared with it. The last CHANGES_MAX_SNAPSHOTS snapshots are kept.
+    """
+
+    def __init__(self, working_directory, max_snapshots=CHANGES_MAX_SNAPSHOTS, diff_max_bytes=CHANGES_DIFF_MAX_BYTES):
+        self.working_directory = os.path.abspath(working_directory)
+        self.max_snapshots = max_snapshots
+        self.diff_max_bytes = diff_max_bytes
+        self.snapshots = OrderedDict()
+        self.next_token = 1
+        # Paths written through the agent, read again even if their stat looks unchanged
+        self.dirty = set()
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        """
+        Scans the working directory and returns (token, files) of the new snapshot.
+
+        If nothing changed since the latest snapshot, that one is returned instead.
+        """
+        with self.lock:
+            previous = next(reversed(self.snapshots.values())) if self.snapshots else {}
+            files = self._scan(previous)
+            self.dirty.clear()
+            if self.snapshots and files == previous:
+                return next(reversed(self.snapshots)), previous
+
+            token = str(self.next_token)
+            self.next_token += 1
+            self.snapshots[token] = files
+            while len(self.snapshots) > self.max_snapshots:
+                self.snapshots.popitem(last=False)
+            return token, files
+
+    def get(self, token):
+        """
+        Returns the files of a snapshot, or None if the token is unknown or expired.
+        """
+        with self.lock:
+            return self.snapshots.get(str(token))
+
+    def _scan(self, previous):
+        ignore_patterns = load_ignore_patterns(self.working_directory)
+        files = {}
+        stack = [self.working_directory]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    relative_path = os.path.relpath(entry.path, self.working_directory).replace(os.sep, "/")
+                    if is_ignored(relative_path, entry.name, is_dir, ignore_patterns):
+                        continue
+                    if is_dir:
+                        stack.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                known = previous.get(relative_path)
+                if (
+                    known is not None
+                    and known[:2] == (stat.st_mtime_ns, stat.st_size)
+                    and relative_path not in self.dirty
+                ):
+                    files[relative_path] = known
+                    continue
+                content = read_text(entry.path) if stat.st_size <= self.diff_max_bytes else None
+                files[relative_path] = (stat.st_mtime_ns, stat.st_size, content)
+        return files
+
+    def notify_write(self, relative_path):
+        with self.lock:
+            self.dirty.add(os.path.normpath(relative_path).replace(os.sep, "/"))
+
+
+def compare(old_files, new_files):
+    """
+    Returns the sorted (status, path) changes between two snapshots, status being
+    "A" (added), "M" (modified) or "D" (deleted).
+
+    A file counts as modified if its content differs, or if its size differs when
+    the content was too large to keep. A touched file with the same content is not.
+    """
+    changes = []
+    for path in sorted(old_files.keys() | new_files.keys()):
+        old = old_files.get(path)
+        new = new_files.get(path)
+        if old is None:
+            changes.append(("A", path))
+        elif new is None:
+            changes.append(("D", path))
+        elif old is not new:
+            if old[2] is not None and new[2] is not None:
+                modified = old[2] != new[2]
+            else:
+                modified = old[:2] != new[:2]
+            if modified:
+                changes.append(("M", path))
+    return changes
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(working_directory):
+    """
+    Returns the tracker of a working directory, creating it on first use.
+    """
+    working_directory = os.path.abspath(working_directory)
+    with _trackers_lock:
+        tracker = _trackers.get(working_directory)
+        if tracker is None:
+            tracker = WorkspaceTracker(working_directory)
+            _trackers[working_directory] = tracker
+    return tracker
+
+
+def notify_write(working_directory, file_path):
+    """
+    Marks a file written through the agent, so the next snapshot reads it again.
+    """
+    tracker = _trackers.get(os.path.abspath(working_directory))
+    if tracker is not None:
+        tracker.notify_write(file_path)
+
+
+def discard_tracker(working_directory):
+    """
+    Drops the snapshots of a working directory (e.g. a temporary session copy).
+    """
+    with _trackers_lock:
+        _trackers.pop(os.path.abspath(working_directory), None)